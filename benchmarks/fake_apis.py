@@ -0,0 +1,484 @@
+"""
+Local stand-ins for the Google Sheets API and the Telegram Bot API
+
+Both servers answer just the calls the bot makes, with configurable
+latency and injected errors, so the bot can be load-tested without
+touching Google or Telegram. They run on tornado in the caller's event loop.
+
+FakeGoogleAPI serves the OAuth token endpoint, values.get, values.batchGet
+(COLUMNS major dimension) and Drive files.get. FakeBotAPI serves
+getUpdates (long polling), the send/edit methods the handlers use, and
+delivers updates to a webhook when the bot runs in webhook mode. Every
+message the bot sends is published to the chat's queue so a load
+generator can wait for the reply it expects.
+"""
+
+import asyncio
+import itertools
+import json
+import random
+import re
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Sequence
+from urllib.parse import unquote
+
+import httpx
+import tornado.netutil
+import tornado.web
+from tornado.httpserver import HTTPServer
+
+
+class Faults:
+    """
+    Latency and error injection for one fake server
+
+    Every faulted request waits `latency` seconds (± `jitter`), then fails
+    with probability `error_rate` (server error) or `throttle_rate`
+    (429 / rate limit error).
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        seed: Optional[int] = None
+    ):
+        """
+        Args:
+            latency: Mean added delay in seconds
+            jitter: Delay is uniform in latency ± jitter
+            error_rate: Share of requests answered with a server error
+            throttle_rate: Share of requests answered with a rate limit error
+            seed: Random seed for reproducible runs
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self._random = random.Random(seed)
+
+    async def delay(self) -> None:
+        """Sleep for the configured latency"""
+        delay = self.latency + self._random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def outcome(self) -> Optional[str]:
+        """
+        Draw the outcome of one request
+
+        Returns:
+            'error', 'throttle' or None for a normal answer
+        """
+        draw = self._random.random()
+        if draw < self.error_rate:
+            return 'error'
+        if draw < self.error_rate + self.throttle_rate:
+            return 'throttle'
+        return None
+
+
+def parse_columns(a1_range: str) -> Optional[range]:
+    """
+    Column positions of a whole-column A1 range such as "B:D" or "'Лист'!C:C"
+
+    Returns:
+        Zero-based positions, or None if the range is not whole columns
+    """
+    match = re.fullmatch(r"(?:.*!)?([A-Z]+):([A-Z]+)", a1_range)
+    if not match:
+        return None
+
+    def position(letters: str) -> int:
+        number = 0
+        for letter in letters:
+            number = number * 26 + ord(letter) - ord('A') + 1
+        return number - 1
+
+    return range(position(match.group(1)), position(match.group(2)) + 1)
+
+
+class _FakeHandler(tornado.web.RequestHandler):
+    """Base handler: JSON answers and access to the fake that owns the app"""
+
+    def initialize(self, fake):
+        self.fake = fake
+
+    def reply(self, payload: Any, status: int = 200) -> None:
+        self.set_status(status)
+        self.set_header('Content-Type', 'application/json; charset=UTF-8')
+        self.finish(payload if isinstance(payload, bytes) else json.dumps(payload, ensure_ascii=False))
+
+
+class _GoogleFaultedHandler(_FakeHandler):
+    """Google API handler that applies the configured faults first"""
+
+    async def faulted(self, call: str) -> bool:
+        """
+        Count the request and apply latency and injected errors
+
+        Args:
+            call: API method name for the request counters
+
+        Returns:
+            True if an error was sent and the request is done
+        """
+        self.fake.requests[call] += 1
+        await self.fake.faults.delay()
+        outcome = self.fake.faults.outcome()
+        if outcome is None:
+            return False
+        self.fake.injected[outcome] += 1
+        if outcome == 'throttle':
+            self.reply({'error': {'code': 429, 'message': 'Quota exceeded', 'status': 'RESOURCE_EXHAUSTED'}}, 429)
+        else:
+            self.reply({'error': {'code': 503, 'message': 'The service is currently unavailable.',
+                                  'status': 'UNAVAILABLE'}}, 503)
+        return True
+
+
+class _TokenHandler(_FakeHandler):
+    async def post(self):
+        self.fake.requests['token'] += 1
+        self.reply({'access_token': 'fake-access-token', 'expires_in': 3600, 'token_type': 'Bearer'})
+
+
+class _ValuesGetHandler(_GoogleFaultedHandler):
+    async def get(self, spreadsheet_id: str, a1_range: str):
+        if await self.faulted('values.get'):
+            return
+        # Only the header row is ever requested this way
+        self.reply({'range': unquote(a1_range), 'majorDimension': 'ROWS', 'values': [self.fake.headers]})
+
+
+class _BatchGetHandler(_GoogleFaultedHandler):
+    async def get(self, spreadsheet_id: str):
+        if await self.faulted('values.batchGet'):
+            return
+        ranges = tuple(self.get_query_arguments('ranges'))
+        if self.get_query_argument('majorDimension', 'ROWS') != 'COLUMNS':
+            self.reply({'error': {'code': 400, 'message': 'Only COLUMNS is supported by the fake',
+                                  'status': 'INVALID_ARGUMENT'}}, 400)
+            return
+        self.reply(self.fake.batch_payload(ranges))
+
+
+class _DriveFileHandler(_GoogleFaultedHandler):
+    async def get(self, file_id: str):
+        if await self.faulted('files.get'):
+            return
+        self.reply({'version': str(self.fake.version)})
+
+
+class FakeGoogleAPI:
+    """
+    Fake Google OAuth, Sheets values and Drive metadata endpoints for one sheet
+
+    Point the bot at it with SHEETS_API_ENDPOINT=<url>/ and
+    DRIVE_API_ENDPOINT=<url>/drive/v3/, and with a service account file
+    whose token_uri is <url>/token (see write_service_account).
+    """
+
+    def __init__(self, values: List[List[str]], faults: Optional[Faults] = None):
+        """
+        Args:
+            values: Sheet contents, header row first
+            faults: Latency and errors to inject into Sheets/Drive calls
+        """
+        self.headers = list(values[0])
+        self.columns = [list(column) for column in zip(*values)]
+        self.faults = faults or Faults()
+        self.version = 1
+        self.requests: Counter = Counter()
+        self.injected: Counter = Counter()
+        self._payloads: Dict[tuple, bytes] = {}
+        self._server: Optional[HTTPServer] = None
+        self.url = ''
+
+    def replace_values(self, values: List[List[str]]) -> None:
+        """Change the sheet contents (as an edit in the spreadsheet would)"""
+        self.headers = list(values[0])
+        self.columns = [list(column) for column in zip(*values)]
+        self.version += 1
+        self._payloads.clear()
+
+    def batch_payload(self, ranges: Sequence[str]) -> bytes:
+        """Encoded batchGet response for whole-column ranges, cached per request"""
+        payload = self._payloads.get(tuple(ranges))
+        if payload is None:
+            value_ranges = []
+            for a1_range in ranges:
+                positions = parse_columns(a1_range) or range(0)
+                value_ranges.append({
+                    'range': a1_range,
+                    'majorDimension': 'COLUMNS',
+                    'values': [self.columns[position] for position in positions if position < len(self.columns)]
+                })
+            payload = json.dumps({'valueRanges': value_ranges}, ensure_ascii=False).encode()
+            self._payloads[tuple(ranges)] = payload
+        return payload
+
+    def start(self, port: int = 0, host: str = '127.0.0.1') -> str:
+        """
+        Start serving in the running event loop
+
+        Returns:
+            Base URL of the server
+        """
+        app = tornado.web.Application([
+            (r'/token', _TokenHandler, {'fake': self}),
+            (r'/v4/spreadsheets/([^/]+)/values:batchGet', _BatchGetHandler, {'fake': self}),
+            (r'/v4/spreadsheets/([^/]+)/values/(.+)', _ValuesGetHandler, {'fake': self}),
+            (r'/drive/v3/files/([^/]+)', _DriveFileHandler, {'fake': self}),
+        ])
+        self._server, self.url = _listen(app, host, port)
+        return self.url
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.stop()
+
+
+# Bot API methods that are subject to injected faults; the rest (getMe,
+# getUpdates, setWebhook, ...) always succeed so the bot can start
+FAULTED_METHODS = {
+    'sendMessage', 'editMessageText', 'sendDocument', 'answerCallbackQuery',
+    'answerInlineQuery', 'deleteMessage'
+}
+
+# Methods whose result is a Message
+MESSAGE_METHODS = {'sendMessage', 'editMessageText', 'sendDocument'}
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'Load Test Bot', 'username': 'load_test_bot'}
+
+
+def _bot_parameters(handler: tornado.web.RequestHandler) -> Dict[str, Any]:
+    """Method parameters from a form, multipart or JSON request body"""
+    content_type = handler.request.headers.get('Content-Type', '')
+    if content_type.startswith('application/json'):
+        return json.loads(handler.request.body or b'{}')
+
+    parameters = {}
+    for name in handler.request.body_arguments:
+        value = handler.get_body_argument(name)
+        # Structured parameters (reply_markup, allowed_updates, ...) are JSON-encoded
+        if value[:1] in ('{', '['):
+            try:
+                value = json.loads(value)
+            except ValueError:
+                pass
+        parameters[name] = value
+    for name, files in handler.request.files.items():
+        parameters[name] = {'file_name': files[0].filename, 'size': len(files[0].body)}
+    return parameters
+
+
+class _BotMethodHandler(_FakeHandler):
+    async def post(self, token: str, method: str):
+        fake: FakeBotAPI = self.fake
+        if token != fake.token:
+            self.reply({'ok': False, 'error_code': 401, 'description': 'Unauthorized'}, 401)
+            return
+
+        parameters = _bot_parameters(self)
+        fake.requests[method] += 1
+
+        if method == 'getUpdates':
+            self.reply({'ok': True, 'result': await fake.pending_updates(parameters)})
+            return
+
+        if method in FAULTED_METHODS:
+            await fake.faults.delay()
+            outcome = fake.faults.outcome()
+            if outcome is not None:
+                fake.injected[outcome] += 1
+                if outcome == 'throttle':
+                    self.reply({'ok': False, 'error_code': 429,
+                                'description': 'Too Many Requests: retry after 1',
+                                'parameters': {'retry_after': 1}}, 429)
+                else:
+                    self.reply({'ok': False, 'error_code': 500, 'description': 'Internal Server Error'}, 500)
+                return
+
+        self.reply({'ok': True, 'result': fake.call(method, parameters)})
+
+    get = post
+
+
+class FakeBotAPI:
+    """
+    Fake Telegram Bot API for one bot token
+
+    Point the bot at it with BOT_API_BASE_URL=<url>/bot. Updates queued
+    with push_update are handed out through getUpdates, or POSTed to the
+    webhook the bot registered with setWebhook.
+    """
+
+    def __init__(self, token: str, faults: Optional[Faults] = None):
+        """
+        Args:
+            token: Bot token the fake accepts
+            faults: Latency and errors to inject into send/edit calls
+        """
+        self.token = token
+        self.faults = faults or Faults()
+        self.requests: Counter = Counter()
+        self.injected: Counter = Counter()
+        self.ready = asyncio.Event()
+        self._update_ids = itertools.count(1)
+        self._message_ids: Dict[int, itertools.count] = defaultdict(lambda: itertools.count(1))
+        self._updates: List[dict] = []
+        self._updates_added = asyncio.Event()
+        self._chats: Dict[int, asyncio.Queue] = defaultdict(asyncio.Queue)
+        self._webhook: Optional[dict] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._server: Optional[HTTPServer] = None
+        self.webhook_failures = 0
+        self.url = ''
+
+    def start(self, port: int = 0, host: str = '127.0.0.1') -> str:
+        """
+        Start serving in the running event loop
+
+        Returns:
+            Base URL of the server (the bot's base URL is this plus '/bot')
+        """
+        app = tornado.web.Application([
+            (r'/bot([^/]+)/(\w+)', _BotMethodHandler, {'fake': self}),
+        ])
+        self._server, self.url = _listen(app, host, port)
+        return self.url
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.stop()
+        # Release a getUpdates call still waiting for updates
+        self._updates_added.set()
+        await asyncio.sleep(0)
+        if self._client is not None:
+            await self._client.aclose()
+
+    def chat(self, chat_id: int) -> asyncio.Queue:
+        """Queue of (method, message) pairs the bot sent to a chat"""
+        return self._chats[chat_id]
+
+    async def push_update(self, update: dict) -> dict:
+        """
+        Deliver an update to the bot
+
+        Args:
+            update: Update without update_id
+
+        Returns:
+            The update as delivered (with update_id)
+        """
+        update = {'update_id': next(self._update_ids), **update}
+        if self._webhook is None:
+            self._updates.append(update)
+            self._updates_added.set()
+            return update
+
+        headers = {}
+        if self._webhook.get('secret_token'):
+            headers['X-Telegram-Bot-Api-Secret-Token'] = self._webhook['secret_token']
+        try:
+            response = await self._client.post(self._webhook['url'], json=update, headers=headers)
+            if response.status_code != 200:
+                self.webhook_failures += 1
+        except httpx.HTTPError:
+            self.webhook_failures += 1
+        return update
+
+    async def pending_updates(self, parameters: Dict[str, Any]) -> List[dict]:
+        """Answer getUpdates: confirm updates below offset, long-poll for new ones"""
+        self.ready.set()
+        offset = int(parameters.get('offset') or 0)
+        limit = int(parameters.get('limit') or 100)
+        timeout = float(parameters.get('timeout') or 0)
+
+        self._updates = [update for update in self._updates if update['update_id'] >= offset]
+        if not self._updates and timeout > 0:
+            self._updates_added.clear()
+            try:
+                await asyncio.wait_for(self._updates_added.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self._updates[:limit]
+
+    def call(self, method: str, parameters: Dict[str, Any]) -> Any:
+        """Result of a successful Bot API call"""
+        if method == 'getMe':
+            return BOT_USER
+        if method == 'setWebhook':
+            self._webhook = parameters
+            if self._client is None:
+                self._client = httpx.AsyncClient(timeout=30, limits=httpx.Limits(max_connections=100))
+            self.ready.set()
+            return True
+        if method == 'deleteWebhook':
+            self._webhook = None
+            return True
+        if method == 'getWebhookInfo':
+            return {'url': (self._webhook or {}).get('url', ''), 'has_custom_certificate': False,
+                    'pending_update_count': len(self._updates)}
+        if method not in MESSAGE_METHODS:
+            return True
+
+        chat_id = int(parameters['chat_id'])
+        if method == 'editMessageText':
+            message_id = int(parameters['message_id'])
+        else:
+            message_id = next(self._message_ids[chat_id])
+        message = {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': BOT_USER,
+            'text': parameters.get('text', ''),
+        }
+        if isinstance(parameters.get('reply_markup'), dict):
+            message['reply_markup'] = parameters['reply_markup']
+        if method == 'sendDocument':
+            message['document'] = {'file_id': f'doc{message_id}', 'file_unique_id': f'doc{message_id}'}
+        self._chats[chat_id].put_nowait((method, message))
+        return message
+
+
+def _listen(app: tornado.web.Application, host: str, port: int):
+    """Bind an app to a port (0 picks a free one) and return the server and its URL"""
+    # Injected errors are expected; don't log every request
+    app.settings['log_function'] = lambda handler: None
+    server = HTTPServer(app, max_buffer_size=256 * 2**20)
+    sockets = tornado.netutil.bind_sockets(port, host)
+    server.add_sockets(sockets)
+    bound_port = sockets[0].getsockname()[1]
+    return server, f"http://{host}:{bound_port}"
+
+
+def write_service_account(path: str, token_uri: str) -> None:
+    """
+    Write a service account file whose tokens come from a fake token endpoint
+
+    The key is freshly generated: google-auth signs the token request with
+    it, and the fake accepts any signature.
+
+    Args:
+        path: File to write
+        token_uri: Token endpoint, e.g. FakeGoogleAPI.url + '/token'
+    """
+    import rsa
+
+    _, private_key = rsa.newkeys(1024)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'type': 'service_account',
+            'project_id': 'load-test',
+            'private_key_id': 'load-test',
+            'private_key': private_key.save_pkcs1().decode(),
+            'client_email': 'load-test@load-test.iam.gserviceaccount.com',
+            'client_id': '1',
+            'token_uri': token_uri
+        }, f)
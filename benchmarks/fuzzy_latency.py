@@ -0,0 +1,70 @@
+"""
+Latency benchmark for typo-tolerant search
+
+Usage:
+    python -m benchmarks.fuzzy_latency [rows]
+"""
+
+import os
+import random
+import statistics
+import sys
+import time
+
+os.environ.setdefault('BOT_TOKEN', 'benchmark')
+
+from benchmarks.synthetic import generate_values
+from src.services.search import SearchService
+from src.services.snapshot import Snapshot
+
+QUERIES = 1000
+
+
+def make_typo(value: str, rng: random.Random) -> str:
+    """Apply one random typo: drop, swap or replace a letter, or ё->е"""
+    if 'ё' in value and rng.random() < 0.3:
+        return value.replace('ё', 'е')
+    position = rng.randrange(1, len(value) - 1)
+    kind = rng.choice(('drop', 'swap', 'replace'))
+    if kind == 'drop':
+        return value[:position] + value[position + 1:]
+    if kind == 'swap':
+        return value[:position - 1] + value[position] + value[position - 1] + value[position + 1:]
+    return value[:position] + rng.choice('абвгдежзиклмнопрст') + value[position + 1:]
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    rng = random.Random(7)
+
+    values = generate_values(rows)
+    started = time.perf_counter()
+    snapshot = Snapshot.from_values(values)
+    print(f"rows: {rows}, index build: {time.perf_counter() - started:.2f}s")
+
+    samples = []
+    hits = 0
+    for _ in range(QUERIES):
+        surname, name, patronymic, class_name = rng.choice(values[1:])[:4]
+        criteria = {
+            'surname': make_typo(surname, rng),
+            'name': name,
+            'patronymic': make_typo(patronymic, rng),
+            'class': class_name[:-1] + ' ' + class_name[-1]
+        }
+        started = time.perf_counter()
+        results = SearchService.search_fuzzy(snapshot.data, criteria, index=snapshot.index)
+        samples.append(time.perf_counter() - started)
+        hits += any(r['Фамилия'] == surname and r['Отчество'] == patronymic for r in results)
+
+    samples.sort()
+    quantiles = statistics.quantiles(samples, n=100)
+    print(
+        f"queries: {QUERIES}, found intended record: {hits / QUERIES:.1%}\n"
+        f"p50: {quantiles[49] * 1000:.2f} ms, p95: {quantiles[94] * 1000:.2f} ms, "
+        f"p99: {quantiles[98] * 1000:.2f} ms, max: {samples[-1] * 1000:.2f} ms"
+    )
+
+
+if __name__ == '__main__':
+    main()
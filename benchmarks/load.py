@@ -0,0 +1,384 @@
+"""
+End-to-end load test against local fake Google and Telegram APIs
+
+Starts FakeGoogleAPI and FakeBotAPI (benchmarks/fake_apis.py), runs
+main.py in a subprocess pointed at them, and simulates users going
+through the conversation: /start -> "Начать поиск" -> query -> results.
+Reports end-to-end latency percentiles per step and error rates.
+
+Usage:
+    python -m benchmarks.load [--users 200] [--rounds 3] [--rows 100000] [--mode polling|webhook]
+                              [--bot-latency 0.05] [--bot-error-rate 0.01] [--bot-throttle-rate 0.01]
+                              [--sheets-latency 0.5] [--sheets-error-rate 0.1]
+                              [--env OUTBOUND_GLOBAL_RATE=1000 ...] [--output FILE]
+
+The bot keeps its real limits (OUTBOUND_GLOBAL_RATE, UPDATE_WORKERS, ...)
+unless they are overridden with --env, so by default the run shows what
+Telegram's flood limits allow rather than the bot's own capacity.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import signal
+import socket
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List
+
+from benchmarks.fake_apis import Faults, FakeBotAPI, FakeGoogleAPI, write_service_account
+from benchmarks.suite import percentile
+from benchmarks.synthetic import generate_values
+from src.bot.states import CallbackData
+from src.bot.update_processor import BUSY_TEXT, RATE_LIMITED_TEXT
+
+ROOT = Path(__file__).resolve().parent.parent
+BOT_TOKEN = '123456:load-test'
+
+STATUS_TEXT = "🔄 Ищу..."
+STEPS = ('start', 'open_search', 'search', 'conversation')
+
+
+class StepFailed(Exception):
+    """A step got no reply or the wrong one; the argument is the error kind"""
+
+
+class LoadStats:
+    """Latencies per step and error counts of a run"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {step: [] for step in STEPS}
+        self.errors: Counter = Counter()
+        self.started = 0
+        self.completed = 0
+
+    def report(self) -> Dict[str, Any]:
+        steps = {}
+        for step, samples in self.latencies.items():
+            if not samples:
+                continue
+            samples = sorted(samples)
+            steps[step] = {
+                'count': len(samples),
+                'mean_ms': sum(samples) / len(samples) * 1000,
+                'p50_ms': percentile(samples, 0.50) * 1000,
+                'p95_ms': percentile(samples, 0.95) * 1000,
+                'p99_ms': percentile(samples, 0.99) * 1000,
+                'max_ms': samples[-1] * 1000
+            }
+        failed = sum(self.errors.values())
+        return {
+            'conversations': self.started,
+            'completed': self.completed,
+            'error_rate': failed / self.started if self.started else 0.0,
+            'errors': dict(self.errors),
+            'steps': steps
+        }
+
+
+class SimulatedUser:
+    """One private chat going through the search conversation"""
+
+    def __init__(self, user_id: int, bot: FakeBotAPI, rows: List[List[str]], stats: LoadStats, args):
+        """
+        Args:
+            user_id: Telegram user ID (also the chat ID)
+            bot: Fake Bot API the bot under test talks to
+            rows: Sheet rows to build queries from
+            stats: Where latencies and errors are recorded
+            args: Parsed command line
+        """
+        self.user_id = user_id
+        self.bot = bot
+        self.rows = rows
+        self.stats = stats
+        self.args = args
+        self.random = random.Random(user_id)
+        self.replies = bot.chat(user_id)
+        self._message_ids = itertools.count(1)
+        self._callback_ids = itertools.count(1)
+        self._user = {'id': user_id, 'is_bot': False, 'first_name': f'User {user_id}', 'language_code': 'ru'}
+        self._chat = {'id': user_id, 'type': 'private', 'first_name': f'User {user_id}'}
+
+    async def run(self) -> None:
+        """Start after a random ramp-up delay, then hold the configured conversations"""
+        await asyncio.sleep(self.random.uniform(0, self.args.ramp))
+        for _ in range(self.args.rounds):
+            self.stats.started += 1
+            try:
+                await self.converse()
+                self.stats.completed += 1
+            except StepFailed as e:
+                self.stats.errors[e.args[0]] += 1
+            await self.think()
+
+    async def converse(self) -> None:
+        """/start, open the search prompt, search, wait for results"""
+        started = time.perf_counter()
+
+        menu = await self.step('start', self.text_update('/start'))
+        if not self.has_button(menu, CallbackData.START_SEARCH):
+            raise StepFailed('unexpected_reply')
+        await self.think()
+
+        prompt = await self.step('open_search', self.callback_update(menu, CallbackData.START_SEARCH))
+        if prompt['message_id'] != menu['message_id']:
+            raise StepFailed('unexpected_reply')
+        await self.think()
+
+        await self.step('search', self.text_update(self.query()))
+
+        self.stats.latencies['conversation'].append(time.perf_counter() - started)
+
+    async def step(self, name: str, update: dict) -> dict:
+        """
+        Send an update and wait for the bot's reply to it
+
+        Status messages are skipped; the first other message to the chat
+        is the reply. Error, busy and rate limit replies fail the step.
+
+        Returns:
+            Message the bot sent or edited
+        """
+        # Late replies to an earlier step that timed out are not this step's reply
+        while not self.replies.empty():
+            self.replies.get_nowait()
+
+        started = time.perf_counter()
+        await self.bot.push_update(update)
+        deadline = started + self.args.timeout
+        while True:
+            try:
+                _, message = await asyncio.wait_for(self.replies.get(), deadline - time.perf_counter())
+            except asyncio.TimeoutError:
+                raise StepFailed('timeout')
+            if message['text'] != STATUS_TEXT:
+                break
+
+        if message['text'] == BUSY_TEXT:
+            raise StepFailed('busy')
+        if message['text'] == RATE_LIMITED_TEXT:
+            raise StepFailed('rate_limited')
+        if message['text'].startswith('❌'):
+            raise StepFailed('error_reply')
+        self.stats.latencies[name].append(time.perf_counter() - started)
+        return message
+
+    async def think(self) -> None:
+        """Pause like a person reading the reply"""
+        if self.args.think > 0:
+            await asyncio.sleep(self.random.expovariate(1 / self.args.think))
+
+    def query(self) -> str:
+        """Search text for a random participant: full, surname and class, or surname only"""
+        surname, name, patronymic, grade = self.random.choice(self.rows)[:4]
+        draw = self.random.random()
+        if draw < 0.7:
+            return f"{surname} {name} {patronymic} {grade}"
+        if draw < 0.9:
+            return f"{surname} {grade}"
+        return surname
+
+    def text_update(self, text: str) -> dict:
+        message = {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': self._chat,
+            'from': self._user,
+            'text': text
+        }
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        return {'message': message}
+
+    def callback_update(self, message: dict, data: str) -> dict:
+        return {
+            'callback_query': {
+                'id': f"{self.user_id}-{next(self._callback_ids)}",
+                'from': self._user,
+                'message': message,
+                'chat_instance': str(self.user_id),
+                'data': data
+            }
+        }
+
+    @staticmethod
+    def has_button(message: dict, callback_data: str) -> bool:
+        keyboard = message.get('reply_markup', {}).get('inline_keyboard', [])
+        return any(button.get('callback_data') == callback_data for row in keyboard for button in row)
+
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+async def wait_for_port(port: int, timeout: float) -> None:
+    """Wait until something accepts connections on a local port"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+
+def bot_environment(args, google: FakeGoogleAPI, bot: FakeBotAPI, work_dir: str) -> Dict[str, str]:
+    """Environment pointing main.py at the fakes"""
+    credentials_path = os.path.join(work_dir, 'credentials.json')
+    write_service_account(credentials_path, f"{google.url}/token")
+
+    env = dict(
+        os.environ,
+        PYTHONUNBUFFERED='1',
+        BOT_TOKEN=BOT_TOKEN,
+        BOT_MODE=args.mode,
+        BOT_API_BASE_URL=f"{bot.url}/bot",
+        BOT_API_FILE_URL=f"{bot.url}/file/bot",
+        SHEETS_API_ENDPOINT=f"{google.url}/",
+        DRIVE_API_ENDPOINT=f"{google.url}/drive/v3/",
+        GOOGLE_CREDENTIALS_PATH=credentials_path,
+        SPREADSHEET_ID='load-test',
+        SHEET_NAME='',
+        SHEET_SOURCES='',
+        SNAPSHOT_PATH=os.path.join(work_dir, 'snapshot.bin'),
+        PERSISTENCE_PATH=os.path.join(work_dir, 'state.sqlite3'),
+        SHARED_SNAPSHOT_DIR=os.path.join(work_dir, 'shared'),
+        LOG_FILE=os.path.join(work_dir, 'bot.log')
+    )
+    if args.mode == 'webhook':
+        port = free_port()
+        env.update(
+            WEBHOOK_URL=f"http://127.0.0.1:{port}",
+            WEBHOOK_LISTEN='127.0.0.1',
+            WEBHOOK_PORT=str(port),
+            WEBHOOK_SECRET_TOKEN=''
+        )
+    for assignment in args.env:
+        name, _, value = assignment.partition('=')
+        env[name] = value
+    return env
+
+
+async def run(args) -> Dict[str, Any]:
+    """Start the fakes and the bot, run the simulated users, collect results"""
+    values = generate_values(args.rows)
+    google = FakeGoogleAPI(values, Faults(args.sheets_latency, args.sheets_latency / 2,
+                                          args.sheets_error_rate, 0.0, seed=1))
+    bot = FakeBotAPI(BOT_TOKEN, Faults(args.bot_latency, args.bot_latency / 2,
+                                       args.bot_error_rate, args.bot_throttle_rate, seed=2))
+    google.start()
+    bot.start()
+
+    stats = LoadStats()
+    with tempfile.TemporaryDirectory(prefix='load_') as work_dir:
+        env = bot_environment(args, google, bot, work_dir)
+        log_path = os.path.join(work_dir, 'bot.log')
+        with open(os.path.join(work_dir, 'stdout.log'), 'wb') as stdout:
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, str(ROOT / 'main.py'),
+                cwd=str(ROOT), env=env, stdout=stdout, stderr=asyncio.subprocess.STDOUT
+            )
+        try:
+            print(f"Waiting for the bot to load {args.rows} rows and start {args.mode}...")
+            started = time.perf_counter()
+            await asyncio.wait_for(bot.ready.wait(), args.startup_timeout)
+            if args.mode == 'webhook':
+                await wait_for_port(int(env['WEBHOOK_PORT']), args.startup_timeout)
+            startup = time.perf_counter() - started
+            print(f"Bot ready in {startup:.1f}s, running {args.users} users x {args.rounds} conversations")
+
+            rows = values[1:]
+            users = [SimulatedUser(100_000 + number, bot, rows, stats, args) for number in range(args.users)]
+            started = time.perf_counter()
+            await asyncio.gather(*(user.run() for user in users))
+            duration = time.perf_counter() - started
+        finally:
+            if process.returncode is None:
+                process.send_signal(signal.SIGINT)
+                try:
+                    await asyncio.wait_for(process.wait(), 20)
+                except asyncio.TimeoutError:
+                    process.kill()
+            if args.keep_log:
+                Path(args.keep_log).write_bytes(Path(log_path).read_bytes() if os.path.exists(log_path) else b'')
+            await bot.stop()
+            google.stop()
+
+    report = stats.report()
+    report.update({
+        'users': args.users,
+        'rounds': args.rounds,
+        'rows': args.rows,
+        'mode': args.mode,
+        'startup_s': startup,
+        'duration_s': duration,
+        'conversations_per_s': stats.completed / duration if duration else 0.0,
+        'faults': {
+            'bot': {'latency': args.bot_latency, 'error_rate': args.bot_error_rate,
+                    'throttle_rate': args.bot_throttle_rate},
+            'sheets': {'latency': args.sheets_latency, 'error_rate': args.sheets_error_rate}
+        },
+        'env': args.env,
+        'bot_api': {'requests': dict(bot.requests), 'injected': dict(bot.injected),
+                    'webhook_failures': bot.webhook_failures},
+        'google_api': {'requests': dict(google.requests), 'injected': dict(google.injected)}
+    })
+    return report
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"\n{report['completed']}/{report['conversations']} conversations completed in "
+          f"{report['duration_s']:.1f}s ({report['conversations_per_s']:.1f}/s), "
+          f"error rate {report['error_rate']:.2%}")
+    print(f"{'step':>14} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for step, stats in report['steps'].items():
+        print(f"{step:>14} {stats['count']:>7} {stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} "
+              f"{stats['p99_ms']:>9.1f} {stats['max_ms']:>9.1f}")
+    if report['errors']:
+        print("Errors: " + ', '.join(f"{kind} {count}" for kind, count in sorted(report['errors'].items())))
+    print(f"Bot API: {report['bot_api']['requests']}, injected {report['bot_api']['injected']}")
+    print(f"Google API: {report['google_api']['requests']}, injected {report['google_api']['injected']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=200, help='concurrent simulated users')
+    parser.add_argument('--rounds', type=int, default=3, help='conversations per user')
+    parser.add_argument('--ramp', type=float, default=10.0, help='seconds over which users start')
+    parser.add_argument('--think', type=float, default=1.0, help='mean pause between steps, seconds')
+    parser.add_argument('--timeout', type=float, default=30.0, help='seconds to wait for a reply')
+    parser.add_argument('--rows', type=int, default=100_000, help='rows in the fake sheet')
+    parser.add_argument('--mode', choices=('polling', 'webhook'), default='polling')
+    parser.add_argument('--bot-latency', type=float, default=0.05, help='Bot API latency, seconds')
+    parser.add_argument('--bot-error-rate', type=float, default=0.0, help='share of Bot API calls failing')
+    parser.add_argument('--bot-throttle-rate', type=float, default=0.0, help='share of Bot API calls answered 429')
+    parser.add_argument('--sheets-latency', type=float, default=0.2, help='Sheets API latency, seconds')
+    parser.add_argument('--sheets-error-rate', type=float, default=0.0, help='share of Sheets API calls failing')
+    parser.add_argument('--startup-timeout', type=float, default=120.0)
+    parser.add_argument('--env', action='append', default=[], metavar='NAME=VALUE',
+                        help='extra environment for the bot, e.g. OUTBOUND_GLOBAL_RATE=1000')
+    parser.add_argument('--keep-log', help='copy the bot log here after the run')
+    parser.add_argument('--output', help='write the report as JSON')
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2, ensure_ascii=False))
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,61 @@
+"""
+Memory benchmark: compact RecordTable vs the old list of row dicts
+
+Usage:
+    python -m benchmarks.memory_snapshot [rows ...]
+"""
+
+import os
+import sys
+import tracemalloc
+
+os.environ.setdefault('BOT_TOKEN', 'benchmark')
+
+from benchmarks.synthetic import generate_values
+from src.services.records import RecordTable
+
+
+def build_dicts(values):
+    """Row dicts as get_all_data built them before RecordTable"""
+    headers = values[0]
+    data = []
+    for row in values[1:]:
+        row_data = row + [''] * (len(headers) - len(row))
+        data.append({headers[i]: row_data[i] for i in range(len(headers))})
+    return data
+
+
+def build_table(values):
+    """Compact row-tuple table"""
+    return RecordTable.from_values(values[0], values[1:])
+
+
+def measure(builder, values) -> int:
+    """
+    Bytes retained by builder's result once the raw API values are dropped
+
+    Cells are copied inside the traced region so the strings kept alive by
+    the result are counted too, just like after a real fetch.
+    """
+    tracemalloc.start()
+    fresh = [[cell.encode().decode() for cell in row] for row in values]
+    result = builder(fresh)
+    del fresh
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return retained
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000]
+    print(f"{'rows':>10} {'dicts MB':>10} {'table MB':>10} {'ratio':>7}")
+    for rows in sizes:
+        values = generate_values(rows)
+        dicts = measure(build_dicts, values)
+        table = measure(build_table, values)
+        print(f"{rows:>10} {dicts / 2**20:>10.1f} {table / 2**20:>10.1f} {dicts / table:>7.2f}")
+
+
+if __name__ == '__main__':
+    main()
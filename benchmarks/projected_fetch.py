@@ -0,0 +1,82 @@
+"""
+Fetch payload benchmark: whole-sheet values.get vs projected values.batchGet
+
+Simulates a wide sheet (the participant columns plus unrelated ones) and
+compares the JSON the API would send for both requests: payload size and
+the time to decode it and build a snapshot.
+
+Usage:
+    python -m benchmarks.projected_fetch [rows] [extra columns]
+"""
+
+import json
+import os
+import sys
+import time
+from itertools import zip_longest
+
+os.environ.setdefault('BOT_TOKEN', 'benchmark')
+
+from benchmarks.synthetic import generate_values
+from src.services.snapshot import Snapshot
+
+
+def widen(values, extra: int):
+    """Add unrelated columns after the participant columns"""
+    wide = [values[0] + [f"Поле {number}" for number in range(extra)]]
+    for row_number, row in enumerate(values[1:]):
+        wide.append(row + [f"значение {row_number}-{number}" for number in range(extra)])
+    return wide
+
+
+def rows_payload(values) -> bytes:
+    """values.get response with every column, row major"""
+    return json.dumps({'range': 'A1:ZZ', 'majorDimension': 'ROWS', 'values': values}, ensure_ascii=False).encode()
+
+
+def columns_payload(values, width: int) -> bytes:
+    """values.batchGet response for the first `width` columns, column major, fields-filtered"""
+    columns = [list(column) for column in zip(*(row[:width] for row in values))]
+    return json.dumps({'valueRanges': [{'values': columns}]}, ensure_ascii=False).encode()
+
+
+def from_rows(payload: bytes) -> Snapshot:
+    return Snapshot.from_values(json.loads(payload)['values'])
+
+
+def from_columns(payload: bytes) -> Snapshot:
+    columns = []
+    for value_range in json.loads(payload)['valueRanges']:
+        columns.extend(value_range['values'])
+    return Snapshot.from_values(list(zip_longest(*columns, fillvalue='')))
+
+
+def timed(function, payload: bytes) -> float:
+    """Best of three runs, in milliseconds"""
+    best = float('inf')
+    for _ in range(3):
+        started = time.perf_counter()
+        function(payload)
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    extra = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    values = generate_values(rows)
+    width = len(values[0])
+    wide = widen(values, extra)
+
+    full = rows_payload(wide)
+    projected = columns_payload(wide, width)
+
+    print(f"{rows} rows, {width} used + {extra} unrelated columns")
+    print(f"{'request':>22} {'payload MB':>11} {'decode+build ms':>16}")
+    print(f"{'values.get (all)':>22} {len(full) / 2**20:>11.1f} {timed(from_rows, full):>16.0f}")
+    print(f"{'batchGet (projected)':>22} {len(projected) / 2**20:>11.1f} {timed(from_columns, projected):>16.0f}")
+
+
+if __name__ == '__main__':
+    main()
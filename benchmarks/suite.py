@@ -0,0 +1,253 @@
+"""
+Benchmark suite for the data pipeline and search
+
+Runs every operation on synthetic sheets of several sizes and reports
+latency percentiles, throughput and peak traced memory per operation.
+Results are written as JSON tagged with the git commit, so runs made on
+different commits can be compared with --compare.
+
+Usage:
+    python -m benchmarks.suite [--sizes 1000,10000,100000,1000000] [--queries 2000]
+                               [--only search,format] [--output FILE] [--compare BASELINE]
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+os.environ.setdefault('BOT_TOKEN', 'benchmark')
+
+from benchmarks.synthetic import generate_values
+from src.services.pagination import store_results, render_page
+from src.services.records import RecordTable
+from src.services.search import SearchService
+from src.services.search_index import SearchIndex
+from src.services.snapshot import Snapshot
+from src.services.snapshot_store import save_snapshot, load_snapshot
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000, 1_000_000)
+RESULTS_DIR = Path(__file__).resolve().parent / 'results'
+
+# Share of rows changed between two fetches in the incremental refresh benchmark
+CHANGED_SHARE = 0.01
+
+# Calls repeated under tracemalloc to find the peak (tracing is slow)
+TRACED_CALLS = 50
+
+
+def percentile(sorted_samples: Sequence[float], share: float) -> float:
+    """Nearest-rank percentile of already sorted samples"""
+    position = min(len(sorted_samples) - 1, max(0, round(share * len(sorted_samples)) - 1))
+    return sorted_samples[position]
+
+
+def measure(function: Callable[[Any], Any], arguments: Sequence[Any]) -> Dict[str, float]:
+    """
+    Time one call per argument, then trace a few calls for peak memory
+
+    Args:
+        function: Operation under test
+        arguments: One argument per call
+
+    Returns:
+        Statistics in milliseconds, calls per second and peak bytes
+    """
+    samples = []
+    started = time.perf_counter()
+    for argument in arguments:
+        call_started = time.perf_counter()
+        function(argument)
+        samples.append(time.perf_counter() - call_started)
+    total = time.perf_counter() - started
+
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    for argument in arguments[:TRACED_CALLS]:
+        function(argument)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    samples.sort()
+    return {
+        'calls': len(samples),
+        'total_s': total,
+        'throughput_per_s': len(samples) / total if total else 0.0,
+        'mean_ms': total / len(samples) * 1000,
+        'p50_ms': percentile(samples, 0.50) * 1000,
+        'p95_ms': percentile(samples, 0.95) * 1000,
+        'p99_ms': percentile(samples, 0.99) * 1000,
+        'max_ms': samples[-1] * 1000,
+        'peak_memory_bytes': max(0, peak - baseline)
+    }
+
+
+def with_changes(values: List[List[str]], rng: random.Random) -> List[List[str]]:
+    """Copy of a sheet with CHANGED_SHARE of the rows edited"""
+    changed = [list(row) for row in values]
+    for position in rng.sample(range(1, len(values)), max(1, int((len(values) - 1) * CHANGED_SHARE))):
+        changed[position][4] = f"{changed[position][4]}-1"
+    return changed
+
+
+def operations(values: List[List[str]], queries: int, rng: random.Random, work_dir: str) -> Dict[str, tuple]:
+    """
+    Operations to benchmark for one sheet
+
+    Args:
+        values: Sheet in Sheets API format
+        queries: Calls per query operation
+        rng: Random source for picking queries
+        work_dir: Directory for the saved snapshot
+
+    Returns:
+        Name -> (function, arguments)
+    """
+    rows = len(values) - 1
+    builds = 3 if rows <= 100_000 else 1
+    snapshot = Snapshot.from_values(values)
+    data, index = snapshot.data, snapshot.index
+    records = [rng.choice(values[1:]) for _ in range(queries)]
+
+    exact = [tuple(record[:4]) for record in records]
+    partial = [{'surname': record[0], 'class': record[3]} for record in records]
+    surnames = [{'surname': record[0]} for record in records]
+    typos = [{'surname': record[0][:-2] + record[0][-1], 'name': record[1]} for record in records]
+    prefixes = [record[0][:rng.randint(2, len(record[0]))] for record in records]
+    result_sets = [SearchService.search_by_fields(data, criteria, index=index) for criteria in partial]
+    handles = [
+        store_results(snapshot, criteria, index.lookup_fields(criteria), False) for criteria in surnames
+    ]
+    changed = with_changes(values, rng)
+
+    snapshot_path = os.path.join(work_dir, 'snapshot.bin')
+    save_snapshot(snapshot, snapshot_path)
+
+    return {
+        'build_table': (lambda sheet: RecordTable.from_values(sheet[0], sheet[1:]), [values] * builds),
+        'build_index': (SearchIndex.build, [data] * builds),
+        'snapshot_from_values': (Snapshot.from_values, [values] * builds),
+        'incremental_refresh': (lambda sheet: Snapshot.from_values(sheet, previous=snapshot), [changed] * builds),
+        'save_snapshot': (lambda path: save_snapshot(snapshot, path), [snapshot_path] * builds),
+        'load_snapshot': (load_snapshot, [snapshot_path] * builds),
+        'search_by_all_fields': (
+            lambda key: SearchService.search_by_all_fields(data, *key, index=index), exact
+        ),
+        'search_by_fields': (
+            lambda criteria: SearchService.search_by_fields(data, criteria, index=index), partial
+        ),
+        'search_fuzzy': (lambda criteria: SearchService.search_fuzzy(data, criteria, index=index), typos),
+        'autocomplete': (lambda prefix: SearchService.autocomplete(data, prefix, index, 10), prefixes),
+        'format_results': (SearchService.format_results, result_sets),
+        'render_page': (lambda handle: render_page(snapshot, handle, 0), handles),
+    }
+
+
+def git_commit() -> Dict[str, Any]:
+    """Current commit and whether the working tree has changes"""
+    root = Path(__file__).resolve().parent.parent
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=root, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = bool(subprocess.run(
+            ['git', 'status', '--porcelain', '--untracked-files=no'],
+            cwd=root, capture_output=True, text=True, check=True
+        ).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return {'commit': None, 'dirty': None}
+    return {'commit': commit, 'dirty': dirty}
+
+
+def run(sizes: Sequence[int], queries: int, only: Optional[List[str]]) -> Dict[str, Any]:
+    """Run the suite and collect results"""
+    report = {
+        **git_commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'queries': queries,
+        'results': {}
+    }
+
+    for rows in sizes:
+        rng = random.Random(rows)
+        values = generate_values(rows)
+        print(f"\n{rows} rows")
+        print(f"{'operation':>22} {'calls':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ops/s':>10} {'peak MB':>8}")
+
+        results = {}
+        with tempfile.TemporaryDirectory(prefix='bench_') as work_dir:
+            for name, (function, arguments) in operations(values, queries, rng, work_dir).items():
+                if only and not any(part in name for part in only):
+                    continue
+                stats = measure(function, arguments)
+                results[name] = stats
+                print(
+                    f"{name:>22} {stats['calls']:>6} {stats['p50_ms']:>9.3f} {stats['p95_ms']:>9.3f} "
+                    f"{stats['p99_ms']:>9.3f} {stats['throughput_per_s']:>10.1f} "
+                    f"{stats['peak_memory_bytes'] / 2**20:>8.1f}"
+                )
+        report['results'][str(rows)] = results
+
+    # ru_maxrss is in kilobytes on Linux
+    report['max_rss_bytes'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return report
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    """Print p50/p99/throughput of this run relative to a baseline run"""
+    print(f"\nCompared with {(baseline.get('commit') or 'unknown')[:10]} (ratio new/old, <1 is faster for latency)")
+    print(f"{'rows':>8} {'operation':>22} {'p50':>7} {'p99':>7} {'ops/s':>7}")
+    for rows, results in report['results'].items():
+        for name, stats in results.items():
+            old = baseline.get('results', {}).get(rows, {}).get(name)
+            if not old:
+                continue
+            ratios = [
+                stats[key] / old[key] if old[key] else float('nan')
+                for key in ('p50_ms', 'p99_ms', 'throughput_per_s')
+            ]
+            print(f"{rows:>8} {name:>22} {ratios[0]:>7.2f} {ratios[1]:>7.2f} {ratios[2]:>7.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help='comma-separated row counts')
+    parser.add_argument('--queries', type=int, default=2000, help='calls per query operation')
+    parser.add_argument('--only', help='comma-separated substrings of operation names to run')
+    parser.add_argument('--output', help='result file (default: benchmarks/results/<commit>_<time>.json)')
+    parser.add_argument('--compare', help='earlier result file to compare with')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+    only = args.only.split(',') if args.only else None
+    report = run(sizes, args.queries, only)
+
+    if args.output:
+        output = Path(args.output)
+    else:
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        output = RESULTS_DIR / f"{(report['commit'] or 'nocommit')[:10]}_{stamp}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(report, json.load(f))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
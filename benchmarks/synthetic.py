@@ -0,0 +1,74 @@
+"""
+Synthetic spreadsheet data for benchmarks
+Produces rows shaped like the real participants sheet
+"""
+
+import random
+from typing import List
+
+HEADERS = ['Фамилия', 'Имя', 'Отчество', 'Класс', 'ID участника', 'Предметы']
+
+# Surnames are built from stems and suffixes to get realistic variety
+SURNAME_STEMS = [
+    'Иван', 'Смирн', 'Кузнец', 'Поп', 'Васильк', 'Петр', 'Сокол', 'Михайл',
+    'Новик', 'Фёдор', 'Мороз', 'Волк', 'Алексе', 'Лебед', 'Семён', 'Егор',
+    'Павл', 'Козл', 'Степан', 'Никола', 'Орл', 'Андре', 'Макар', 'Никит',
+    'Захар', 'Зайц', 'Соловь', 'Борис', 'Яковл', 'Григорь', 'Роман', 'Воробь',
+    'Серге', 'Кузьмин', 'Фрол', 'Александр', 'Дмитри', 'Королёв', 'Гусь', 'Киселёв',
+    'Ильин', 'Максим', 'Поляк', 'Сорокин', 'Виноград', 'Ковал', 'Белов', 'Медвед',
+    'Антон', 'Тарас', 'Жук', 'Баран', 'Филипп', 'Комар', 'Давыд', 'Белоус'
+]
+SURNAME_SUFFIXES = ['ов', 'ев', 'ин', 'ский', 'енко', 'ук']
+# Feminine form of each suffix ('енко' and 'ук' don't change)
+FEMININE_SUFFIXES = {'ов': 'ова', 'ев': 'ева', 'ин': 'ина', 'ский': 'ская'}
+NAMES = [
+    'Александр', 'Дмитрий', 'Максим', 'Сергей', 'Андрей', 'Алексей', 'Артём',
+    'Илья', 'Кирилл', 'Михаил', 'Никита', 'Матвей', 'Роман', 'Егор', 'Иван'
+]
+FEMALE_NAMES = [
+    'Анна', 'Мария', 'Елена', 'Дарья', 'Алина', 'Ирина', 'Екатерина',
+    'Арина', 'Полина', 'Ольга', 'Юлия', 'Татьяна', 'Наталья', 'Софья', 'Алёна'
+]
+PATRONYMICS = [
+    'Александрович', 'Дмитриевич', 'Сергеевич', 'Андреевич', 'Алексеевич',
+    'Иванович', 'Михайлович', 'Николаевич', 'Владимирович', 'Петрович'
+]
+FEMALE_PATRONYMICS = [
+    'Александровна', 'Дмитриевна', 'Сергеевна', 'Андреевна', 'Алексеевна',
+    'Ивановна', 'Михайловна', 'Николаевна', 'Владимировна', 'Петровна'
+]
+CLASS_LETTERS = 'АБВГД'
+SUBJECTS = [
+    'Математика', 'Физика', 'Информатика', 'Химия', 'Биология', 'История',
+    'Обществознание', 'Литература', 'Русский язык', 'Английский язык', 'География'
+]
+
+
+def generate_values(rows: int, seed: int = 42) -> List[List[str]]:
+    """
+    Generate a sheet in Sheets API 'values' format
+
+    Args:
+        rows: Number of data rows (header row is added on top)
+        seed: Random seed, so runs are comparable
+
+    Returns:
+        List of rows; the first row holds headers
+    """
+    rng = random.Random(seed)
+    values = [list(HEADERS)]
+    for number in range(rows):
+        subjects = rng.sample(SUBJECTS, rng.randint(1, 4))
+        suffix = rng.choice(SURNAME_SUFFIXES)
+        female = rng.random() < 0.5
+        if female:
+            suffix = FEMININE_SUFFIXES.get(suffix, suffix)
+        values.append([
+            rng.choice(SURNAME_STEMS) + suffix,
+            rng.choice(FEMALE_NAMES if female else NAMES),
+            rng.choice(FEMALE_PATRONYMICS if female else PATRONYMICS),
+            f"{rng.randint(5, 11)}{rng.choice(CLASS_LETTERS)}",
+            f"{100000 + number}",
+            '\n'.join(subjects)
+        ])
+    return values
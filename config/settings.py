@@ -18,22 +18,130 @@ BOT_TOKEN = os.getenv('BOT_TOKEN')
 if not BOT_TOKEN:
     raise ValueError("BOT_TOKEN is not set in environment variables")
 
+# How updates are received: 'polling' (getUpdates) or 'webhook' (embedded HTTP server)
+BOT_MODE = os.getenv('BOT_MODE', 'polling').lower()
+if BOT_MODE not in ('polling', 'webhook'):
+    raise ValueError(f"BOT_MODE must be 'polling' or 'webhook', got '{BOT_MODE}'")
+
+# Bot API server; override to use a local Bot API server or a fake one in load tests
+BOT_API_BASE_URL = os.getenv('BOT_API_BASE_URL', 'https://api.telegram.org/bot')
+BOT_API_FILE_URL = os.getenv('BOT_API_FILE_URL', 'https://api.telegram.org/file/bot')
+
+# Webhook mode: address the HTTP server listens on, and the public HTTPS base URL
+# (usually a reverse proxy in front of the listener); WEBHOOK_PATH is appended to it.
+# WEBHOOK_SECRET_TOKEN is checked on every request; a random one is used if empty.
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8443'))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', 'telegram')
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')
+WEBHOOK_SECRET_TOKEN = os.getenv('WEBHOOK_SECRET_TOKEN', '')
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', '40'))
+if BOT_MODE == 'webhook' and not WEBHOOK_URL:
+    raise ValueError("WEBHOOK_URL is not set in environment variables (required when BOT_MODE=webhook)")
+
 # Google Sheets Configuration
 SPREADSHEET_ID = os.getenv('SPREADSHEET_ID', '1YYvqtrrEG2ssNLbKnsIX3goVQfpeJ-E8wcM06P2ts7Q')
 SHEET_NAME = os.getenv('SHEET_NAME', '')  # Empty string means first sheet
 
+# Several sheets merged into one searchable table: ';'-separated entries of
+# "[tag=]spreadsheet_id[/sheet name]". Empty means SPREADSHEET_ID/SHEET_NAME only.
+SHEET_SOURCES = os.getenv('SHEET_SOURCES', '')
+
+# Per-source fetch: retries after a failed attempt, delay before the first
+# retry (doubles after each), and how long a refresh waits for a slow source
+# before serving its last good data
+SOURCE_FETCH_RETRIES = int(os.getenv('SOURCE_FETCH_RETRIES', '2'))
+SOURCE_RETRY_DELAY = float(os.getenv('SOURCE_RETRY_DELAY', '1'))
+SOURCE_FETCH_TIMEOUT = float(os.getenv('SOURCE_FETCH_TIMEOUT', '60'))
+
 # Google credentials file path
 GOOGLE_CREDENTIALS_PATH = os.getenv(
     'GOOGLE_CREDENTIALS_PATH',
     str(BASE_DIR / 'config' / 'google_credentials.json')
 )
 
+# Google API servers; override to use a proxy or a fake one in load tests.
+# Empty means the public endpoints. DRIVE_API_ENDPOINT includes the service
+# path (e.g. http://127.0.0.1:8001/drive/v3/)
+SHEETS_API_ENDPOINT = os.getenv('SHEETS_API_ENDPOINT', '')
+DRIVE_API_ENDPOINT = os.getenv('DRIVE_API_ENDPOINT', '')
+
 # Logging Configuration
 LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
 LOG_FILE = os.getenv('LOG_FILE', str(BASE_DIR / 'logs' / 'bot.log'))
 
+# Log records are written by a background thread; LOG_QUEUE_SIZE records may
+# wait for it (more are dropped rather than blocking the bot). The file rotates
+# at LOG_MAX_BYTES (0 disables rotation) keeping LOG_BACKUP_COUNT old files.
+# LOG_FORMAT is 'text' or 'json' (one compact JSON object per line).
+# LOG_SAMPLE_RATE is the share of per-request INFO messages (searches, menu
+# navigation) that are written; warnings and errors are always written.
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', '5'))
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text').lower()
+if LOG_FORMAT not in ('text', 'json'):
+    raise ValueError(f"LOG_FORMAT must be 'text' or 'json', got '{LOG_FORMAT}'")
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', '0.1'))
+
+# Metrics: Prometheus endpoint (GET /metrics, also /metrics.json; off unless
+# METRICS_PORT is set, e.g. 9464, and local-only unless METRICS_LISTEN is
+# widened) and an optional JSON file rewritten every METRICS_DUMP_INTERVAL
+# seconds for deployments without scraping (empty path disables it)
+METRICS_LISTEN = os.getenv('METRICS_LISTEN', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+METRICS_DUMP_PATH = os.getenv('METRICS_DUMP_PATH', '')
+METRICS_DUMP_INTERVAL = float(os.getenv('METRICS_DUMP_INTERVAL', '60'))
+
+# Updates taking longer than SLOW_UPDATE_SECONDS (from arrival to the last reply)
+# are logged with the time spent in each phase; 0 disables the log
+SLOW_UPDATE_SECONDS = float(os.getenv('SLOW_UPDATE_SECONDS', '2.0'))
+
+# Telegram user ids allowed to use admin commands, comma-separated
+ADMIN_USER_IDS = frozenset(
+    int(user_id) for user_id in os.getenv('ADMIN_USER_IDS', '').replace(',', ' ').split()
+)
+
+# /profile [N]: stack sampling interval in seconds, updates profiled when N is
+# not given, the largest N accepted, and the longest a profile may run in seconds
+PROFILE_INTERVAL = float(os.getenv('PROFILE_INTERVAL', '0.005'))
+PROFILE_DEFAULT_UPDATES = int(os.getenv('PROFILE_DEFAULT_UPDATES', '100'))
+PROFILE_MAX_UPDATES = int(os.getenv('PROFILE_MAX_UPDATES', '5000'))
+PROFILE_TIMEOUT = float(os.getenv('PROFILE_TIMEOUT', '600'))
+
+# Concurrent update processing: handlers running at once, admitted updates allowed
+# to wait beyond that (further updates get a "busy" reply), and the per-user
+# token bucket (updates per second and burst size; USER_RATE_LIMIT=0 disables it)
+UPDATE_WORKERS = int(os.getenv('UPDATE_WORKERS', '32'))
+UPDATE_QUEUE_SIZE = int(os.getenv('UPDATE_QUEUE_SIZE', '256'))
+USER_RATE_LIMIT = float(os.getenv('USER_RATE_LIMIT', '2'))
+USER_RATE_BURST = float(os.getenv('USER_RATE_BURST', '10'))
+
+# Search worker processes (0 runs searches in the bot process). The bot process
+# keeps the Telegram connection, conversations and the sheet refresh; every new
+# snapshot is written to SHARED_SNAPSHOT_DIR in a layout the workers map
+# read-only, so they share one copy of the data instead of loading their own.
+# A tmpfs directory such as /dev/shm keeps these files off the disk.
+SEARCH_WORKERS = int(os.getenv('SEARCH_WORKERS', '0'))
+SHARED_SNAPSHOT_DIR = os.getenv('SHARED_SNAPSHOT_DIR', str(BASE_DIR / 'data' / 'shared'))
+
+# Outbound message pacing (Telegram flood limits): messages per second overall,
+# seconds between messages to one chat, and how long a status message such as
+# "Ищу..." is held back - if the result is ready by then, only the result is sent
+OUTBOUND_GLOBAL_RATE = float(os.getenv('OUTBOUND_GLOBAL_RATE', '30'))
+OUTBOUND_CHAT_INTERVAL = float(os.getenv('OUTBOUND_CHAT_INTERVAL', '1.0'))
+# Messages a chat that was quiet for a while may get without waiting
+OUTBOUND_CHAT_BURST = int(os.getenv('OUTBOUND_CHAT_BURST', '2'))
+STATUS_MESSAGE_DELAY = float(os.getenv('STATUS_MESSAGE_DELAY', '0.5'))
+
+# Check the Drive file version before downloading the sheet on refresh.
+# Requires the service account to have Drive metadata read access.
+DRIVE_CHANGE_CHECK = os.getenv('DRIVE_CHANGE_CHECK', 'false').lower() in ('1', 'true', 'yes')
+
 # Google Sheets API scope
 SCOPES = ['https://www.googleapis.com/auth/spreadsheets.readonly']
+if DRIVE_CHANGE_CHECK:
+    SCOPES.append('https://www.googleapis.com/auth/drive.metadata.readonly')
 
 # Column names in the spreadsheet (for reference)
 SEARCH_COLUMNS = {
@@ -48,5 +156,42 @@ RESULT_COLUMNS = {
     'subjects': 'Предметы'
 }
 
-# Cache settings (optional, for future optimization)
-CACHE_TTL = 300  # Cache time-to-live in seconds (5 minutes)
+# Column added to every row with the tag of the source it came from
+SOURCE_COLUMN = 'Источник'
+
+# Maximum number of records shown in one search reply
+MAX_DISPLAY_RESULTS = int(os.getenv('MAX_DISPLAY_RESULTS', '10'))
+
+# Records per page of search results, and how many result sets are kept
+# per snapshot for paging back and forth
+RESULTS_PAGE_SIZE = int(os.getenv('RESULTS_PAGE_SIZE', '5'))
+RESULT_SETS_CACHE_SIZE = int(os.getenv('RESULT_SETS_CACHE_SIZE', '10000'))
+
+# Rendered replies kept for repeated searches (dropped whenever the data changes)
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', '2048'))
+
+# Inline mode (@bot Иванов): suggestions per query and how long Telegram may cache them
+INLINE_RESULTS_LIMIT = int(os.getenv('INLINE_RESULTS_LIMIT', '10'))
+INLINE_CACHE_TIME = int(os.getenv('INLINE_CACHE_TIME', '60'))
+
+# Bulk lookup: largest accepted upload (Telegram bots can download up to 20 MB)
+# and the number of lines processed per file
+BULK_MAX_FILE_SIZE = int(os.getenv('BULK_MAX_FILE_SIZE', str(20 * 1024 * 1024)))
+BULK_MAX_LINES = int(os.getenv('BULK_MAX_LINES', '50000'))
+
+# Cache settings
+CACHE_TTL = int(os.getenv('CACHE_TTL', '300'))  # Snapshot time-to-live in seconds (5 minutes)
+
+# Local copy of the last good snapshot, loaded on startup before the sheet is fetched.
+# Set to an empty string to disable.
+SNAPSHOT_PATH = os.getenv('SNAPSHOT_PATH', str(BASE_DIR / 'data' / 'snapshot.bin'))
+
+# Conversation states and user data kept across restarts (SQLite database; an
+# empty string disables it). Changes are written in the background in batches,
+# every PERSISTENCE_INTERVAL seconds and on shutdown.
+PERSISTENCE_PATH = os.getenv('PERSISTENCE_PATH', str(BASE_DIR / 'data' / 'state.sqlite3'))
+PERSISTENCE_INTERVAL = float(os.getenv('PERSISTENCE_INTERVAL', '5'))
+
+# Backoff between failed background refreshes (doubles after every failure)
+REFRESH_BACKOFF_INITIAL = float(os.getenv('REFRESH_BACKOFF_INITIAL', '5'))
+REFRESH_BACKOFF_MAX = float(os.getenv('REFRESH_BACKOFF_MAX', '300'))
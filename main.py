@@ -4,64 +4,161 @@ Main entry point of the application
 """
 
 import logging
+import secrets
+from telegram import Update
 from telegram.ext import (
     Application,
     CommandHandler,
     CallbackQueryHandler,
     MessageHandler,
+    InlineQueryHandler,
     ConversationHandler,
     filters
 )
 
 # Import configuration and utilities
-from config.settings import BOT_TOKEN
+from config.settings import (
+    BOT_TOKEN,
+    BOT_MODE,
+    BOT_API_BASE_URL,
+    BOT_API_FILE_URL,
+    WEBHOOK_LISTEN,
+    WEBHOOK_PORT,
+    WEBHOOK_PATH,
+    WEBHOOK_URL,
+    WEBHOOK_SECRET_TOKEN,
+    WEBHOOK_MAX_CONNECTIONS,
+    METRICS_LISTEN,
+    METRICS_PORT,
+    METRICS_DUMP_PATH,
+    METRICS_DUMP_INTERVAL,
+    ADMIN_USER_IDS,
+    SEARCH_WORKERS,
+    PERSISTENCE_PATH
+)
 from src.utils.logger import setup_logger
+from src.utils.metrics import metrics, start_metrics_server, MetricsDumper
 from src.bot.states import States, CallbackData
 from src.bot.handlers import (
     start_command,
     help_command,
     start_search_callback,
     all_fields_value_entered,
+    results_page_callback,
     new_search_callback,
     back_to_menu_callback,
     show_help_callback,
     cancel_callback,
+    inline_query_handler,
+    bulk_document_handler,
+    profile_command,
+    reload_command,
+    stats_command,
     error_handler,
     ENTERING_ALL_FIELDS_VALUE
 )
+from src.bot.update_processor import FairUpdateProcessor
+from src.bot.outbound import outbound
+from src.bot.persistence import SQLitePersistence
 from src.services.google_sheets import sheets_service
+from src.services.response_cache import response_cache
+from src.services.search_workers import search_workers
 
-# Initialize logger
-setup_logger()
 logger = logging.getLogger(__name__)
 
 
 def main():
     """
     Main function to start the bot
-    Initializes handlers and starts polling
+    Initializes handlers and starts receiving updates (polling or webhook)
     """
     
     logger.info("=" * 50)
     logger.info("Starting Telegram Bot")
     logger.info("=" * 50)
     
-    # Test Google Sheets connection on startup
-    logger.info("Testing Google Sheets connection...")
-    if sheets_service.connect():
-        logger.info("✅ Google Sheets connection successful")
-        # Pre-fetch data to cache it
-        data = sheets_service.get_all_data()
-        if data:
-            logger.info(f"✅ Successfully loaded {len(data)} records from spreadsheet")
-        else:
-            logger.warning("⚠️ Connected but no data retrieved")
+    # Metrics endpoint and optional JSON dump run in their own threads
+    if METRICS_PORT:
+        start_metrics_server(metrics, METRICS_LISTEN, METRICS_PORT)
+    metrics_dumper = None
+    if METRICS_DUMP_PATH:
+        metrics_dumper = MetricsDumper(metrics, METRICS_DUMP_PATH, METRICS_DUMP_INTERVAL)
+        metrics_dumper.start()
+    
+    # Cached replies are only valid for the data they were rendered from
+    sheets_service.add_snapshot_listener(response_cache.clear)
+    
+    # Worker processes search a copy of every new snapshot shared through memory-mapped files
+    if SEARCH_WORKERS:
+        search_workers.start()
+        sheets_service.add_snapshot_listener(search_workers.publish)
+    
+    # Serve from the locally saved snapshot right away if there is one;
+    # the live sheet is reconciled in the background once the bot is running
+    snapshot_loaded = sheets_service.load_saved_snapshot()
+    
+    if snapshot_loaded:
+        snapshot = sheets_service.get_snapshot()
+        logger.info(
+            "✅ Loaded %s records from saved snapshot (%.0fs old), refreshing in background",
+            len(snapshot), snapshot.age()
+        )
     else:
-        logger.error("❌ Failed to connect to Google Sheets")
-        logger.error("Bot will continue but searches will fail until connection is established")
+        # Test Google Sheets connection on startup
+        logger.info("Testing Google Sheets connection...")
+        if sheets_service.connect():
+            logger.info("✅ Google Sheets connection successful")
+            # Pre-fetch data to cache it
+            data = sheets_service.get_all_data()
+            if data:
+                logger.info("✅ Successfully loaded %s records from spreadsheet", len(data))
+            else:
+                logger.warning("⚠️ Connected but no data retrieved")
+        else:
+            logger.error("❌ Failed to connect to Google Sheets")
+            logger.error("Bot will continue but searches will fail until connection is established")
+    
+    async def post_init(application: Application) -> None:
+        """Reconcile the saved snapshot with the live sheet once the loop is running"""
+        if snapshot_loaded:
+            sheets_service.start_background_refresh()
+    
+    async def post_shutdown(application: Application) -> None:
+        """Stop the send dispatcher and let an in-flight refresh finish so its snapshot is saved completely"""
+        await outbound.stop()
+        await sheets_service.close()
+        search_workers.stop()
+        if metrics_dumper is not None:
+            metrics_dumper.stop()
+    
+    update_processor = FairUpdateProcessor()
+    metrics.gauge(
+        'bot_updates_in_progress', 'Admitted updates running or waiting for a worker',
+        lambda: update_processor.admitted
+    )
+    metrics.counter_function(
+        'bot_updates_shed', 'Updates answered with "busy" because the bot was overloaded',
+        lambda: update_processor.shed
+    )
+    metrics.counter_function(
+        'bot_updates_rate_limited', 'Updates dropped by the per-user rate limit',
+        lambda: update_processor.rate_limited
+    )
     
     # Create application
-    application = Application.builder().token(BOT_TOKEN).build()
+    builder = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .base_url(BOT_API_BASE_URL)
+        .base_file_url(BOT_API_FILE_URL)
+        .concurrent_updates(update_processor)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+    )
+    # Conversation states and user data survive restarts
+    if PERSISTENCE_PATH:
+        builder = builder.persistence(SQLitePersistence(PERSISTENCE_PATH))
+    application = builder.build()
     
     # Define conversation handler with states
     conversation_handler = ConversationHandler(
@@ -81,36 +178,85 @@ def main():
             States.SHOWING_RESULTS: [
                 CallbackQueryHandler(new_search_callback, pattern=f'^{CallbackData.NEW_SEARCH}$'),
                 CallbackQueryHandler(back_to_menu_callback, pattern=f'^{CallbackData.BACK_TO_MENU}$'),
+                CallbackQueryHandler(results_page_callback, pattern=f'^{CallbackData.PAGE}:'),
             ],
         },
         fallbacks=[
             CommandHandler('start', start_command),
             CallbackQueryHandler(cancel_callback, pattern=f'^{CallbackData.CANCEL}$'),
+            CallbackQueryHandler(results_page_callback, pattern=f'^{CallbackData.PAGE}:'),
         ],
-        allow_reentry=True
+        allow_reentry=True,
+        name='main',
+        persistent=bool(PERSISTENCE_PATH)
     )
     
     # Add handlers to application
     application.add_handler(conversation_handler)
     application.add_handler(CommandHandler('help', help_command))
+    application.add_handler(InlineQueryHandler(inline_query_handler))
+    application.add_handler(MessageHandler(filters.Document.ALL, bulk_document_handler))
+    
+    # Admin commands; other users' commands are left unhandled
+    admin_filter = filters.User(user_id=ADMIN_USER_IDS)
+    application.add_handler(CommandHandler('profile', profile_command, filters=admin_filter))
+    application.add_handler(CommandHandler('reload', reload_command, filters=admin_filter))
+    application.add_handler(CommandHandler('stats', stats_command, filters=admin_filter))
     
     # Add error handler
     application.add_error_handler(error_handler)
     
     # Start the bot
-    logger.info("Bot is starting polling...")
     logger.info("Press Ctrl+C to stop the bot")
     
     try:
         # Run the bot until interrupted
-        application.run_polling(allowed_updates=True)
+        if BOT_MODE == 'webhook':
+            run_webhook(application)
+        else:
+            logger.info("Bot is starting polling...")
+            application.run_polling(allowed_updates=Update.ALL_TYPES)
     except KeyboardInterrupt:
         logger.info("Bot stopped by user")
     except Exception as e:
-        logger.error(f"Fatal error: {e}", exc_info=True)
+        logger.error("Fatal error: %s", e, exc_info=True)
     finally:
         logger.info("Bot shutdown complete")
 
 
+
+def run_webhook(application: Application) -> None:
+    """
+    Receive updates through the embedded webhook server
+    
+    The webhook is registered with Telegram on startup. Requests without
+    the secret token in the X-Telegram-Bot-Api-Secret-Token header are
+    rejected before any update is processed.
+    
+    Args:
+        application: Configured bot application
+    """
+    # Telegram allows only A-Z, a-z, 0-9, _ and - in the secret token
+    secret_token = WEBHOOK_SECRET_TOKEN or secrets.token_urlsafe(32)
+    url_path = WEBHOOK_PATH.strip('/')
+    webhook_url = f"{WEBHOOK_URL.rstrip('/')}/{url_path}"
+    
+    logger.info("Bot is starting webhook server on %s:%s/%s", WEBHOOK_LISTEN, WEBHOOK_PORT, url_path)
+    logger.info("Webhook URL: %s", webhook_url)
+    
+    application.run_webhook(
+        listen=WEBHOOK_LISTEN,
+        port=WEBHOOK_PORT,
+        url_path=url_path,
+        webhook_url=webhook_url,
+        secret_token=secret_token,
+        max_connections=WEBHOOK_MAX_CONNECTIONS,
+        allowed_updates=Update.ALL_TYPES
+    )
+
+
 if __name__ == '__main__':
+    # Initialize logger here rather than on import: search worker processes
+    # import this module too and must not start their own log file writer
+    setup_logger()
     main()
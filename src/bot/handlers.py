@@ -3,33 +3,65 @@ Telegram bot handlers
 Handles commands, callbacks, and user messages
 """
 
+import asyncio
+import html
 import logging
-from telegram import Update
+import os
+import tempfile
+import time
+from telegram import Update, InlineQueryResultArticle, InputTextMessageContent, InputFile
 from telegram.ext import ContextTypes, ConversationHandler
 from src.bot.states import States, CallbackData
+from src.bot.outbound import outbound, PRIORITY_REPLY, PRIORITY_RESULT
 from src.bot.keyboards import (
     get_main_menu_keyboard,
     get_field_selection_keyboard,
-    get_new_search_keyboard,
-    get_cancel_keyboard
+    get_cancel_keyboard,
+    get_results_keyboard
 )
 from src.services.google_sheets import sheets_service
 from src.services.search import search_service
-from config.settings import SEARCH_COLUMNS
+from src.services.bulk import resolve_file
+from src.services.pagination import store_results, render_page, search_first_page, ResultPage
+from src.services.search_workers import search_workers
+from src.services.response_cache import response_cache, CachedResponse
+from src.services.search_index import normalize_criteria
+from src.utils.metrics import metrics, timed
+from src.utils.logger import get_sampled_logger
+from src.utils.tracing import span
+from src.utils.profiler import profiler
+from src.utils.memory import process_rss, deep_size
+from config.settings import (
+    INLINE_RESULTS_LIMIT,
+    INLINE_CACHE_TIME,
+    BULK_MAX_FILE_SIZE,
+    BULK_MAX_LINES,
+    RESULTS_PAGE_SIZE,
+    MAX_DISPLAY_RESULTS,
+    PROFILE_DEFAULT_UPDATES,
+    PROFILE_MAX_UPDATES,
+    PROFILE_TIMEOUT
+)
 
 # State for combined search
 ENTERING_ALL_FIELDS_VALUE = 10  # New state for entering combined search data
 
 logger = logging.getLogger(__name__)
+# Per-request activity lines, written for a sample of requests
+request_logger = get_sampled_logger(__name__)
+
+HANDLER_SECONDS = metrics.histogram('bot_handler_duration_seconds', 'Time spent in a handler', ('handler',))
+HANDLER_ERRORS = metrics.counter('bot_handler_errors', 'Handler calls that raised', ('handler',))
 
 
+@timed(HANDLER_SECONDS, HANDLER_ERRORS)
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """
     Handler for /start command
     Shows welcome message and main menu
     """
     user = update.effective_user
-    logger.info(f"User {user.id} ({user.username}) started the bot")
+    request_logger.info("User %s (%s) started the bot", user.id, user.username)
     
     welcome_text = (
         f"👋 Здравствуйте, {user.first_name}!\n\n"
@@ -42,7 +74,8 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
         "Нажмите кнопку ниже, чтобы начать поиск."
     )
     
-    await update.message.reply_text(
+    await outbound.reply(
+        update.message,
         welcome_text,
         reply_markup=get_main_menu_keyboard()
     )
@@ -50,6 +83,7 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
     return States.MAIN_MENU
 
 
+@timed(HANDLER_SECONDS, HANDLER_ERRORS)
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """
     Handler for /help command
@@ -62,24 +96,36 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         "/help - Показать эту справку\n\n"
         "<b>Как использовать:</b>\n"
         "1. Нажмите 'Начать поиск'\n"
-        "2. Выберите поле для поиска (Фамилия/Имя/Отчество/Класс)\n"
-        "3. Введите значение для поиска\n"
-        "4. Получите результаты\n\n"
+        "2. Введите Фамилию Имя Отчество Класс (можно не все поля)\n"
+        "3. Получите результаты\n\n"
         "<b>Особенности поиска:</b>\n"
         "• Поиск НЕ учитывает регистр (ИВАНОВ = иванов)\n"
-        "• Поиск ищет ТОЧНОЕ совпадение\n"
-        "• Если найдено несколько результатов, будут показаны все\n\n"
+        "• Можно указать не все поля, например только фамилию или класс - "
+        "найдутся все записи, совпадающие с указанными полями\n"
+        "• Если точных совпадений нет, бот предложит до "
+        f"{MAX_DISPLAY_RESULTS} похожих записей (опечатки, пропущенные буквы, ё вместо е)\n"
+        f"• Результаты показываются по {RESULTS_PAGE_SIZE} на странице, "
+        "листайте кнопками ◀️ ▶️\n\n"
+        "<b>Быстрый поиск:</b>\n"
+        "Наберите в любом чате @имя_бота и начало фамилии, "
+        "бот сразу предложит подходящих участников\n\n"
+        "<b>Поиск по списку:</b>\n"
+        "Отправьте боту файл .csv или .txt, где в каждой строке "
+        "Фамилия Имя Отчество Класс, и получите таблицу с ID и предметами "
+        f"(не больше {MAX_DISPLAY_RESULTS} записей на строку)\n\n"
         "<b>Что вы получите:</b>\n"
         "• ID участника\n"
         "• Список предметов участника"
     )
     
-    await update.message.reply_text(
+    await outbound.reply(
+        update.message,
         help_text,
         parse_mode='HTML'
     )
 
 
+@timed(HANDLER_SECONDS, HANDLER_ERRORS)
 async def start_search_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """
     Handler for 'Start Search' button
@@ -88,22 +134,27 @@ async def start_search_callback(update: Update, context: ContextTypes.DEFAULT_TY
     query = update.callback_query
     await query.answer()
     
-    logger.info(f"User {query.from_user.id} started search")
+    request_logger.info("User %s started search", query.from_user.id)
     
     # Mark that we're doing combined search
     context.user_data['search_mode'] = 'all_fields'
     
-    await query.edit_message_text(
+    await outbound.edit(
+        query,
         "✍️ <b>Введите данные для поиска:</b>\n\n"
         "Формат: Фамилия Имя Отчество Класс\n\n"
-        "Например: <code>Иванов Иван Иванович 10</code>",
+        "Например: <code>Иванов Иван Иванович 10</code>\n\n"
+        "Можно указать только часть данных: <code>Иванов</code>, "
+        "<code>Иванов 10</code> или только класс <code>10А</code>",
         parse_mode='HTML',
-        reply_markup=get_cancel_keyboard()
+        reply_markup=get_cancel_keyboard(),
+        priority=PRIORITY_REPLY
     )
     
     return ENTERING_ALL_FIELDS_VALUE
 
 
+@timed(HANDLER_SECONDS, HANDLER_ERRORS)
 async def all_fields_value_entered(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """
     Handler for user input when searching by all fields
@@ -113,67 +164,70 @@ async def all_fields_value_entered(update: Update, context: ContextTypes.DEFAULT
     search_text = update.message.text.strip()
     
     if not search_text:
-        await update.message.reply_text(
+        await outbound.reply(
+            update.message,
             "❌ Вы не ввели данные. Попробуйте снова:\n\n"
             "Формат: Фамилия Имя Отчество Класс",
             reply_markup=get_cancel_keyboard()
         )
         return ENTERING_ALL_FIELDS_VALUE
     
-    # Parse input - split by spaces
-    parts = search_text.split()
-    
-    if len(parts) < 4:
-        await update.message.reply_text(
-            "❌ Недостаточно данных. Введите все 4 параметра:\n\n"
-            "Формат: Фамилия Имя Отчество Класс\n"
-            "Например: <code>Иванов Иван Иванович 10</code>",
-            parse_mode='HTML',
-            reply_markup=get_cancel_keyboard()
-        )
-        return ENTERING_ALL_FIELDS_VALUE
+    # Parse input - any subset of "Фамилия Имя Отчество Класс"
+    criteria = search_service.parse_query(search_text)
     
-    # Extract fields
-    surname = parts[0]
-    name = parts[1]
-    patronymic = parts[2]
-    class_name = ' '.join(parts[3:])  # In case class has spaces
+    request_logger.info("User %s searching for %s", user.id, criteria)
     
-    logger.info(f"User {user.id} searching by all fields: {surname} {name} {patronymic} {class_name}")
-    
-    # Show "searching" message
-    status_message = await update.message.reply_text("🔄 Ищу...")
+    # "Searching" message - skipped if the result is ready before it goes out
+    status = outbound.status(update.message, "🔄 Ищу...")
     
     try:
-        # Fetch data from Google Sheets
-        data = sheets_service.get_all_data()
+        # Read before the snapshot so a reply rendered from data that gets
+        # replaced meanwhile is not cached
+        generation = response_cache.generation
+        
+        # Fetch data snapshot (records + search index) from Google Sheets
+        with span('snapshot'):
+            snapshot = await sheets_service.get_snapshot_async()
         
-        if data is None:
-            await status_message.edit_text(
+        if snapshot is None:
+            await status.finish(
                 "❌ Ошибка подключения к Google Sheets.\n"
                 "Пожалуйста, попробуйте позже.",
                 reply_markup=get_main_menu_keyboard()
             )
             return States.MAIN_MENU
         
-        # Perform combined search
-        results = search_service.search_by_all_fields(
-            data, surname, name, patronymic, class_name
-        )
+        cache_key = normalize_criteria(criteria)
+        response = response_cache.get(cache_key)
         
-        # Format and send results
-        formatted_results = search_service.format_results(results)
+        if response is None:
+            # Perform combined search (all given fields must match);
+            # close matches are suggested when there is no exact one
+            with span('search'):
+                result = await search_workers.search(snapshot, criteria)
+            if result is not None:
+                page, positions, fuzzy = result
+                # Later pages are rendered here, from this process's snapshot
+                store_results(snapshot, criteria, positions, fuzzy)
+            else:
+                with span('render'):
+                    page, positions, fuzzy = search_first_page(snapshot, criteria)
+            response = CachedResponse(page.text, _results_keyboard(page), page.handle, tuple(positions), fuzzy)
+            response_cache.put(cache_key, response, generation)
+        elif response.handle not in snapshot.result_sets:
+            # Result set was evicted; page buttons of the cached reply need it back
+            store_results(snapshot, criteria, response.positions, response.fuzzy)
         
-        await status_message.edit_text(
-            formatted_results,
-            reply_markup=get_new_search_keyboard()
+        await status.finish(
+            response.text,
+            reply_markup=response.reply_markup
         )
         
-        logger.info(f"Combined search completed for user {user.id}: {len(results)} results found")
+        request_logger.info("Combined search completed for user %s: %s results found", user.id, len(response.positions))
         
     except Exception as e:
-        logger.error(f"Error during combined search: {e}", exc_info=True)
-        await status_message.edit_text(
+        logger.error("Error during combined search: %s", e, exc_info=True)
+        await status.finish(
             "❌ Произошла ошибка при поиске. Попробуйте позже.",
             reply_markup=get_main_menu_keyboard()
         )
@@ -184,6 +238,49 @@ async def all_fields_value_entered(update: Update, context: ContextTypes.DEFAULT
     return States.SHOWING_RESULTS
 
 
+@timed(HANDLER_SECONDS, HANDLER_ERRORS)
+async def results_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """
+    Handler for previous/next page buttons under search results
+    Callback data: "page:<result handle>:<offset>"
+    """
+    query = update.callback_query
+    
+    try:
+        _, handle, offset = query.data.split(':')
+        offset = int(offset)
+    except ValueError:
+        await query.answer()
+        return States.SHOWING_RESULTS
+    
+    with span('snapshot'):
+        snapshot = await sheets_service.get_snapshot_async()
+    with span('render'):
+        page = render_page(snapshot, handle, offset) if snapshot is not None else None
+    
+    if page is None:
+        # Data was reloaded since the search - positions are no longer valid
+        await query.answer("Результаты устарели, выполните поиск заново", show_alert=True)
+        return States.SHOWING_RESULTS
+    
+    await query.answer()
+    await outbound.edit(
+        query,
+        page.text,
+        reply_markup=_results_keyboard(page)
+    )
+    
+    return States.SHOWING_RESULTS
+
+
+def _results_keyboard(page: ResultPage):
+    """Keyboard with page navigation for a rendered result page"""
+    return get_results_keyboard(
+        page.handle, page.offset, page.has_previous, page.has_next, RESULTS_PAGE_SIZE
+    )
+
+
+@timed(HANDLER_SECONDS, HANDLER_ERRORS)
 async def new_search_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """
     Handler for 'New Search' button
@@ -192,23 +289,28 @@ async def new_search_callback(update: Update, context: ContextTypes.DEFAULT_TYPE
     query = update.callback_query
     await query.answer()
     
-    logger.info(f"User {query.from_user.id} starting new search")
+    request_logger.info("User %s starting new search", query.from_user.id)
     
     # Clear previous search data
     context.user_data.clear()
     context.user_data['search_mode'] = 'all_fields'
     
-    await query.edit_message_text(
+    await outbound.edit(
+        query,
         "✍️ <b>Введите данные для поиска:</b>\n\n"
         "Формат: Фамилия Имя Отчество Класс\n\n"
-        "Например: <code>Иванов Иван Иванович 10А</code>",
+        "Например: <code>Иванов Иван Иванович 10А</code>\n\n"
+        "Можно указать только часть данных: <code>Иванов</code>, "
+        "<code>Иванов 10А</code> или только класс <code>10А</code>",
         parse_mode='HTML',
-        reply_markup=get_cancel_keyboard()
+        reply_markup=get_cancel_keyboard(),
+        priority=PRIORITY_REPLY
     )
     
     return ENTERING_ALL_FIELDS_VALUE
 
 
+@timed(HANDLER_SECONDS, HANDLER_ERRORS)
 async def back_to_menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """
     Handler for 'Back to Menu' button
@@ -217,20 +319,23 @@ async def back_to_menu_callback(update: Update, context: ContextTypes.DEFAULT_TY
     query = update.callback_query
     await query.answer()
     
-    logger.info(f"User {query.from_user.id} returned to main menu")
+    request_logger.info("User %s returned to main menu", query.from_user.id)
     
     # Clear search data
     context.user_data.clear()
     
-    await query.edit_message_text(
+    await outbound.edit(
+        query,
         "🏠 Главное меню\n\n"
         "Выберите действие:",
-        reply_markup=get_main_menu_keyboard()
+        reply_markup=get_main_menu_keyboard(),
+        priority=PRIORITY_REPLY
     )
     
     return States.MAIN_MENU
 
 
+@timed(HANDLER_SECONDS, HANDLER_ERRORS)
 async def show_help_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """
     Handler for 'Help' button from main menu
@@ -243,24 +348,27 @@ async def show_help_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
         "ℹ️ <b>Справка по использованию бота</b>\n\n"
         "<b>Как использовать:</b>\n"
         "1. Нажмите 'Начать поиск'\n"
-        "2. Выберите поле для поиска\n"
-        "3. Введите значение\n"
-        "4. Получите результаты\n\n"
+        "2. Введите Фамилию Имя Отчество Класс (можно не все поля)\n"
+        "3. Получите результаты\n\n"
         "<b>Особенности:</b>\n"
         "• Регистр НЕ важен\n"
-        "• Точное совпадение\n"
-        "• Показываются все результаты"
+        "• Можно искать только по части полей\n"
+        f"• Без точных совпадений - до {MAX_DISPLAY_RESULTS} похожих записей (опечатки, ё/е)\n"
+        f"• Результаты по {RESULTS_PAGE_SIZE} на странице"
     )
     
-    await query.edit_message_text(
+    await outbound.edit(
+        query,
         help_text,
         parse_mode='HTML',
-        reply_markup=get_main_menu_keyboard()
+        reply_markup=get_main_menu_keyboard(),
+        priority=PRIORITY_REPLY
     )
     
     return States.MAIN_MENU
 
 
+@timed(HANDLER_SECONDS, HANDLER_ERRORS)
 async def cancel_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """
     Handler for 'Cancel' button
@@ -269,31 +377,325 @@ async def cancel_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     query = update.callback_query
     await query.answer("Поиск отменён")
     
-    logger.info(f"User {query.from_user.id} cancelled operation")
+    request_logger.info("User %s cancelled operation", query.from_user.id)
     
     # Clear user data
     context.user_data.clear()
     
-    await query.edit_message_text(
+    await outbound.edit(
+        query,
         "❌ Операция отменена.\n\n"
         "Выберите действие:",
-        reply_markup=get_main_menu_keyboard()
+        reply_markup=get_main_menu_keyboard(),
+        priority=PRIORITY_REPLY
     )
     
     return States.MAIN_MENU
 
 
+@timed(HANDLER_SECONDS, HANDLER_ERRORS)
+async def inline_query_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Handler for inline queries (@bot Иванов)
+    Suggests participants whose full name starts with the typed text
+    """
+    inline_query = update.inline_query
+    text = inline_query.query.strip()
+    
+    if not text:
+        await inline_query.answer([], cache_time=INLINE_CACHE_TIME)
+        return
+    
+    with span('snapshot'):
+        snapshot = await sheets_service.get_snapshot_async()
+    if snapshot is None:
+        # Don't let Telegram cache an empty answer caused by a connection problem
+        await inline_query.answer([], cache_time=0)
+        return
+    
+    with span('search'):
+        entries = await search_workers.complete(snapshot, text, INLINE_RESULTS_LIMIT)
+    
+    with span('render'):
+        if entries is None:
+            records = search_service.autocomplete(
+                snapshot.data, text, index=snapshot.index, limit=INLINE_RESULTS_LIMIT
+            )
+            entries = [search_service.format_inline_entry(record) for record in records]
+        results = _inline_results(entries)
+    
+    with span('send'):
+        await inline_query.answer(results, cache_time=INLINE_CACHE_TIME)
+
+
+def _inline_results(entries: list) -> list:
+    """Inline query results for (title, description, text) entries of matched records"""
+    return [
+        InlineQueryResultArticle(
+            id=str(idx),
+            title=title,
+            description=description,
+            input_message_content=InputTextMessageContent(text)
+        )
+        for idx, (title, description, text) in enumerate(entries)
+    ]
+
+
+@timed(HANDLER_SECONDS, HANDLER_ERRORS)
+async def bulk_document_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Handler for uploaded CSV/TXT files
+    Looks up every "Фамилия Имя Отчество Класс" line and replies with a CSV report
+    """
+    user = update.effective_user
+    document = update.message.document
+    file_name = document.file_name or ''
+    
+    if not file_name.lower().endswith(('.csv', '.txt')):
+        await outbound.reply(
+            update.message,
+            "❌ Поддерживаются только файлы .csv и .txt\n\n"
+            "Каждая строка: Фамилия Имя Отчество Класс"
+        )
+        return
+    
+    if document.file_size and document.file_size > BULK_MAX_FILE_SIZE:
+        await outbound.reply(
+            update.message,
+            f"❌ Файл слишком большой. Максимальный размер: {BULK_MAX_FILE_SIZE // (1024 * 1024)} МБ"
+        )
+        return
+    
+    logger.info("User %s uploaded %s (%s bytes) for bulk lookup", user.id, file_name, document.file_size)
+    
+    status = outbound.status(update.message, "🔄 Обрабатываю файл...")
+    
+    with span('snapshot'):
+        snapshot = await sheets_service.get_snapshot_async()
+    if snapshot is None:
+        await status.finish(
+            "❌ Ошибка подключения к Google Sheets.\n"
+            "Пожалуйста, попробуйте позже."
+        )
+        return
+    
+    with tempfile.TemporaryDirectory(prefix='bulk_') as work_dir:
+        input_path = os.path.join(work_dir, 'input')
+        output_path = os.path.join(work_dir, 'results.csv')
+        
+        try:
+            with span('download'):
+                telegram_file = await document.get_file()
+                await telegram_file.download_to_drive(input_path)
+            
+            # Matching thousands of lines is CPU work - keep it off the event loop
+            with span('search'):
+                stats = await search_workers.resolve_file(snapshot, input_path, output_path, BULK_MAX_LINES)
+                if stats is None:
+                    stats = await asyncio.to_thread(
+                        resolve_file, input_path, output_path, snapshot, BULK_MAX_LINES
+                    )
+            
+            base_name = os.path.splitext(file_name)[0] or 'participants'
+            caption = (
+                f"✅ Обработано строк: {stats.lines}\n"
+                f"Найдено: {stats.found}\n"
+                f"Не найдено: {stats.not_found}\n"
+                f"Не распознано: {stats.invalid}"
+            )
+            if stats.truncated:
+                caption += f"\nСлишком много совпадений (показаны первые {MAX_DISPLAY_RESULTS}): {stats.truncated}"
+            
+            async def send_report():
+                # Opened on every attempt, so a send retried after a flood wait uploads the file again
+                with open(output_path, 'rb') as report:
+                    return await update.message.reply_document(
+                        document=InputFile(report, filename=f"{base_name}_results.csv"),
+                        caption=caption
+                    )
+            
+            await outbound.send(update.message.chat_id, send_report, PRIORITY_RESULT)
+            await status.delete()
+            
+        except Exception as e:
+            logger.error("Error during bulk lookup: %s", e, exc_info=True)
+            await status.finish(
+                "❌ Не удалось обработать файл. Попробуйте позже."
+            )
+
+
+@timed(HANDLER_SECONDS, HANDLER_ERRORS)
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Handler for /profile [N] command (admins only, see ADMIN_USER_IDS)
+    Samples the bot while it handles the next N updates and sends the
+    profile as a collapsed-stacks file
+    """
+    user = update.effective_user
+    
+    try:
+        updates = int(context.args[0]) if context.args else PROFILE_DEFAULT_UPDATES
+    except ValueError:
+        updates = 0
+    if not 1 <= updates <= PROFILE_MAX_UPDATES:
+        await outbound.reply(
+            update.message,
+            f"❌ Использование: /profile [N], где N от 1 до {PROFILE_MAX_UPDATES}"
+        )
+        return
+    
+    if profiler.active:
+        await outbound.reply(update.message, "⏳ Профилирование уже запущено, дождитесь результата")
+        return
+    
+    logger.info("Admin %s started profiling %s updates", user.id, updates)
+    profiler.start(updates)
+    await outbound.reply(
+        update.message,
+        f"🔬 Профилирую следующие {updates} обновлений. "
+        f"Результат придёт файлом (не позже чем через {PROFILE_TIMEOUT:.0f} с)"
+    )
+    
+    # Waiting here would hold the admin's own updates behind this one
+    context.application.create_task(_send_profile(update.message, updates))
+
+
+async def _send_profile(message, updates: int) -> None:
+    """Wait for a running profile to finish and send it in reply to the /profile message"""
+    sampler = await profiler.wait(PROFILE_TIMEOUT)
+    
+    if not sampler.stacks:
+        await outbound.reply(message, "⚠️ Профиль пуст: не было ни одной выборки", PRIORITY_RESULT)
+        return
+    
+    await outbound.reply_document(
+        message,
+        document=sampler.collapsed().encode('utf-8'),
+        filename=f"profile_{time.strftime('%Y%m%d_%H%M%S')}.txt",
+        caption=(
+            f"🔬 Профиль {updates} обновлений: {sampler.samples} выборок за {sampler.elapsed:.1f} с\n"
+            "Формат collapsed stacks (flamegraph.pl, speedscope)"
+        )
+    )
+
+
+@timed(HANDLER_SECONDS, HANDLER_ERRORS)
+async def reload_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Handler for /reload command (admins only, see ADMIN_USER_IDS)
+    Downloads all sources again and rebuilds the index; searches keep
+    using the current data until the new snapshot is swapped in
+    """
+    user = update.effective_user
+    logger.info("Admin %s requested a data reload", user.id)
+    
+    status = outbound.status(update.message, "🔄 Перезагружаю данные...")
+    started = time.perf_counter()
+    
+    with span('snapshot'):
+        snapshot, failed = await sheets_service.reload()
+    
+    if snapshot is None:
+        current = sheets_service.snapshot
+        await status.finish(
+            "❌ Не удалось загрузить данные ни из одного источника.\n"
+            f"Продолжаю работать на прежних данных ({len(current) if current is not None else 0} записей)."
+        )
+        return
+    
+    elapsed = time.perf_counter() - started
+    if failed:
+        lines = [
+            f"⚠️ Данные перезагружены частично за {elapsed:.1f} с",
+            f"Не удалось загрузить: {', '.join(failed)} - для них оставлены прежние данные"
+        ]
+    else:
+        lines = [f"✅ Данные перезагружены за {elapsed:.1f} с"]
+    lines.append(f"Записей: {len(snapshot)}")
+    lines.append(f"Индекс построен за {snapshot.index.build_time * 1000:.1f} мс")
+    text = "\n".join(lines)
+    await status.finish(text)
+
+
+@timed(HANDLER_SECONDS, HANDLER_ERRORS)
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Handler for /stats command (admins only, see ADMIN_USER_IDS)
+    Reports data size and age, memory use, index build time, cache and load figures
+    """
+    snapshot = sheets_service.snapshot
+    lines = ["📊 <b>Статистика</b>", "", "<b>Данные</b>"]
+    
+    if snapshot is None:
+        lines.append("Данные не загружены")
+    else:
+        lines.append(f"Записей: {len(snapshot)}")
+        lines.append(f"Возраст снимка: {_format_duration(snapshot.age())}")
+        lines.append(f"Индекс построен за: {snapshot.index.build_time * 1000:.1f} мс")
+    for source in sheets_service.sources:
+        line = f"• {html.escape(source.name)}: {len(source.rows or ())} строк"
+        if source.fetched_at:
+            line += f", загружен {_format_duration(time.time() - source.fetched_at)} назад"
+        if source.last_error:
+            line += f", ошибка: {html.escape(source.last_error[:200])}"
+        lines.append(line)
+    
+    lines += ["", "<b>Память</b>"]
+    rss = process_rss()
+    lines.append(f"Процесс: {_format_megabytes(rss)}" if rss is not None else "Процесс: н/д")
+    if snapshot is not None:
+        # Walking the structures takes a while on big sheets - keep it off the event loop
+        # (deep_size leaves out the lookup caches searches keep filling meanwhile)
+        with span('render'):
+            data_size, index_size = await asyncio.to_thread(
+                lambda: (deep_size(snapshot.data), deep_size(snapshot.index))
+            )
+        lines.append(f"Данные: ~{_format_megabytes(data_size)}, индекс: ~{_format_megabytes(index_size)}")
+    
+    lines += ["", "<b>Кэш ответов</b>"]
+    lookups = response_cache.hits + response_cache.misses
+    lines.append(f"Записей: {len(response_cache)}")
+    lines.append(f"Попаданий: {response_cache.hit_ratio:.1%} ({response_cache.hits} из {lookups})")
+    
+    processor = context.application.update_processor
+    if hasattr(processor, 'admitted'):
+        lines += ["", "<b>Обработка</b>"]
+        lines.append(f"Обновлений в работе: {processor.admitted}")
+        lines.append(f"Отклонено при перегрузке: {processor.shed}")
+        lines.append(f"Отброшено по лимиту запросов: {processor.rate_limited}")
+    
+    await outbound.reply(update.message, "\n".join(lines), PRIORITY_RESULT, parse_mode='HTML')
+
+
+def _format_duration(seconds: float) -> str:
+    """Human-readable duration: "42 с", "5 мин 3 с", "2 ч 10 мин" """
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds} с"
+    if seconds < 3600:
+        return f"{seconds // 60} мин {seconds % 60} с"
+    return f"{seconds // 3600} ч {seconds % 3600 // 60} мин"
+
+
+def _format_megabytes(size: int) -> str:
+    """Byte count in megabytes"""
+    return f"{size / (1024 * 1024):.1f} МБ"
+
+
+@timed(HANDLER_SECONDS, HANDLER_ERRORS)
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """
     Global error handler for the bot
     Logs errors and notifies user
     """
-    logger.error(f"Exception while handling an update: {context.error}", exc_info=context.error)
+    logger.error("Exception while handling an update: %s", context.error, exc_info=context.error)
     
     try:
         if update and update.effective_message:
-            await update.effective_message.reply_text(
-                "❌ Произошла ошибка. Пожалуйста, попробуйте позже или используйте /start"
+            await outbound.reply(
+                update.effective_message,
+                "❌ Произошла ошибка. Пожалуйста, попробуйте позже или используйте /start",
+                PRIORITY_RESULT
             )
     except Exception as e:
-        logger.error(f"Error in error handler: {e}")
+        logger.error("Error in error handler: %s", e)
@@ -62,3 +62,35 @@ def get_cancel_keyboard() -> InlineKeyboardMarkup:
         [InlineKeyboardButton("❌ Отмена", callback_data=CallbackData.CANCEL)]
     ]
     return InlineKeyboardMarkup(keyboard)
+
+
+def get_results_keyboard(handle: str, offset: int, has_previous: bool, has_next: bool, page_size: int) -> InlineKeyboardMarkup:
+    """
+    Keyboard shown under a page of search results
+    Adds previous/next page buttons to the post-results actions
+    
+    Args:
+        handle: Handle of the result set
+        offset: Offset of the current page
+        has_previous: Whether there is a page before this one
+        has_next: Whether there is a page after this one
+        page_size: Records per page
+        
+    Returns:
+        InlineKeyboardMarkup for a results page
+    """
+    navigation = []
+    if has_previous:
+        navigation.append(InlineKeyboardButton(
+            "◀️ Назад",
+            callback_data=f"{CallbackData.PAGE}:{handle}:{offset - page_size}"
+        ))
+    if has_next:
+        navigation.append(InlineKeyboardButton(
+            "Далее ▶️",
+            callback_data=f"{CallbackData.PAGE}:{handle}:{offset + page_size}"
+        ))
+    
+    keyboard = [navigation] if navigation else []
+    keyboard.extend(get_new_search_keyboard().inline_keyboard)
+    return InlineKeyboardMarkup(keyboard)
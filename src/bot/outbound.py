@@ -0,0 +1,401 @@
+"""
+Outbound message scheduler
+Paces messages sent by handlers to stay within Telegram flood limits
+"""
+
+import asyncio
+import contextvars
+import itertools
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from telegram import CallbackQuery, Message
+from telegram.error import RetryAfter
+from config.settings import (
+    OUTBOUND_GLOBAL_RATE,
+    OUTBOUND_CHAT_INTERVAL,
+    OUTBOUND_CHAT_BURST,
+    STATUS_MESSAGE_DELAY
+)
+from src.utils.metrics import metrics
+from src.utils.tracing import span
+
+logger = logging.getLogger(__name__)
+
+SENT = metrics.counter('outbound_requests', 'Bot API requests started by the scheduler', ('priority',))
+FLOOD_WAITS = metrics.counter('outbound_flood_waits', 'Requests put back after a 429 response')
+FAILURES = metrics.counter('outbound_request_errors', 'Requests that failed')
+NOTICES_DROPPED = metrics.counter('outbound_notices_dropped', 'Overload notices not queued because the queue was long')
+QUEUE_WAIT_SECONDS = metrics.histogram(
+    'outbound_queue_wait_seconds', 'Time from queueing a request to starting it', ('priority',)
+)
+
+# Lower value is sent first
+PRIORITY_RESULT = 0  # Search results and final answers the user is waiting for
+PRIORITY_REPLY = 1  # Menus, prompts and other direct replies
+PRIORITY_STATUS = 2  # Progress messages ("🔄 Ищу...")
+PRIORITY_NOTICE = 3  # "Bot is busy" notices for updates that were not processed
+
+# Priority names in metric labels
+PRIORITY_LABELS = {
+    PRIORITY_RESULT: 'result', PRIORITY_REPLY: 'reply', PRIORITY_STATUS: 'status', PRIORITY_NOTICE: 'notice'
+}
+
+# Notices are dropped instead of queued while this many requests are waiting
+NOTICE_QUEUE_LIMIT = 100
+
+# Per-chat send times are pruned once this many chats are tracked
+CHAT_TRACKING_LIMIT = 10000
+
+
+class OutboundJob:
+    """One queued Bot API request"""
+
+    __slots__ = ('priority', 'seq', 'chat_id', 'request', 'not_before', 'queued_at', 'future')
+
+    def __init__(
+        self,
+        priority: int,
+        seq: int,
+        chat_id: Optional[int],
+        request: Callable[[], Awaitable[Any]],
+        not_before: float
+    ):
+        """
+        Args:
+            priority: One of the PRIORITY_* constants
+            seq: Arrival number, keeps FIFO order within a priority
+            chat_id: Chat the request sends to (None if not tied to a chat)
+            request: Zero-argument callable performing the request
+            not_before: Monotonic time before which the job must not be sent
+        """
+        self.priority = priority
+        self.seq = seq
+        self.chat_id = chat_id
+        self.request = request
+        self.not_before = not_before
+        self.queued_at = time.monotonic()
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    @property
+    def order(self) -> Tuple[int, int]:
+        return self.priority, self.seq
+
+
+def _log_notice_failure(future: asyncio.Future) -> None:
+    """Done callback of a notice nobody waits for: retrieve and log its error"""
+    if not future.cancelled() and future.exception() is not None:
+        logger.warning("Could not send overload notice: %s", future.exception())
+
+
+class OutboundScheduler:
+    """
+    Single dispatcher for messages sent by the bot
+
+    Requests are started at most `global_rate` times per second overall and
+    once per `chat_interval` seconds per chat on average. A chat that was
+    quiet may get `chat_burst` requests at once (e.g. the search result
+    right after the "Ищу..." status), then the interval applies; the budget
+    refills by one request per interval. Among the jobs allowed to go,
+    the one with the best priority (then the oldest) is sent first. A 429
+    response puts the job back with the delay Telegram asked for.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = OUTBOUND_GLOBAL_RATE,
+        chat_interval: float = OUTBOUND_CHAT_INTERVAL,
+        chat_burst: int = OUTBOUND_CHAT_BURST,
+        status_delay: float = STATUS_MESSAGE_DELAY
+    ):
+        """
+        Args:
+            global_rate: Requests per second across all chats
+            chat_interval: Seconds between requests to the same chat
+            chat_burst: Requests a quiet chat may get without waiting
+            status_delay: How long a status message waits for the result it announces
+        """
+        self.global_interval = 1.0 / global_rate
+        self.chat_interval = chat_interval
+        # A chat may run this far ahead of its one-per-interval schedule
+        self.chat_tolerance = max(chat_burst - 1, 0) * chat_interval
+        self.status_delay = status_delay
+        self._jobs: List[OutboundJob] = []
+        self._seq = itertools.count()
+        # Per chat, when its schedule is caught up (sending at one request per
+        # interval); a request may go once this is at most chat_tolerance ahead
+        self._chat_due: Dict[int, float] = {}
+        self._global_ready_at = 0.0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._running: Set[asyncio.Task] = set()
+
+    async def send(
+        self,
+        chat_id: Optional[int],
+        request: Callable[[], Awaitable[Any]],
+        priority: int = PRIORITY_REPLY
+    ) -> Any:
+        """
+        Queue a request and wait for its result
+
+        Args:
+            chat_id: Chat the request sends to (None skips per-chat pacing)
+            request: Zero-argument callable performing the request, e.g.
+                lambda: message.reply_text(text)
+            priority: One of the PRIORITY_* constants
+
+        Returns:
+            Whatever the request returns
+        """
+        with span('send'):
+            return await self._submit(chat_id, request, priority).future
+
+    async def reply(self, message: Message, text: str, priority: int = PRIORITY_REPLY, **kwargs) -> Message:
+        """Paced message.reply_text"""
+        return await self.send(message.chat_id, lambda: message.reply_text(text, **kwargs), priority)
+
+    async def reply_document(self, message: Message, priority: int = PRIORITY_RESULT, **kwargs) -> Message:
+        """Paced message.reply_document"""
+        return await self.send(message.chat_id, lambda: message.reply_document(**kwargs), priority)
+
+    async def edit(self, target, text: str, priority: int = PRIORITY_RESULT, **kwargs) -> Any:
+        """
+        Paced edit of a message or of the message a callback query came from
+
+        Args:
+            target: Message or CallbackQuery
+            text: New message text
+            priority: One of the PRIORITY_* constants
+        """
+        if isinstance(target, CallbackQuery):
+            chat_id = target.message.chat_id if target.message else None
+            return await self.send(chat_id, lambda: target.edit_message_text(text, **kwargs), priority)
+        return await self.send(target.chat_id, lambda: target.edit_text(text, **kwargs), priority)
+
+    def status(self, message: Message, text: str) -> 'StatusMessage':
+        """
+        Announce work in progress with a status reply that may never be sent
+
+        Args:
+            message: Message to reply to
+            text: Status text (e.g. "🔄 Ищу...")
+
+        Returns:
+            StatusMessage to finish with the result
+        """
+        job = self._submit(
+            message.chat_id,
+            lambda: message.reply_text(text),
+            PRIORITY_STATUS,
+            not_before=time.monotonic() + self.status_delay
+        )
+        return StatusMessage(self, message, job)
+
+    def notice(self, message: Message, text: str) -> bool:
+        """
+        Queue a reply at the lowest priority without waiting for it
+
+        Meant for notices about updates that were not processed: they are
+        sent only when nothing else is waiting for the chat, and dropped
+        when the queue is already long, so they never delay real replies.
+
+        Args:
+            message: Message to reply to
+            text: Notice text
+
+        Returns:
+            True if the notice was queued, False if it was dropped
+        """
+        if len(self._jobs) >= NOTICE_QUEUE_LIMIT:
+            NOTICES_DROPPED.inc()
+            return False
+        job = self._submit(message.chat_id, lambda: message.reply_text(text), PRIORITY_NOTICE)
+        job.future.add_done_callback(_log_notice_failure)
+        return True
+
+    def cancel(self, job: OutboundJob) -> bool:
+        """
+        Withdraw a job that has not been sent yet
+
+        Returns:
+            True if the job was withdrawn, False if it is already sent or in flight
+        """
+        if job not in self._jobs:
+            return False
+        self._jobs.remove(job)
+        job.future.cancel()
+        return True
+
+    async def stop(self) -> None:
+        """Stop the dispatcher after requests in flight complete"""
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            self._dispatcher = None
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+        for job in self._jobs:
+            job.future.cancel()
+        self._jobs.clear()
+
+    def _submit(
+        self,
+        chat_id: Optional[int],
+        request: Callable[[], Awaitable[Any]],
+        priority: int,
+        not_before: float = 0.0
+    ) -> OutboundJob:
+        """Queue a job and make sure the dispatcher is running"""
+        job = OutboundJob(priority, next(self._seq), chat_id, request, not_before)
+        self._jobs.append(job)
+        if self._dispatcher is None or self._dispatcher.done():
+            self._wakeup = asyncio.Event()
+            # Fresh context: the dispatcher outlives the update whose trace is current here
+            self._dispatcher = asyncio.create_task(self._dispatch(), context=contextvars.Context())
+        self._wakeup.set()
+        return job
+
+    async def _dispatch(self) -> None:
+        """Start jobs one at a time as the rate limits allow"""
+        while True:
+            self._wakeup.clear()
+            now = time.monotonic()
+            job, wait = self._next_job(now)
+
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self._jobs.remove(job)
+            if job.future.done():
+                # Caller gave up waiting
+                continue
+            self._global_ready_at = now + self.global_interval
+            if job.chat_id is not None:
+                if len(self._chat_due) > CHAT_TRACKING_LIMIT:
+                    # Chats whose schedule is caught up have their full burst back anyway
+                    self._chat_due = {chat_id: due for chat_id, due in self._chat_due.items() if due > now}
+                self._chat_due[job.chat_id] = max(self._chat_due.get(job.chat_id, now), now) + self.chat_interval
+
+            priority = PRIORITY_LABELS.get(job.priority, str(job.priority))
+            SENT.labels(priority).inc()
+            QUEUE_WAIT_SECONDS.labels(priority).observe(now - job.queued_at)
+
+            # Requests run concurrently; only their start is paced
+            task = asyncio.create_task(self._run(job))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    def _next_job(self, now: float) -> Tuple[Optional[OutboundJob], Optional[float]]:
+        """
+        Pick the best job that may be sent now
+
+        Returns:
+            (job, None) if one is ready, otherwise (None, seconds until the
+            next job may become ready or None if the queue is empty)
+        """
+        if not self._jobs:
+            return None, None
+        if now < self._global_ready_at:
+            return None, self._global_ready_at - now
+
+        best = None
+        wait = None
+        for job in self._jobs:
+            ready_at = job.not_before
+            if job.chat_id is not None:
+                ready_at = max(ready_at, self._chat_due.get(job.chat_id, 0.0) - self.chat_tolerance)
+            if ready_at <= now:
+                if best is None or job.order < best.order:
+                    best = job
+            elif wait is None or ready_at - now < wait:
+                wait = ready_at - now
+        return best, wait
+
+    async def _run(self, job: OutboundJob) -> None:
+        """Perform a request and hand its outcome to the waiting caller"""
+        try:
+            result = await job.request()
+        except RetryAfter as e:
+            retry_at = time.monotonic() + float(e.retry_after)
+            logger.warning("Flood limit hit for chat %s, retrying in %ss", job.chat_id, e.retry_after)
+            FLOOD_WAITS.inc()
+            job.not_before = retry_at
+            if job.chat_id is not None:
+                # No burst for the chat until Telegram lets it send again
+                self._chat_due[job.chat_id] = retry_at + self.chat_tolerance
+            if not job.future.done():
+                self._jobs.append(job)
+                self._wakeup.set()
+            return
+        except Exception as e:
+            FAILURES.inc()
+            if not job.future.done():
+                job.future.set_exception(e)
+            return
+
+        if not job.future.done():
+            job.future.set_result(result)
+
+
+class StatusMessage:
+    """
+    Progress reply that is merged into the result when the result comes first
+
+    The status is queued with a delay and the lowest priority. If the result
+    is ready before the status went out, the status is dropped and the result
+    is sent as the reply; otherwise the status message is edited into it.
+    """
+
+    def __init__(self, scheduler: OutboundScheduler, message: Message, job: OutboundJob):
+        """
+        Args:
+            scheduler: Scheduler the status was queued on
+            message: Message the status replies to
+            job: Queued status reply
+        """
+        self._scheduler = scheduler
+        self._message = message
+        self._job = job
+
+    async def _sent(self) -> Optional[Message]:
+        """The status message if it was sent, None if it was withdrawn or failed"""
+        if self._scheduler.cancel(self._job):
+            return None
+        try:
+            return await self._job.future
+        except Exception as e:
+            logger.warning("Status message was not sent: %s", e)
+            return None
+
+    async def finish(self, text: str, **kwargs) -> Message:
+        """
+        Deliver the final text in place of the status
+
+        Args:
+            text: Result text
+            **kwargs: Passed to reply_text/edit_text (reply_markup, parse_mode, ...)
+
+        Returns:
+            Message holding the result
+        """
+        sent = await self._sent()
+        if sent is None:
+            return await self._scheduler.reply(self._message, text, PRIORITY_RESULT, **kwargs)
+        return await self._scheduler.edit(sent, text, PRIORITY_RESULT, **kwargs)
+
+    async def delete(self) -> None:
+        """Remove the status (or make sure it is never sent)"""
+        sent = await self._sent()
+        if sent is not None:
+            # Deleting doesn't count against send limits
+            await sent.delete()
+
+
+# Create a singleton instance
+outbound = OutboundScheduler()
+
+metrics.gauge('outbound_queue_length', 'Requests waiting to be sent', lambda: len(outbound._jobs))
@@ -0,0 +1,220 @@
+"""
+Write-behind persistence for conversations and user data
+Keeps ConversationHandler states and context.user_data in SQLite so a
+restart doesn't drop users in the middle of a conversation
+"""
+
+import logging
+import marshal
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from telegram.ext import BasePersistence, PersistenceInput
+from config.settings import PERSISTENCE_PATH, PERSISTENCE_INTERVAL
+from src.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+WRITE_SECONDS = metrics.histogram(
+    'bot_persistence_write_duration_seconds', 'Time to write one batch of state changes'
+)
+ROWS_WRITTEN = metrics.counter('bot_persistence_rows_written', 'User data and conversation rows written or deleted')
+WRITE_ERRORS = metrics.counter('bot_persistence_write_errors', 'Batches that failed to write and were retried')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_data (
+    user_id INTEGER PRIMARY KEY,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS conversations (
+    name TEXT NOT NULL,
+    key BLOB NOT NULL,
+    state BLOB NOT NULL,
+    PRIMARY KEY (name, key)
+) WITHOUT ROWID;
+"""
+
+
+class SQLitePersistence(BasePersistence):
+    """
+    BasePersistence storing user data and conversation states in SQLite (WAL)
+
+    The update_* and drop_* methods called by the application only record
+    the change in memory; a background thread writes the accumulated
+    changes in one transaction every `interval` seconds, and flush() writes
+    the rest on shutdown. Handlers never wait for the disk, and a user
+    changing state many times between writes costs one row write.
+    Values are stored with marshal, so user data must consist of builtin
+    types (str, int, float, bool, None, tuple, list, dict, set).
+
+    Chat data, bot data and callback data are not used by the bot and are
+    not stored.
+    """
+
+    def __init__(self, path: str = PERSISTENCE_PATH, interval: float = PERSISTENCE_INTERVAL):
+        """
+        Args:
+            path: SQLite database file
+            interval: Seconds between writes; the application hands over
+                changed data at the same interval
+        """
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=interval
+        )
+        self.path = path
+        self.interval = interval
+        # Changes not written yet; None marks a deletion
+        self._users: Dict[int, Optional[bytes]] = {}
+        self._conversations: Dict[Tuple[str, bytes], Optional[bytes]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the database on first use and start the writer thread"""
+        if self._connection is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            # WAL lets the writer commit without blocking readers; NORMAL skips
+            # the fsync per commit (a power loss may lose the last batch, never corrupt)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(SCHEMA)
+            self._connection = connection
+            self._thread = threading.Thread(target=self._run, name='persistence-writer', daemon=True)
+            self._thread.start()
+        return self._connection
+
+    async def get_user_data(self) -> Dict[int, dict]:
+        """All stored user data, read once on startup"""
+        started = time.perf_counter()
+        rows = self._connect().execute('SELECT user_id, data FROM user_data').fetchall()
+        user_data = {user_id: marshal.loads(data) for user_id, data in rows}
+        logger.info("Restored data of %s users in %.0f ms", len(user_data), (time.perf_counter() - started) * 1000)
+        return user_data
+
+    async def get_conversations(self, name: str) -> Dict[tuple, object]:
+        """Stored states of one conversation handler, read once on startup"""
+        rows = self._connect().execute(
+            'SELECT key, state FROM conversations WHERE name = ?', (name,)
+        ).fetchall()
+        logger.info("Restored %s conversations of %s", len(rows), name)
+        return {marshal.loads(key): marshal.loads(state) for key, state in rows}
+
+    async def update_conversation(self, name: str, key: tuple, new_state: Optional[object]) -> None:
+        # A conversation that ended (state None) is deleted
+        state = marshal.dumps(new_state) if new_state is not None else None
+        with self._lock:
+            self._conversations[(name, marshal.dumps(key))] = state
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        try:
+            # Empty user data is the default, no need to keep a row for it
+            encoded = marshal.dumps(data) if data else None
+        except ValueError as e:
+            logger.error("Can't store data of user %s: %s", user_id, e)
+            return
+        with self._lock:
+            self._users[user_id] = encoded
+
+    async def drop_user_data(self, user_id: int) -> None:
+        with self._lock:
+            self._users[user_id] = None
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        # This process is the only writer, so memory is always current
+        pass
+
+    async def get_chat_data(self) -> Dict[int, dict]:
+        return {}
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def flush(self) -> None:
+        """Stop the writer thread, write the remaining changes and close the database"""
+        if self._connection is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._write()
+        self._connection.close()
+        self._connection = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._write()
+
+    def _write(self) -> None:
+        """Write the changes recorded so far in one transaction"""
+        with self._lock:
+            users, self._users = self._users, {}
+            conversations, self._conversations = self._conversations, {}
+        if not users and not conversations:
+            return
+
+        started = time.perf_counter()
+        connection = self._connection
+        try:
+            connection.execute('BEGIN')
+            connection.executemany(
+                'INSERT OR REPLACE INTO user_data (user_id, data) VALUES (?, ?)',
+                [(user_id, data) for user_id, data in users.items() if data is not None]
+            )
+            connection.executemany(
+                'DELETE FROM user_data WHERE user_id = ?',
+                [(user_id,) for user_id, data in users.items() if data is None]
+            )
+            connection.executemany(
+                'INSERT OR REPLACE INTO conversations (name, key, state) VALUES (?, ?, ?)',
+                [(name, key, state) for (name, key), state in conversations.items() if state is not None]
+            )
+            connection.executemany(
+                'DELETE FROM conversations WHERE name = ? AND key = ?',
+                [key for key, state in conversations.items() if state is None]
+            )
+            connection.execute('COMMIT')
+        except sqlite3.Error as e:
+            if connection.in_transaction:
+                connection.execute('ROLLBACK')
+            WRITE_ERRORS.inc()
+            logger.error("Failed to write %s state changes, retrying with the next batch: %s",
+                         len(users) + len(conversations), e)
+            # Put the batch back unless a newer change replaced it meanwhile
+            with self._lock:
+                for user_id, data in users.items():
+                    self._users.setdefault(user_id, data)
+                for key, state in conversations.items():
+                    self._conversations.setdefault(key, state)
+            return
+
+        elapsed = time.perf_counter() - started
+        WRITE_SECONDS.observe(elapsed)
+        ROWS_WRITTEN.inc(len(users) + len(conversations))
+        logger.debug("Wrote %s user data and %s conversation changes in %.1f ms",
+                     len(users), len(conversations), elapsed * 1000)
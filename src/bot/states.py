@@ -42,3 +42,6 @@ class CallbackData:
     NEW_SEARCH = "new_search"
     CANCEL = "cancel"
     BACK_TO_MENU = "back_to_menu"
+    
+    # Result pages: "page:<result handle>:<offset>"
+    PAGE = "page"
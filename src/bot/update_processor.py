@@ -0,0 +1,243 @@
+"""
+Concurrent update processing
+Runs updates in parallel with per-user ordering, rate limiting and load shedding
+"""
+
+import asyncio
+import inspect
+import logging
+import time
+from typing import Any, Awaitable, Dict, Optional
+from cachetools import LRUCache
+from telegram import Update
+from telegram.error import TelegramError
+from telegram.ext import BaseUpdateProcessor
+from src.bot.outbound import outbound
+from src.utils.profiler import profiler
+from src.utils.tracing import start_trace, finish_trace, Trace
+from config.settings import (
+    UPDATE_WORKERS,
+    UPDATE_QUEUE_SIZE,
+    USER_RATE_LIMIT,
+    USER_RATE_BURST
+)
+
+logger = logging.getLogger(__name__)
+
+# Users whose token buckets are remembered (least recently active are forgotten)
+RATE_LIMIT_USERS = 100000
+
+BUSY_TEXT = "⏳ Бот сейчас перегружен. Пожалуйста, повторите запрос через несколько секунд."
+RATE_LIMITED_TEXT = "⏳ Слишком много запросов. Подождите немного и повторите."
+
+
+class TokenBucket:
+    """Per-user token bucket refilled continuously at a fixed rate"""
+
+    __slots__ = ('tokens', 'updated_at', 'notified')
+
+    def __init__(self, capacity: float, now: float):
+        """
+        Args:
+            capacity: Initial (and maximum) number of tokens
+            now: Current monotonic time
+        """
+        self.tokens = capacity
+        self.updated_at = now
+        # User was told about the limit since the bucket last ran dry
+        self.notified = False
+
+    def take(self, rate: float, capacity: float, now: float) -> bool:
+        """
+        Refill for the elapsed time and take one token if available
+
+        Args:
+            rate: Tokens added per second
+            capacity: Maximum number of tokens
+            now: Current monotonic time
+
+        Returns:
+            True if a token was taken
+        """
+        self.tokens = min(capacity, self.tokens + (now - self.updated_at) * rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            self.notified = False
+            return True
+        return False
+
+
+class UserLock:
+    """Lock serializing one user's updates, with a count of holders and waiters"""
+
+    __slots__ = ('lock', 'users')
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+class FairUpdateProcessor(BaseUpdateProcessor):
+    """
+    Update processor with bounded concurrency and per-user fairness
+
+    - At most `workers` updates run handlers at the same time.
+    - Updates of one user run strictly one after another, in arrival order,
+      so ConversationHandler sees every state transition before the next
+      update of that user. Waiting for the own lock doesn't occupy a worker.
+    - Each user has a token bucket; updates beyond it are dropped, and the
+      user is told once per burst.
+    - When `workers + queue_size` updates are already admitted, new updates
+      are answered with a short "busy" reply instead of being queued.
+    - Every admitted update is traced from admission on, so time spent
+      waiting for the user's turn and a worker shows up as the "wait" span.
+
+    Inline queries are exempt from the per-user bucket: Telegram sends one
+    per keystroke and they are answered from the prefix index.
+    """
+
+    def __init__(
+        self,
+        workers: int = UPDATE_WORKERS,
+        queue_size: int = UPDATE_QUEUE_SIZE,
+        rate: float = USER_RATE_LIMIT,
+        burst: float = USER_RATE_BURST
+    ):
+        """
+        Args:
+            workers: Updates processed concurrently
+            queue_size: Admitted updates allowed to wait for a worker
+            rate: Updates per second allowed per user (0 disables the limit)
+            burst: Updates a user may send at once before the rate applies
+        """
+        # Headroom above the admission limit so shed updates are rejected by us
+        # rather than queued behind the semaphore of the base class
+        super().__init__(max_concurrent_updates=2 * (workers + queue_size))
+        self.workers = workers
+        self.capacity = workers + queue_size
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self._worker_slots = asyncio.Semaphore(workers)
+        self._user_locks: Dict[int, UserLock] = {}
+        self._buckets: LRUCache = LRUCache(maxsize=RATE_LIMIT_USERS)
+        # Updates admitted and not finished yet (running or waiting)
+        self.admitted = 0
+        self.shed = 0
+        self.rate_limited = 0
+
+    async def initialize(self) -> None:
+        """Nothing to allocate; required by BaseUpdateProcessor"""
+
+    async def shutdown(self) -> None:
+        """Nothing to release; required by BaseUpdateProcessor"""
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        """
+        Admit, rate limit or shed an update, then run it in order for its user
+
+        Args:
+            update: Incoming update
+            coroutine: Handler processing prepared by the Application
+        """
+        user_id = self._user_id(update)
+
+        if user_id is not None and not self._take_token(user_id, update):
+            self.rate_limited += 1
+            self._discard(coroutine)
+            if not self._buckets[user_id].notified:
+                self._buckets[user_id].notified = True
+                logger.info("User %s exceeded %g updates/s, dropping updates", user_id, self.rate)
+                await self._reply(update, RATE_LIMITED_TEXT)
+            return
+
+        if self.admitted >= self.capacity:
+            self.shed += 1
+            self._discard(coroutine)
+            if self.shed % 100 == 1:
+                logger.warning("Overloaded: %s updates in progress, shedding load (%s shed so far)", self.admitted, self.shed)
+            await self._reply(update, BUSY_TEXT)
+            return
+
+        self.admitted += 1
+        trace = start_trace(update)
+        try:
+            if user_id is None:
+                async with self._worker_slots:
+                    await self._run(trace, coroutine)
+                return
+
+            user_lock = self._user_locks.get(user_id)
+            if user_lock is None:
+                user_lock = self._user_locks[user_id] = UserLock()
+            user_lock.users += 1
+            try:
+                async with user_lock.lock:
+                    async with self._worker_slots:
+                        await self._run(trace, coroutine)
+            finally:
+                user_lock.users -= 1
+                if not user_lock.users:
+                    del self._user_locks[user_id]
+        finally:
+            self.admitted -= 1
+            finish_trace(trace)
+
+    @staticmethod
+    async def _run(trace: Trace, coroutine: Awaitable[Any]) -> None:
+        """Run admitted processing once it has a worker, counting it towards a running profile"""
+        trace.add('wait', time.perf_counter() - trace.started)
+        profile_run = profiler.admit()
+        try:
+            await coroutine
+        finally:
+            if profile_run is not None:
+                profile_run.update_done()
+
+    @staticmethod
+    def _user_id(update: object) -> Optional[int]:
+        """User an update comes from, or None if it has none"""
+        if isinstance(update, Update) and update.effective_user:
+            return update.effective_user.id
+        return None
+
+    def _take_token(self, user_id: int, update: object) -> bool:
+        """
+        Charge an update to its user's token bucket
+
+        Returns:
+            False if the update should be dropped
+        """
+        if self.rate <= 0 or update.inline_query is not None:
+            return True
+
+        now = time.monotonic()
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = self._buckets[user_id] = TokenBucket(self.burst, now)
+        return bucket.take(self.rate, self.burst, now)
+
+    @staticmethod
+    def _discard(coroutine: Awaitable[Any]) -> None:
+        """Drop prepared processing without running it"""
+        if inspect.iscoroutine(coroutine):
+            coroutine.close()
+
+    @staticmethod
+    async def _reply(update: object, text: str) -> None:
+        """
+        Tell the user their update was not processed (best effort)
+
+        Callback queries are answered directly (answerCallbackQuery is not
+        chat-paced); messages get a lowest-priority reply through the
+        outbound scheduler, dropped if it is backed up.
+        """
+        if not isinstance(update, Update):
+            return
+        if update.callback_query:
+            try:
+                await update.callback_query.answer(text)
+            except TelegramError as e:
+                logger.warning("Could not send overload notice: %s", e)
+        elif update.effective_message and update.effective_chat:
+            outbound.notice(update.effective_message, text)
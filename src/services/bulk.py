@@ -0,0 +1,202 @@
+"""
+Bulk lookup service
+Resolves an uploaded list of participants against the search index in one pass
+"""
+
+import codecs
+import csv
+import logging
+from typing import Dict, Iterator, Optional, TextIO, Tuple
+from config.settings import SEARCH_COLUMNS, RESULT_COLUMNS, MAX_DISPLAY_RESULTS
+from src.services.search import SearchService
+from src.services.search_index import normalize_value
+from src.services.snapshot import Snapshot
+
+logger = logging.getLogger(__name__)
+
+# Encodings tried for uploaded files (Excel on Windows saves CSV as cp1251)
+INPUT_ENCODINGS = ('utf-8-sig', 'cp1251')
+
+# Bytes inspected to pick the input encoding
+ENCODING_PROBE_SIZE = 64 * 1024
+
+OUTPUT_HEADERS = [
+    SEARCH_COLUMNS['surname'],
+    SEARCH_COLUMNS['name'],
+    SEARCH_COLUMNS['patronymic'],
+    SEARCH_COLUMNS['class'],
+    RESULT_COLUMNS['id'],
+    RESULT_COLUMNS['subjects'],
+    'Статус'
+]
+
+STATUS_FOUND = 'найден'
+STATUS_MULTIPLE = 'несколько совпадений'
+STATUS_NOT_FOUND = 'не найден'
+STATUS_INVALID = 'не распознано'
+# Line matching more records than are written to the report
+STATUS_TRUNCATED = 'несколько совпадений: показаны {shown} из {total}'
+
+
+class BulkLookupStats:
+    """Counters for one bulk lookup"""
+
+    __slots__ = ('lines', 'found', 'not_found', 'invalid', 'truncated')
+
+    def __init__(self):
+        self.lines = 0
+        self.found = 0
+        self.not_found = 0
+        self.invalid = 0
+        # Found lines with more matches than were written to the report
+        self.truncated = 0
+
+
+def detect_encoding(path: str) -> str:
+    """
+    Pick the encoding of an uploaded file by probing its beginning
+
+    Args:
+        path: Path to the uploaded file
+
+    Returns:
+        One of INPUT_ENCODINGS
+    """
+    with open(path, 'rb') as f:
+        probe = f.read(ENCODING_PROBE_SIZE)
+
+    for encoding in INPUT_ENCODINGS:
+        try:
+            # final=False tolerates a multibyte character cut at the probe boundary
+            codecs.getincrementaldecoder(encoding)().decode(probe, final=False)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return INPUT_ENCODINGS[-1]
+
+
+def parse_lines(source: TextIO) -> Iterator[Tuple[str, Optional[Dict[str, str]]]]:
+    """
+    Parse input lines lazily into search criteria
+
+    Lines may be plain text ("Иванов Иван Иванович 10А") or CSV rows with
+    ';', ',' or tab separators, one field per column.
+
+    Args:
+        source: Text stream of the uploaded file
+
+    Yields:
+        (original line, criteria) pairs; criteria is None for unusable lines
+    """
+    for line in source:
+        line = line.strip()
+        if not line:
+            continue
+
+        delimiter = next((d for d in (';', '\t', ',') if d in line), None)
+        if delimiter is None:
+            criteria = SearchService.parse_query(line)
+        else:
+            cells = [cell.strip() for cell in next(csv.reader([line], delimiter=delimiter))]
+            criteria = {
+                field: value
+                for field, value in zip(('surname', 'name', 'patronymic', 'class'), cells)
+                if value
+            }
+
+        # Skip a header row copied from the spreadsheet
+        if normalize_value(criteria.get('surname', '')) == normalize_value(SEARCH_COLUMNS['surname']):
+            continue
+
+        yield line, (criteria or None)
+
+
+def resolve_file(
+    input_path: str,
+    output_path: str,
+    snapshot: Snapshot,
+    max_lines: int,
+    max_matches: int = MAX_DISPLAY_RESULTS
+) -> BulkLookupStats:
+    """
+    Resolve every line of an uploaded file and write a CSV report
+
+    Input is read and output is written line by line, so memory use does
+    not grow with the size of the upload. Matching uses the snapshot index
+    and the same normalization as the interactive search. A line matching
+    more than max_matches records (e.g. only a class was given) gets its
+    first max_matches records, marked as truncated, so one vague line can't
+    turn the report into a copy of the table.
+
+    Args:
+        input_path: Uploaded CSV/TXT file
+        output_path: Where to write the resulting CSV
+        snapshot: Data snapshot to search in
+        max_lines: Lines after this limit are ignored
+        max_matches: Records written per line at most
+
+    Returns:
+        Counters for the processed file
+    """
+    stats = BulkLookupStats()
+    encoding = detect_encoding(input_path)
+    subjects_column = RESULT_COLUMNS['subjects']
+
+    with open(input_path, encoding=encoding, errors='replace', newline='') as source, \
+            open(output_path, 'w', encoding='utf-8-sig', newline='') as target:
+        # ';' separated UTF-8 with BOM opens correctly in Russian Excel
+        writer = csv.writer(target, delimiter=';')
+        writer.writerow(OUTPUT_HEADERS)
+
+        for line, criteria in parse_lines(source):
+            if stats.lines >= max_lines:
+                logger.warning("Bulk lookup truncated at %s lines", max_lines)
+                break
+            stats.lines += 1
+
+            if criteria is None:
+                stats.invalid += 1
+                writer.writerow([line, '', '', '', '', '', STATUS_INVALID])
+                continue
+
+            # Straight to the index: per-line search logging would flood the log
+            positions = snapshot.index.lookup_fields(criteria)
+            if not positions:
+                stats.not_found += 1
+                writer.writerow([
+                    criteria.get('surname', ''),
+                    criteria.get('name', ''),
+                    criteria.get('patronymic', ''),
+                    criteria.get('class', ''),
+                    '',
+                    '',
+                    STATUS_NOT_FOUND
+                ])
+                continue
+
+            stats.found += 1
+            if len(positions) == 1:
+                status = STATUS_FOUND
+            elif len(positions) <= max_matches:
+                status = STATUS_MULTIPLE
+            else:
+                stats.truncated += 1
+                status = STATUS_TRUNCATED.format(shown=max_matches, total=len(positions))
+            for position in positions[:max_matches]:
+                record = snapshot.data[position]
+                subjects = record.get(subjects_column, '')
+                writer.writerow([
+                    record.get(SEARCH_COLUMNS['surname'], ''),
+                    record.get(SEARCH_COLUMNS['name'], ''),
+                    record.get(SEARCH_COLUMNS['patronymic'], ''),
+                    record.get(SEARCH_COLUMNS['class'], ''),
+                    record.get(RESULT_COLUMNS['id'], ''),
+                    '; '.join(s.strip() for s in subjects.split('\n') if s.strip()),
+                    status
+                ])
+
+    logger.info(
+        "Bulk lookup processed %s lines: %s found (%s truncated), %s not found, %s invalid",
+        stats.lines, stats.found, stats.truncated, stats.not_found, stats.invalid
+    )
+    return stats
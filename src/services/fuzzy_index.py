@@ -0,0 +1,197 @@
+"""
+Typo-tolerant matching for search fields
+Trigram index over distinct field values with edit-distance re-ranking
+"""
+
+from array import array
+from typing import Dict, Iterable, List, Tuple
+
+# Candidates re-ranked by edit distance per query value
+MAX_CANDIDATES = 50
+
+# Trigrams shared by more than this share of values carry little signal
+COMMON_TRIGRAM_SHARE = 0.2
+
+
+def fold(value: str) -> str:
+    """
+    Fold a normalized value for fuzzy comparison
+    Treats ё as е and ignores spaces and hyphens ("10 А" == "10А")
+
+    Args:
+        value: Value already passed through normalize_value
+
+    Returns:
+        Folded value
+    """
+    return value.replace('ё', 'е').replace(' ', '').replace('-', '')
+
+
+def trigrams(value: str) -> set:
+    """
+    Set of character trigrams of a folded value, padded at both ends
+
+    Args:
+        value: Folded value
+
+    Returns:
+        Set of 3-character strings
+    """
+    padded = f"  {value} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def max_distance(value: str) -> int:
+    """Largest edit distance still accepted as a typo for a value of this length"""
+    if len(value) <= 4:
+        return 1
+    if len(value) <= 8:
+        return 2
+    return 3
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """
+    Optimal string alignment distance (Levenshtein plus adjacent swaps)
+
+    Args:
+        a: First string
+        b: Second string
+        limit: Stop early once the distance is known to exceed this
+
+    Returns:
+        Distance, or limit + 1 if it exceeds limit
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+
+    previous_row = None
+    row = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        before, previous_row, row = previous_row, row, [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            row[j] = min(previous_row[j] + 1, row[j - 1] + 1, previous_row[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                row[j] = min(row[j], before[j - 2] + 1)
+        if min(row) > limit:
+            return limit + 1
+    return row[-1]
+
+
+class FuzzyFieldIndex:
+    """
+    Trigram index over the distinct values of one search field
+    Built from the keys of the field's exact-match index
+    """
+
+    def __init__(
+        self,
+        folded: List[str],
+        values: List[List[str]],
+        postings: Dict[str, array]
+    ):
+        """
+        Args:
+            folded: Distinct folded values
+            values: Normalized values behind each folded value
+            postings: Trigram -> ids into folded
+        """
+        self.folded = folded
+        self.values = values
+        self.postings = postings
+
+    @classmethod
+    def build(cls, normalized_values: Iterable[str]) -> 'FuzzyFieldIndex':
+        """
+        Build an index over normalized field values
+
+        Args:
+            normalized_values: Distinct values as stored in the exact index
+
+        Returns:
+            New FuzzyFieldIndex instance
+        """
+        ids: Dict[str, int] = {}
+        folded: List[str] = []
+        values: List[List[str]] = []
+        postings: Dict[str, array] = {}
+
+        for value in normalized_values:
+            if not value:
+                continue
+            key = fold(value)
+            value_id = ids.get(key)
+            if value_id is None:
+                value_id = ids[key] = len(folded)
+                folded.append(key)
+                values.append([])
+                for trigram in trigrams(key):
+                    posting = postings.get(trigram)
+                    if posting is None:
+                        posting = postings[trigram] = array('I')
+                    posting.append(value_id)
+            values[value_id].append(value)
+
+        return cls(folded, values, postings)
+
+    def match(self, query: str) -> List[Tuple[str, int]]:
+        """
+        Find field values within typo distance of the query
+
+        Trigram overlap picks at most MAX_CANDIDATES values, and only those
+        are compared with the query by edit distance, so the cost depends on
+        the posting lists touched rather than on the number of rows.
+
+        Args:
+            query: Normalized query value
+
+        Returns:
+            (normalized value, distance) pairs, closest first
+        """
+        key = fold(query)
+        if not key:
+            return []
+
+        query_trigrams = trigrams(key)
+        common_limit = max(1, int(len(self.folded) * COMMON_TRIGRAM_SHARE))
+        selected = [self.postings[t] for t in query_trigrams if t in self.postings]
+        selective = [posting for posting in selected if len(posting) <= common_limit]
+        # Fall back to common trigrams only if nothing else matches
+        selected = selective or selected
+
+        overlap: Dict[int, int] = {}
+        for posting in selected:
+            for value_id in posting:
+                overlap[value_id] = overlap.get(value_id, 0) + 1
+
+        candidates = sorted(overlap, key=overlap.__getitem__, reverse=True)[:MAX_CANDIDATES]
+
+        limit = max_distance(key)
+        matches = []
+        for value_id in candidates:
+            distance = edit_distance(key, self.folded[value_id], limit)
+            if distance <= limit:
+                for value in self.values[value_id]:
+                    matches.append((value, distance))
+
+        matches.sort(key=lambda match: match[1])
+        return matches
+
+    def to_state(self) -> dict:
+        """Export as plain builtins for persistence"""
+        return {
+            'folded': self.folded,
+            'values': self.values,
+            'postings': {trigram: posting.tobytes() for trigram, posting in self.postings.items()}
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> 'FuzzyFieldIndex':
+        """Restore an index exported with to_state"""
+        postings = {}
+        for trigram, raw in state['postings'].items():
+            posting = array('I')
+            posting.frombytes(raw)
+            postings[trigram] = posting
+        return cls(state['folded'], state['values'], postings)
@@ -3,28 +3,72 @@ Google Sheets API service
 Handles connection to Google Sheets and data retrieval
 """
 
+import asyncio
+import json
 import logging
-from typing import List, Dict, Optional
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, List, Optional, Tuple
 from google.oauth2 import service_account
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
-from config.settings import GOOGLE_CREDENTIALS_PATH, SPREADSHEET_ID, SHEET_NAME, SCOPES
+from config.settings import (
+    GOOGLE_CREDENTIALS_PATH,
+    SCOPES,
+    CACHE_TTL,
+    SNAPSHOT_PATH,
+    REFRESH_BACKOFF_INITIAL,
+    REFRESH_BACKOFF_MAX,
+    SOURCE_FETCH_TIMEOUT
+)
+from src.services.records import RecordTable
+from src.services.sheet_source import SheetSource, MERGED_HEADERS, configured_sources
+from src.services.snapshot import Snapshot
+from src.services.snapshot_store import save_snapshot, load_snapshot
+from src.utils.metrics import metrics
 
 logger = logging.getLogger(__name__)
 
+REFRESH_SECONDS = metrics.histogram(
+    'snapshot_refresh_duration_seconds', 'Time to fetch all sources and publish a snapshot'
+)
+REFRESH_FAILURES = metrics.counter(
+    'snapshot_refresh_failures', 'Refreshes that ended without any data'
+)
+
 
 class GoogleSheetsService:
     """
     Service for interacting with Google Sheets API
-    Reads data from specified spreadsheet
+    Reads data from the configured sources and merges them into one snapshot
     """
     
-    def __init__(self):
-        """Initialize Google Sheets service with credentials"""
-        self.spreadsheet_id = SPREADSHEET_ID
-        self.sheet_name = SHEET_NAME
-        self.service = None
-        self._data_cache = None
+    def __init__(self, sources: Optional[List[SheetSource]] = None):
+        """
+        Initialize Google Sheets service
+        
+        Args:
+            sources: Sheets to read (defaults to the configured ones)
+        """
+        self.sources = sources if sources is not None else configured_sources()
+        self.credentials = None
+        # Sources are fetched in parallel; spare workers let a new refresh
+        # start while a timed-out fetch is still finishing
+        self._executor = ThreadPoolExecutor(
+            max_workers=2 * len(self.sources),
+            thread_name_prefix='sheet-source'
+        )
+        # Current snapshot (records + search index), swapped as a single reference
+        self._snapshot: Optional[Snapshot] = None
+        # In-flight fetch shared by concurrent async callers (single-flight)
+        self._fetch_task: Optional[asyncio.Task] = None
+        # In-flight forced reload, joined by concurrent reload requests
+        self._reload_task: Optional[asyncio.Task] = None
+        # Backoff state for failed refreshes
+        self._refresh_failures = 0
+        self._next_refresh_at = 0.0
+        # Names of the sources that could not be read in the last fetch
+        self.failed_sources: List[str] = []
+        # Called with the new snapshot whenever the published data changes
+        self._snapshot_listeners: List[Callable[[Optional[Snapshot]], None]] = []
         
     def connect(self) -> bool:
         """
@@ -38,19 +82,21 @@ class GoogleSheetsService:
                 scopes=SCOPES
             )
             
-            # Build the service
-            self.service = build('sheets', 'v4', credentials=credentials)
-            logger.info("Successfully connected to Google Sheets API")
+            # Build the API clients, one set per source
+            for source in self.sources:
+                source.connect(credentials)
+            self.credentials = credentials
+            logger.info("Successfully connected to Google Sheets API (%s sources)", len(self.sources))
             return True
             
         except FileNotFoundError:
-            logger.error(f"Credentials file not found: {GOOGLE_CREDENTIALS_PATH}")
+            logger.error("Credentials file not found: %s", GOOGLE_CREDENTIALS_PATH)
             return False
         except Exception as e:
-            logger.error(f"Error connecting to Google Sheets API: {e}")
+            logger.error("Error connecting to Google Sheets API: %s", e)
             return False
     
-    def get_all_data(self, force_refresh: bool = False) -> Optional[List[Dict[str, str]]]:
+    def get_all_data(self, force_refresh: bool = False) -> Optional[RecordTable]:
         """
         Retrieve all data from the spreadsheet
         
@@ -58,90 +104,377 @@ class GoogleSheetsService:
             force_refresh: If True, bypass cache and fetch fresh data
             
         Returns:
-            List of dictionaries where keys are column names and values are cell values
-            Returns None if error occurs
+            Table of records; each record is a read-only mapping of
+            column names to cell values. Returns None if error occurs
+        """
+        snapshot = self.get_snapshot(force_refresh)
+        return snapshot.data if snapshot is not None else None
+    
+    @property
+    def snapshot(self) -> Optional[Snapshot]:
+        """Currently published snapshot, without triggering a fetch"""
+        return self._snapshot
+    
+    def get_snapshot(self, force_refresh: bool = False) -> Optional[Snapshot]:
         """
-        # Return cached data if available and not forcing refresh
-        if self._data_cache and not force_refresh:
-            logger.info("Returning cached data")
-            return self._data_cache
+        Retrieve the current data snapshot with its search index
         
-        # Ensure service is connected
-        if not self.service:
-            if not self.connect():
-                return None
+        Args:
+            force_refresh: If True, bypass cache and fetch fresh data
+            
+        Returns:
+            Snapshot of the spreadsheet or None if error occurs
+        """
+        # Return cached snapshot if available and not forcing refresh
+        if self._snapshot and not force_refresh:
+            logger.debug("Returning cached data")
+            return self._snapshot
+        
+        return self._fetch_snapshot()
+    
+    async def get_all_data_async(self, force_refresh: bool = False) -> Optional[RecordTable]:
+        """
+        Async variant of get_all_data that never blocks the event loop
+        
+        Args:
+            force_refresh: If True, bypass cache and fetch fresh data
+            
+        Returns:
+            Table of records or None if error occurs
+        """
+        snapshot = await self.get_snapshot_async(force_refresh)
+        return snapshot.data if snapshot is not None else None
+    
+    async def get_snapshot_async(self, force_refresh: bool = False) -> Optional[Snapshot]:
+        """
+        Async variant of get_snapshot that never blocks the event loop
+        
+        The Google API call runs in a worker thread. Callers arriving while
+        a fetch is already in flight await that same fetch. Once the cached
+        snapshot is older than CACHE_TTL it is still returned immediately
+        while a background task refreshes it (stale-while-revalidate).
         
+        Args:
+            force_refresh: If True, bypass cache and fetch fresh data
+            
+        Returns:
+            Snapshot of the spreadsheet or None if error occurs
+        """
+        snapshot = self._snapshot
+        if snapshot and not force_refresh:
+            if snapshot.is_stale(CACHE_TTL):
+                self._schedule_refresh()
+            return snapshot
+        
+        task = self._fetch_task
+        if task is None or task.done():
+            task = self._start_fetch()
+        else:
+            logger.info("Joining Google Sheets fetch already in flight")
+        
+        # Shield so a cancelled caller doesn't cancel the fetch for everyone else
+        return await asyncio.shield(task)
+    
+    async def reload(self) -> Tuple[Optional[Snapshot], List[str]]:
+        """
+        Download every source again and rebuild the snapshot from scratch
+        
+        Unlike a refresh, unchanged revisions are not trusted and the index
+        is built anew rather than patched. Searches keep using the current
+        snapshot until the new one is complete and swapped in. A reload
+        requested while another one runs joins it.
+        
+        Returns:
+            (snapshot, failed): the new snapshot, or None if no source could be
+            downloaded (nothing is published then), and the names of the
+            sources that failed and kept their last good rows
+        """
+        task = self._reload_task
+        if task is None or task.done():
+            task = self._reload_task = asyncio.create_task(self._run_reload())
+        return await asyncio.shield(task)
+    
+    async def _run_reload(self) -> Tuple[Optional[Snapshot], List[str]]:
+        """Wait for a refresh in flight, then run the forced fetch as the shared fetch"""
+        task = self._fetch_task
+        if task is not None and not task.done():
+            await asyncio.shield(task)
+        self._fetch_task = asyncio.create_task(self._run_fetch(rebuild=True))
+        snapshot = await self._fetch_task
+        return snapshot, list(self.failed_sources)
+    
+    def load_saved_snapshot(self) -> bool:
+        """
+        Publish the snapshot saved by a previous run, if there is one
+        
+        Returns:
+            True if a saved snapshot was loaded
+        """
+        if not SNAPSHOT_PATH:
+            return False
+        
+        snapshot = load_snapshot(SNAPSHOT_PATH)
+        if snapshot is None:
+            return False
+        
+        self._seed_sources(snapshot)
+        self._publish(snapshot)
+        return True
+    
+    def _seed_sources(self, snapshot: Snapshot) -> None:
+        """
+        Give every source its rows from a saved snapshot as last good data
+        
+        Only done if the snapshot was merged from the same sources, so an
+        unchanged source isn't downloaded again and a broken one still has data.
+        """
         try:
-            # Determine the range to read
-            range_name = f"{self.sheet_name}!A:Z" if self.sheet_name else "A:Z"
-            
-            # Call the Sheets API
-            result = self.service.spreadsheets().values().get(
-                spreadsheetId=self.spreadsheet_id,
-                range=range_name
-            ).execute()
-            
-            values = result.get('values', [])
-            
-            if not values:
-                logger.warning("No data found in spreadsheet")
-                return []
-            
-            # First row contains headers
-            headers = values[0]
-            data = []
-            
-            # Convert rows to dictionaries
-            for row in values[1:]:
-                # Handle rows with missing cells (pad with empty strings)
-                row_data = row + [''] * (len(headers) - len(row))
-                row_dict = {headers[i]: row_data[i] for i in range(len(headers))}
-                data.append(row_dict)
-            
-            # Cache the data
-            self._data_cache = data
-            logger.info(f"Successfully retrieved {len(data)} rows from spreadsheet")
-            return data
-            
-        except HttpError as e:
-            logger.error(f"HTTP error while fetching data: {e}")
-            return None
-        except Exception as e:
-            logger.error(f"Unexpected error while fetching data: {e}")
-            return None
+            manifest = json.loads(snapshot.revision or '[]')
+        except ValueError:
+            return
+        if snapshot.headers != MERGED_HEADERS or [key for key, _, _ in manifest] != [
+            source.key for source in self.sources
+        ]:
+            return
+        
+        rows = snapshot.rows
+        start = 0
+        for source, (_, count, revision) in zip(self.sources, manifest):
+            source.seed(rows[start:start + count], revision)
+            start += count
     
-    def get_headers(self) -> Optional[List[str]]:
+    def add_snapshot_listener(self, listener: Callable[[Optional[Snapshot]], None]) -> None:
+        """
+        Register a callback invoked when a snapshot with new data replaces the old one
+        
+        Listeners may be called from the fetch worker thread and must not block.
+        Snapshots that only refresh the fetch time of unchanged data are not reported.
+        
+        Args:
+            listener: Callable receiving the new snapshot (None after clear_cache)
+        """
+        self._snapshot_listeners.append(listener)
+    
+    def _publish(self, snapshot: Optional[Snapshot]) -> None:
+        """Swap in a snapshot and notify listeners if its data differs"""
+        previous = self._snapshot
+        self._snapshot = snapshot
+        if previous is not None and snapshot is not None and snapshot.data is previous.data:
+            return
+        for listener in self._snapshot_listeners:
+            try:
+                listener(snapshot)
+            except Exception as e:
+                logger.error("Snapshot listener failed: %s", e)
+    
+    def start_background_refresh(self) -> None:
+        """
+        Reconcile with the live sheet without blocking the caller
+        Must be called from a running event loop
+        """
+        if self._fetch_task is not None and not self._fetch_task.done():
+            return
+        logger.info("Starting background refresh of spreadsheet data")
+        self._start_fetch()
+    
+    async def close(self) -> None:
+        """
+        Wait for an in-flight fetch so a snapshot being saved is not cut off
+        Called on application shutdown
+        """
+        task = self._fetch_task
+        if task is not None and not task.done():
+            logger.info("Waiting for spreadsheet fetch to finish before shutdown")
+            await task
+    
+    def _schedule_refresh(self) -> None:
+        """Start a background refresh unless one is running or we are backing off"""
+        if self._fetch_task is not None and not self._fetch_task.done():
+            return
+        if time.monotonic() < self._next_refresh_at:
+            return
+        
+        logger.info("Cached data is stale, refreshing in background")
+        self._start_fetch()
+    
+    def _start_fetch(self) -> asyncio.Task:
+        """Create the shared fetch task"""
+        self._fetch_task = asyncio.create_task(self._run_fetch())
+        return self._fetch_task
+    
+    async def _run_fetch(self, rebuild: bool = False) -> Optional[Snapshot]:
+        """
+        Fetch a snapshot in a worker thread and update backoff state
+        
+        On failure the last good snapshot stays published and the next
+        background refresh is delayed with exponential backoff. A refresh
+        in which only some sources failed publishes the others but backs
+        off the same way, so a broken sheet isn't retried on every request.
+        
+        Args:
+            rebuild: Force a full download and index rebuild (see reload)
+        """
+        snapshot = await asyncio.to_thread(self._fetch_snapshot, rebuild)
+        
+        if snapshot is None or self.failed_sources:
+            self._refresh_failures += 1
+            delay = min(
+                REFRESH_BACKOFF_MAX,
+                REFRESH_BACKOFF_INITIAL * 2 ** (self._refresh_failures - 1)
+            )
+            self._next_refresh_at = time.monotonic() + delay
+            if snapshot is None:
+                logger.warning(
+                    "Refresh failed (%s in a row), keeping last good data, next attempt in %.0fs",
+                    self._refresh_failures, delay
+                )
+            else:
+                logger.warning(
+                    "Sources %s failed (%s refreshes in a row), serving their last good rows, next attempt in %.0fs",
+                    ', '.join(self.failed_sources), self._refresh_failures, delay
+                )
+        else:
+            self._refresh_failures = 0
+            self._next_refresh_at = 0.0
+        
+        return snapshot
+    
+    def _fetch_snapshot(self, rebuild: bool = False) -> Optional[Snapshot]:
         """
-        Get column headers from the spreadsheet
+        Fetch all sources in parallel, merge them into a new snapshot and publish it
+        
+        Each source retries on its own. A source that fails or doesn't finish
+        within SOURCE_FETCH_TIMEOUT contributes its last good rows, so one
+        broken sheet never holds up or empties the others. If no source
+        could be read at all, nothing is published.
         
+        Args:
+            rebuild: Download unchanged sources too and build the index from scratch
+            
         Returns:
-            List of column names or None if error occurs
+            New snapshot or None if no source has any data
         """
-        if not self.service:
+        # Ensure service is connected
+        if self.credentials is None:
             if not self.connect():
                 return None
         
+        previous = self._snapshot
+        
+        with REFRESH_SECONDS.time():
+            snapshot = self._merge_sources(previous, rebuild)
+        if snapshot is None:
+            REFRESH_FAILURES.inc()
+        return snapshot
+    
+    def _merge_sources(self, previous: Optional[Snapshot], rebuild: bool = False) -> Optional[Snapshot]:
+        """
+        Fetch every source and build the merged snapshot (see _fetch_snapshot)
+        
+        Args:
+            previous: Snapshot published before this refresh
+            rebuild: Download unchanged sources too and build the index from scratch
+            
+        Returns:
+            New snapshot, or None if no source could be read or has any data
+        """
         try:
-            range_name = f"{self.sheet_name}!A1:Z1" if self.sheet_name else "A1:Z1"
+            futures = [self._executor.submit(source.fetch, rebuild) for source in self.sources]
+            done, _ = wait(futures, timeout=SOURCE_FETCH_TIMEOUT)
+            
+            changed = False
+            failed = []
+            parts = []
+            for source, future in zip(self.sources, futures):
+                if future in done:
+                    rows, source_changed, ok = future.result()
+                    changed = changed or source_changed
+                else:
+                    logger.warning(
+                        "Source %s not ready after %.0fs, serving last good data",
+                        source.name, SOURCE_FETCH_TIMEOUT
+                    )
+                    rows, ok = source.rows, False
+                if not ok:
+                    failed.append(source.name)
+                parts.append(rows)
+            self.failed_sources = failed
             
-            result = self.service.spreadsheets().values().get(
-                spreadsheetId=self.spreadsheet_id,
-                range=range_name
-            ).execute()
+            if len(failed) == len(self.sources):
+                # Last good rows are no fresher than the published snapshot
+                logger.error("No source could be read, keeping current data")
+                return None
+            
+            if all(rows is None for rows in parts):
+                logger.error("No data available from any source")
+                return None
+            
+            # Source layout and revisions, to seed the sources after a restart
+            revision = json.dumps([
+                [source.key, len(rows or ()), source.revision]
+                for source, rows in zip(self.sources, parts)
+            ])
+            
+            if not rebuild and previous is not None and not changed and previous.revision == revision:
+                if failed:
+                    # The failed sources weren't checked, so the data is no fresher
+                    logger.info("No readable source changed, keeping current data and its age")
+                    return previous
+                logger.info("No source changed, keeping current data")
+                snapshot = previous.touched()
+                self._snapshot = snapshot
+                return snapshot
+            
+            values = [MERGED_HEADERS]
+            for rows in parts:
+                values.extend(rows or ())
+            
+            # Unchanged rows are reused and only changed rows re-indexed (unless
+            # rebuilding); the snapshot is swapped in only after its index is complete
+            snapshot = Snapshot.from_values(values, previous=None if rebuild else previous, revision=revision)
+            if failed and previous is not None:
+                # Rows of the failed sources are as old as the previous snapshot
+                snapshot.fetched_at = previous.fetched_at
+            self._publish(snapshot)
+            logger.info("Successfully retrieved %s rows from %s sources", len(snapshot), len(self.sources))
             
-            headers = result.get('values', [[]])[0]
-            logger.info(f"Retrieved {len(headers)} column headers")
-            return headers
+            # Persist new content for the next cold start (runs in the fetch thread)
+            if SNAPSHOT_PATH and (previous is None or snapshot.data is not previous.data):
+                save_snapshot(snapshot, SNAPSHOT_PATH)
+            return snapshot
             
         except Exception as e:
-            logger.error(f"Error fetching headers: {e}")
+            logger.error("Unexpected error while fetching data: %s", e)
             return None
     
+    def get_headers(self) -> Optional[List[str]]:
+        """
+        Get column headers of the merged data
+        
+        Returns:
+            List of column names or None if no data is available
+        """
+        snapshot = self.get_snapshot()
+        return list(snapshot.headers) if snapshot is not None else None
+    
     def clear_cache(self):
         """Clear cached data to force fresh retrieval on next request"""
-        self._data_cache = None
+        self._publish(None)
         logger.info("Data cache cleared")
 
 
 # Create a singleton instance
 sheets_service = GoogleSheetsService()
+
+metrics.gauge(
+    'snapshot_rows', 'Rows in the published snapshot',
+    lambda: len(sheets_service.snapshot)
+)
+metrics.gauge(
+    'snapshot_age_seconds', 'Seconds since the published snapshot was fetched or confirmed',
+    lambda: sheets_service.snapshot.age()
+)
+metrics.gauge(
+    'snapshot_index_build_seconds', 'Time it took to index the published snapshot',
+    lambda: sheets_service.snapshot.index.build_time
+)
@@ -0,0 +1,170 @@
+"""
+Paginated search results
+Result sets are stored per snapshot under a short handle and rendered page by page
+"""
+
+import hashlib
+import logging
+from typing import List, Mapping, Optional, Tuple
+from config.settings import RESULTS_PAGE_SIZE
+from src.services.search import SearchService
+from src.services.search_index import normalize_criteria
+from src.services.snapshot import Snapshot
+
+logger = logging.getLogger(__name__)
+
+# Telegram rejects longer message texts
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+FUZZY_HEADER = "🔎 Точных совпадений нет. Возможно, вы искали:"
+
+
+class ResultPage:
+    """One rendered page of a result set"""
+
+    __slots__ = ('handle', 'text', 'offset', 'total')
+
+    def __init__(self, handle: str, text: str, offset: int, total: int):
+        """
+        Args:
+            handle: Handle of the result set
+            text: Message text of the page
+            offset: Position of the first record of the page in the result set
+            total: Number of records in the result set
+        """
+        self.handle = handle
+        self.text = text
+        self.offset = offset
+        self.total = total
+
+    @property
+    def has_previous(self) -> bool:
+        return self.offset > 0
+
+    @property
+    def has_next(self) -> bool:
+        return self.offset + RESULTS_PAGE_SIZE < self.total
+
+
+def result_handle(criteria: Mapping[str, str]) -> str:
+    """
+    Compact handle for a query, short enough for inline button callback data
+
+    The same normalized query always maps to the same handle.
+
+    Args:
+        criteria: Field key from SEARCH_COLUMNS to value
+
+    Returns:
+        12-character hex string
+    """
+    normalized = normalize_criteria(criteria)
+    return hashlib.blake2b(repr(normalized).encode(), digest_size=6).hexdigest()
+
+
+def store_results(
+    snapshot: Snapshot,
+    criteria: Mapping[str, str],
+    positions: List[int],
+    fuzzy: bool
+) -> str:
+    """
+    Remember a result set in the snapshot it was computed from
+
+    Args:
+        snapshot: Snapshot the positions refer to
+        criteria: Query that produced the positions
+        positions: Matching row positions
+        fuzzy: True if these are suggestions rather than exact matches
+
+    Returns:
+        Handle for render_page and callback data
+    """
+    handle = result_handle(criteria)
+    snapshot.result_sets[handle] = (tuple(positions), fuzzy)
+    return handle
+
+
+def get_card(snapshot: Snapshot, position: int) -> str:
+    """
+    Rendered card of a row, rendered at most once per snapshot
+
+    Args:
+        snapshot: Snapshot holding the row
+        position: Row position
+
+    Returns:
+        Card text
+    """
+    card = snapshot.cards[position]
+    if card is None:
+        card = SearchService.format_card(snapshot.data[position])
+        snapshot.cards[position] = card
+    return card
+
+
+def render_page(snapshot: Snapshot, handle: str, offset: int) -> Optional[ResultPage]:
+    """
+    Render one page of a stored result set
+
+    Only slices and joins precomputed cards, so turning pages is cheap.
+
+    Args:
+        snapshot: Snapshot the result set was stored in
+        handle: Handle returned by store_results
+        offset: Position of the first record to show (clamped to the result set)
+
+    Returns:
+        Rendered page, or None if the handle is unknown (e.g. the snapshot
+        was replaced since the search)
+    """
+    result_set: Optional[Tuple[Tuple[int, ...], bool]] = snapshot.result_sets.get(handle)
+    if result_set is None:
+        return None
+
+    positions, fuzzy = result_set
+    total = len(positions)
+    if not total:
+        return ResultPage(handle, SearchService.format_results([]), 0, 0)
+
+    last_offset = (total - 1) // RESULTS_PAGE_SIZE * RESULTS_PAGE_SIZE
+    offset = max(0, min(offset - offset % RESULTS_PAGE_SIZE, last_offset))
+
+    header = FUZZY_HEADER if fuzzy else f"✅ Найдено результатов: {total}"
+    pages = (total + RESULTS_PAGE_SIZE - 1) // RESULTS_PAGE_SIZE
+    if pages > 1:
+        header += f"\n📄 Страница {offset // RESULTS_PAGE_SIZE + 1} из {pages}"
+
+    message_parts = [f"{header}\n"]
+    for number, position in enumerate(positions[offset:offset + RESULTS_PAGE_SIZE], offset + 1):
+        message_parts.append("━━━━━━━━━━━━━━━━━━━━")
+        message_parts.append(f"📋 Результат #{number}")
+        message_parts.append("")
+        message_parts.append(get_card(snapshot, position))
+        message_parts.append("")
+
+    text = "\n".join(message_parts)
+    if len(text) > TELEGRAM_MESSAGE_LIMIT:
+        text = text[:TELEGRAM_MESSAGE_LIMIT - 1] + "…"
+
+    return ResultPage(handle, text, offset, total)
+
+
+def search_first_page(snapshot: Snapshot, criteria: Mapping[str, str]) -> Tuple[ResultPage, List[int], bool]:
+    """
+    Search a snapshot, store the result set and render its first page
+
+    Exact matches are looked up first; typo-tolerant suggestions are used
+    when there are none.
+
+    Args:
+        snapshot: Snapshot to search
+        criteria: Field key from SEARCH_COLUMNS to value
+
+    Returns:
+        (first page, matching positions, whether they are suggestions)
+    """
+    positions, fuzzy = SearchService.find_positions(snapshot.index, criteria)
+    positions = list(positions)
+    handle = store_results(snapshot, criteria, positions, fuzzy)
+    return render_page(snapshot, handle, 0), positions, fuzzy
@@ -0,0 +1,103 @@
+"""
+Prefix index for autocomplete
+Sorted array of normalized full names searched with bisect
+"""
+
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Tuple
+from cachetools import LRUCache
+
+# Completions remembered per index (one index per snapshot)
+PREFIX_CACHE_SIZE = 4096
+
+
+def prefix_key(value: str) -> str:
+    """
+    Normalize text for prefix matching
+    Lowercases, treats ё as е and collapses whitespace
+
+    Args:
+        value: Full name or typed prefix
+
+    Returns:
+        Normalized string
+    """
+    return ' '.join(value.lower().replace('ё', 'е').split())
+
+
+class PrefixIndex:
+    """
+    Sorted "surname name patronymic" strings mapped to composite keys
+    A surname alone is a prefix of the full name, so one array serves both
+    """
+
+    def __init__(self, names: List[str], keys: List[Tuple[str, str, str, str]]):
+        """
+        Args:
+            names: Sorted normalized full names (may repeat across classes)
+            keys: Composite key for each entry of names
+        """
+        self.names = names
+        self.keys = keys
+        self._cache: LRUCache = LRUCache(maxsize=PREFIX_CACHE_SIZE)
+
+    @classmethod
+    def build(cls, composite_keys: Iterable[Tuple[str, str, str, str]]) -> 'PrefixIndex':
+        """
+        Build an index from the composite keys of a SearchIndex
+
+        Args:
+            composite_keys: Normalized (surname, name, patronymic, class) tuples
+
+        Returns:
+            New PrefixIndex instance
+        """
+        entries = sorted(
+            (prefix_key(f"{surname} {name} {patronymic}"), (surname, name, patronymic, class_name))
+            for surname, name, patronymic, class_name in composite_keys
+            if surname
+        )
+        return cls([name for name, _ in entries], [key for _, key in entries])
+
+    def complete(self, prefix: str, limit: int) -> List[Tuple[str, str, str, str]]:
+        """
+        Composite keys whose full name starts with the prefix
+
+        Lookup is a binary search plus at most `limit` steps; repeated
+        prefixes are answered from an LRU cache.
+
+        Args:
+            prefix: Text typed by the user
+            limit: Maximum number of keys
+
+        Returns:
+            Composite keys in alphabetical order of full name
+        """
+        prefix = prefix_key(prefix)
+        if not prefix:
+            return []
+
+        cache_key = (prefix, limit)
+        cached = self._cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        names = self.names
+        position = bisect_left(names, prefix)
+        end = min(len(names), position + limit)
+        result = []
+        while position < end and names[position].startswith(prefix):
+            result.append(self.keys[position])
+            position += 1
+
+        self._cache[cache_key] = result
+        return result
+
+    def to_state(self) -> Dict[str, list]:
+        """Export as plain builtins for persistence"""
+        return {'names': self.names, 'keys': self.keys}
+
+    @classmethod
+    def from_state(cls, state: Dict[str, list]) -> 'PrefixIndex':
+        """Restore an index exported with to_state"""
+        return cls(state['names'], [tuple(key) for key in state['keys']])
@@ -0,0 +1,136 @@
+"""
+Compact record storage for spreadsheet data
+Rows are kept as plain tuples with header positions resolved once per table
+"""
+
+import sys
+from collections.abc import Mapping, Sequence
+from typing import Dict, Iterator, List, Tuple, Iterable
+from config.settings import SEARCH_COLUMNS, RESULT_COLUMNS, SOURCE_COLUMN
+
+# Raw spreadsheet row, padded to the header width
+Row = Tuple[str, ...]
+
+# Columns whose values repeat a lot between rows (classes, subjects, common names, sources).
+# Their cells are interned so equal values share one string object.
+INTERNED_COLUMNS = frozenset(SEARCH_COLUMNS.values()) | {RESULT_COLUMNS['subjects'], SOURCE_COLUMN}
+
+
+class Record(Mapping):
+    """
+    Read-only dict-like view of a single row
+    Supports record.get(column) and record[column] like the old row dicts
+    """
+
+    __slots__ = ('_columns', '_row')
+
+    def __init__(self, columns: Dict[str, int], row: Row):
+        """
+        Args:
+            columns: Mapping of column name to position, shared by the whole table
+            row: Cell values of this row
+        """
+        self._columns = columns
+        self._row = row
+
+    def __getitem__(self, key: str) -> str:
+        return self._row[self._columns[key]]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._columns)
+
+    def __len__(self) -> int:
+        return len(self._columns)
+
+    def __repr__(self) -> str:
+        return f"Record({dict(self)!r})"
+
+
+class RecordTable(Sequence):
+    """
+    Sequence of records backed by a list of row tuples
+    Record views are created on access, so no per-row dict is ever stored
+    """
+
+    __slots__ = ('headers', 'columns', 'rows')
+
+    def __init__(self, headers: Tuple[str, ...], rows: List[Row]):
+        """
+        Args:
+            headers: Column names in sheet order
+            rows: Row tuples, each exactly len(headers) long
+        """
+        self.headers = headers
+        # If a header is duplicated, the last occurrence wins (same as the old dicts)
+        self.columns = {header: position for position, header in enumerate(headers)}
+        self.rows = rows
+
+    @classmethod
+    def from_values(cls, headers: Iterable[str], values: Iterable[List[str]]) -> 'RecordTable':
+        """
+        Build a table from raw API rows
+
+        Args:
+            headers: Column names in sheet order
+            values: Data rows as returned by the API (may be short)
+
+        Returns:
+            New RecordTable instance
+        """
+        headers = tuple(headers)
+        return cls(headers, make_rows(headers, values))
+
+    def column(self, name: str) -> List[str]:
+        """
+        All values of a column in row order
+
+        Args:
+            name: Column name
+
+        Returns:
+            List of cell values (empty strings if the column doesn't exist)
+        """
+        position = self.columns.get(name)
+        if position is None:
+            return [''] * len(self.rows)
+        return [row[position] for row in self.rows]
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [Record(self.columns, row) for row in self.rows[position]]
+        return Record(self.columns, self.rows[position])
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+
+def make_rows(headers: Tuple[str, ...], values: Iterable[List[str]]) -> List[Row]:
+    """
+    Convert raw API rows to padded row tuples
+
+    Missing trailing cells become empty strings, extra cells are dropped,
+    and cells of INTERNED_COLUMNS are interned.
+
+    Args:
+        headers: Column names in sheet order
+        values: Data rows as returned by the API
+
+    Returns:
+        List of row tuples, each len(headers) long
+    """
+    width = len(headers)
+    interned = [
+        position for position, header in enumerate(headers)
+        if header in INTERNED_COLUMNS
+    ]
+    intern = sys.intern
+
+    rows = []
+    for cells in values:
+        row = list(cells[:width])
+        if len(row) < width:
+            row.extend([''] * (width - len(row)))
+        for position in interned:
+            row[position] = intern(row[position])
+        rows.append(tuple(row))
+    return rows
@@ -0,0 +1,112 @@
+"""
+Response cache for repeated searches
+Keeps the final rendered reply per normalized query for the current snapshot
+"""
+
+import logging
+import threading
+from typing import Any, Hashable, Optional, Tuple
+from cachetools import LRUCache
+from config.settings import RESPONSE_CACHE_SIZE
+from src.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class CachedResponse:
+    """Rendered reply to a search plus what is needed to page through it"""
+
+    __slots__ = ('text', 'reply_markup', 'handle', 'positions', 'fuzzy')
+
+    def __init__(self, text: str, reply_markup: Any, handle: str, positions: Tuple[int, ...], fuzzy: bool):
+        """
+        Args:
+            text: Message text of the first results page
+            reply_markup: Keyboard sent with it
+            handle: Result set handle used by the page buttons
+            positions: Matching row positions (to restore an evicted result set)
+            fuzzy: True if the positions are suggestions
+        """
+        self.text = text
+        self.reply_markup = reply_markup
+        self.handle = handle
+        self.positions = positions
+        self.fuzzy = fuzzy
+
+
+class ResponseCache:
+    """
+    Bounded LRU cache of rendered search replies with hit/miss counters
+
+    The whole cache belongs to one snapshot generation: clear() is called
+    when a new snapshot is published, and entries computed against an older
+    generation are rejected by put().
+    """
+
+    def __init__(self, maxsize: int):
+        """
+        Args:
+            maxsize: Maximum number of cached replies
+        """
+        self._cache: LRUCache = LRUCache(maxsize=maxsize)
+        # Snapshots are published from the fetch thread
+        self._lock = threading.Lock()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[CachedResponse]:
+        """
+        Look up a cached reply
+
+        Args:
+            key: Normalized query (see normalize_criteria)
+
+        Returns:
+            Cached reply or None
+        """
+        with self._lock:
+            response = self._cache.get(key)
+            if response is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return response
+
+    def put(self, key: Hashable, response: CachedResponse, generation: int) -> None:
+        """
+        Store a reply computed against the given generation
+
+        Args:
+            key: Normalized query
+            response: Rendered reply
+            generation: Value of self.generation read before the snapshot was fetched
+        """
+        with self._lock:
+            if generation == self.generation:
+                self._cache[key] = response
+
+    def clear(self, *_) -> None:
+        """Drop every entry and start a new generation (usable as a snapshot listener)"""
+        with self._lock:
+            dropped = len(self._cache)
+            self._cache.clear()
+            self.generation += 1
+        logger.info("Response cache cleared (%s entries dropped)", dropped)
+
+    @property
+    def hit_ratio(self) -> float:
+        """Share of lookups answered from the cache"""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+
+# Create a singleton instance
+response_cache = ResponseCache(RESPONSE_CACHE_SIZE)
+
+metrics.counter_function('response_cache_hits', 'Searches answered from the response cache', lambda: response_cache.hits)
+metrics.counter_function('response_cache_misses', 'Searches rendered anew', lambda: response_cache.misses)
+metrics.gauge('response_cache_entries', 'Replies in the response cache', lambda: len(response_cache))
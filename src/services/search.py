@@ -4,10 +4,24 @@ Implements case-insensitive exact match search
 """
 
 import logging
-from typing import List, Dict, Optional
-from config.settings import SEARCH_COLUMNS, RESULT_COLUMNS
+import time
+from typing import List, Dict, Optional, Mapping, Sequence, Tuple
+from config.settings import SEARCH_COLUMNS, RESULT_COLUMNS, SOURCE_COLUMN, MAX_DISPLAY_RESULTS
+from src.services.search_index import SearchIndex, FIELD_KEYS, normalize_value
+from src.utils.metrics import metrics
+from src.utils.logger import get_sampled_logger
 
 logger = logging.getLogger(__name__)
+# Per-search result lines, written for a sample of searches
+request_logger = get_sampled_logger(__name__)
+
+SEARCH_SECONDS = metrics.histogram('search_duration_seconds', 'Index lookup time', ('kind',))
+_EXACT_SECONDS = SEARCH_SECONDS.labels('exact')
+_FUZZY_SECONDS = SEARCH_SECONDS.labels('fuzzy')
+_AUTOCOMPLETE_SECONDS = SEARCH_SECONDS.labels('autocomplete')
+
+# Column name (e.g. 'Фамилия') -> field key (e.g. 'surname')
+_FIELD_KEYS_BY_COLUMN = {column: field for field, column in SEARCH_COLUMNS.items()}
 
 
 class SearchService:
@@ -18,10 +32,11 @@ class SearchService:
     
     @staticmethod
     def search_by_field(
-        data: List[Dict[str, str]],
+        data: Sequence[Mapping[str, str]],
         field_name: str,
-        search_value: str
-    ) -> List[Dict[str, str]]:
+        search_value: str,
+        index: Optional[SearchIndex] = None
+    ) -> List[Mapping[str, str]]:
         """
         Search for participants by a specific field
         
@@ -29,6 +44,7 @@ class SearchService:
             data: List of participant records from spreadsheet
             field_name: Name of the field to search (e.g., 'Фамилия', 'Имя')
             search_value: Value to search for (case-insensitive exact match)
+            index: Search index built over data; used for searchable columns
             
         Returns:
             List of matching records
@@ -41,6 +57,13 @@ class SearchService:
             logger.warning("Search called with empty search value")
             return []
         
+        field_key = _FIELD_KEYS_BY_COLUMN.get(field_name)
+        if index is not None and field_key is not None:
+            positions = index.lookup_fields({field_key: search_value})
+            results = [data[position] for position in positions]
+            request_logger.info("Search by '%s' for '%s' found %s results", field_name, search_value, len(results))
+            return results
+        
         # Normalize search value (case-insensitive)
         search_value_lower = search_value.strip().lower()
         
@@ -53,17 +76,18 @@ class SearchService:
             if field_value == search_value_lower:
                 results.append(record)
         
-        logger.info(f"Search by '{field_name}' for '{search_value}' found {len(results)} results")
+        request_logger.info("Search by '%s' for '%s' found %s results", field_name, search_value, len(results))
         return results
     
     @staticmethod
     def search_by_all_fields(
-        data: List[Dict[str, str]],
+        data: Sequence[Mapping[str, str]],
         surname: str,
         name: str,
         patronymic: str,
-        class_name: str
-    ) -> List[Dict[str, str]]:
+        class_name: str,
+        index: Optional[SearchIndex] = None
+    ) -> List[Mapping[str, str]]:
         """
         Search for participants by all fields at once
         
@@ -73,6 +97,7 @@ class SearchService:
             name: Name to search for
             patronymic: Patronymic to search for
             class_name: Class to search for
+            index: Search index built over data; enables O(1) lookup
             
         Returns:
             List of matching records (all fields must match)
@@ -81,19 +106,25 @@ class SearchService:
             logger.warning("Search called with empty data")
             return []
         
-        # Normalize all search values (case-insensitive)
-        surname_lower = surname.strip().lower()
-        name_lower = name.strip().lower()
-        patronymic_lower = patronymic.strip().lower()
-        class_lower = class_name.strip().lower()
+        if index is not None:
+            positions = index.lookup(surname, name, patronymic, class_name)
+            results = [data[position] for position in positions]
+            request_logger.info("Search by all fields for '%s %s %s %s' found %s results", surname, name, patronymic, class_name, len(results))
+            return results
+        
+        # No index available - fall back to a linear scan
+        surname_lower = normalize_value(surname)
+        name_lower = normalize_value(name)
+        patronymic_lower = normalize_value(patronymic)
+        class_lower = normalize_value(class_name)
         
         results = []
         for record in data:
             # Get field values from record
-            record_surname = record.get(SEARCH_COLUMNS['surname'], '').strip().lower()
-            record_name = record.get(SEARCH_COLUMNS['name'], '').strip().lower()
-            record_patronymic = record.get(SEARCH_COLUMNS['patronymic'], '').strip().lower()
-            record_class = record.get(SEARCH_COLUMNS['class'], '').strip().lower()
+            record_surname = normalize_value(record.get(SEARCH_COLUMNS['surname'], ''))
+            record_name = normalize_value(record.get(SEARCH_COLUMNS['name'], ''))
+            record_patronymic = normalize_value(record.get(SEARCH_COLUMNS['patronymic'], ''))
+            record_class = normalize_value(record.get(SEARCH_COLUMNS['class'], ''))
             
             # All fields must match (exact match, case-insensitive)
             if (record_surname == surname_lower and
@@ -102,16 +133,189 @@ class SearchService:
                 record_class == class_lower):
                 results.append(record)
         
-        logger.info(f"Search by all fields for '{surname} {name} {patronymic} {class_name}' found {len(results)} results")
+        request_logger.info("Search by all fields for '%s %s %s %s' found %s results", surname, name, patronymic, class_name, len(results))
         return results
     
     @staticmethod
-    def format_results(results: List[Dict[str, str]]) -> str:
+    def search_by_fields(
+        data: Sequence[Mapping[str, str]],
+        criteria: Mapping[str, str],
+        index: Optional[SearchIndex] = None
+    ) -> List[Mapping[str, str]]:
+        """
+        Search for participants by any subset of the search fields
+        
+        Args:
+            data: List of participant records from spreadsheet
+            criteria: Field key from SEARCH_COLUMNS (e.g., 'surname', 'class')
+                to value; every given field must match
+            index: Search index built over data; enables posting list intersection
+            
+        Returns:
+            List of matching records
+        """
+        if not data:
+            logger.warning("Search called with empty data")
+            return []
+        
+        criteria = {field: value for field, value in criteria.items() if normalize_value(value)}
+        if not criteria:
+            logger.warning("Search called with empty criteria")
+            return []
+        
+        if index is not None:
+            positions = index.lookup_fields(criteria)
+            results = [data[position] for position in positions]
+        else:
+            # No index available - fall back to a linear scan
+            wanted = [
+                (SEARCH_COLUMNS[field], normalize_value(value))
+                for field, value in criteria.items()
+            ]
+            results = [
+                record for record in data
+                if all(normalize_value(record.get(column, '')) == value for column, value in wanted)
+            ]
+        
+        request_logger.info("Search for %s found %s results", criteria, len(results))
+        return results
+    
+    @staticmethod
+    def search_fuzzy(
+        data: Sequence[Mapping[str, str]],
+        criteria: Mapping[str, str],
+        index: Optional[SearchIndex] = None,
+        limit: int = MAX_DISPLAY_RESULTS
+    ) -> List[Mapping[str, str]]:
+        """
+        Typo-tolerant search by any subset of the search fields
+        
+        Tolerates ё/е, missing, extra or swapped letters in names and
+        spaces in the class ("10 А" vs "10А").
+        
+        Args:
+            data: List of participant records from spreadsheet
+            criteria: Field key from SEARCH_COLUMNS to value
+            index: Search index built over data (built on the fly if None)
+            limit: Maximum number of results
+            
+        Returns:
+            Matching records, closest matches first
+        """
+        if not data:
+            logger.warning("Search called with empty data")
+            return []
+        
+        if index is None:
+            index = SearchIndex.build(data)
+        
+        ranked = index.lookup_fuzzy(criteria, limit)
+        results = [data[position] for position, _ in ranked]
+        
+        request_logger.info("Fuzzy search for %s found %s results", criteria, len(results))
+        return results
+    
+    @staticmethod
+    def find_positions(
+        index: SearchIndex,
+        criteria: Mapping[str, str],
+        fuzzy_limit: int = MAX_DISPLAY_RESULTS
+    ) -> Tuple[List[int], bool]:
+        """
+        Row positions for a bot query: exact matches, or typo-tolerant
+        suggestions when nothing matches exactly
+        
+        Args:
+            index: Search index of the current snapshot
+            criteria: Field key from SEARCH_COLUMNS to value
+            fuzzy_limit: Maximum number of suggestions
+            
+        Returns:
+            (positions, fuzzy) where fuzzy tells whether these are suggestions
+        """
+        started = time.perf_counter()
+        positions = index.lookup_fields(criteria)
+        _EXACT_SECONDS.observe(time.perf_counter() - started)
+        if positions:
+            request_logger.info("Search for %s found %s results", criteria, len(positions))
+            return positions, False
+        
+        with _FUZZY_SECONDS.time():
+            positions = [position for position, _ in index.lookup_fuzzy(criteria, fuzzy_limit)]
+        request_logger.info("Search for %s found no exact match, %s suggestions", criteria, len(positions))
+        return positions, True
+    
+    @staticmethod
+    def autocomplete(
+        data: Sequence[Mapping[str, str]],
+        prefix: str,
+        index: SearchIndex,
+        limit: int
+    ) -> List[Mapping[str, str]]:
+        """
+        Records whose "Фамилия Имя Отчество" starts with the typed prefix
+        
+        Used for inline queries, which arrive on every keystroke, so this
+        only does a binary search in the prefix index (no logging at INFO).
+        
+        Args:
+            data: List of participant records from spreadsheet
+            prefix: Text typed by the user
+            index: Search index built over data
+            limit: Maximum number of records
+            
+        Returns:
+            Matching records in alphabetical order
+        """
+        with _AUTOCOMPLETE_SECONDS.time():
+            positions = index.complete(prefix, limit)
+        logger.debug("Autocomplete for '%s' found %s results", prefix, len(positions))
+        return [data[position] for position in positions]
+    
+    @staticmethod
+    def parse_query(text: str) -> Dict[str, str]:
+        """
+        Parse user input into search criteria
+        
+        Four or more words are read as "Фамилия Имя Отчество Класс" (the class
+        may contain spaces). Shorter input may omit fields: the first word that
+        starts with a digit begins the class, the words before it are surname,
+        name and patronymic in that order.
+        
+        Args:
+            text: Raw user input, e.g. "Иванов Иван Иванович 10А" or "Иванов 10А"
+            
+        Returns:
+            Field key from SEARCH_COLUMNS to value (only fields that were given)
+        """
+        parts = text.split()
+        if not parts:
+            return {}
+        
+        if len(parts) >= len(FIELD_KEYS):
+            names = parts[:3]
+            class_name = ' '.join(parts[3:])
+        else:
+            class_start = next(
+                (position for position, part in enumerate(parts) if part[0].isdigit()),
+                len(parts)
+            )
+            names = parts[:class_start]
+            class_name = ' '.join(parts[class_start:])
+        
+        criteria = dict(zip(('surname', 'name', 'patronymic'), names))
+        if class_name:
+            criteria['class'] = class_name
+        return criteria
+    
+    @staticmethod
+    def format_results(results: List[Mapping[str, str]], header: Optional[str] = None) -> str:
         """
         Format search results for display in Telegram
         
         Args:
             results: List of matching records
+            header: First line of the message (defaults to the result count)
             
         Returns:
             Formatted string for Telegram message
@@ -120,44 +324,96 @@ class SearchService:
             return "❌ Ничего не найдено. Попробуйте изменить параметры поиска."
         
         # Build formatted message
-        message_parts = [f"✅ Найдено результатов: {len(results)}\n"]
+        if header is None:
+            header = f"✅ Найдено результатов: {len(results)}"
+        message_parts = [f"{header}\n"]
+        
+        # Broad queries (a whole class, a common surname) would exceed Telegram's message limit
+        shown = results[:MAX_DISPLAY_RESULTS]
         
-        for idx, record in enumerate(results, 1):
+        for idx, record in enumerate(shown, 1):
             message_parts.append(f"━━━━━━━━━━━━━━━━━━━━")
             message_parts.append(f"📋 Результат #{idx}")
             message_parts.append("")
-            
-            # Add search fields for context
-            surname = record.get(SEARCH_COLUMNS['surname'], 'N/A')
-            name = record.get(SEARCH_COLUMNS['name'], 'N/A')
-            patronymic = record.get(SEARCH_COLUMNS['patronymic'], 'N/A')
-            class_name = record.get(SEARCH_COLUMNS['class'], 'N/A')
-            
-            message_parts.append(f"👤 ФИО: {surname} {name} {patronymic}")
-            message_parts.append(f"🏫 Класс: {class_name}")
+            message_parts.append(SearchService.format_card(record))
             message_parts.append("")
+        
+        if len(results) > len(shown):
+            message_parts.append(
+                f"Показаны первые {len(shown)} из {len(results)}. "
+                "Уточните запрос, чтобы сузить поиск."
+            )
+        
+        return "\n".join(message_parts)
+    
+    @staticmethod
+    def format_inline_entry(record: Mapping[str, str]) -> Tuple[str, str, str]:
+        """
+        Format a record as an inline query result
+        
+        Args:
+            record: Participant record
             
-            # Add result fields (ID and Subjects)
-            participant_id = record.get(RESULT_COLUMNS['id'], 'N/A')
-            subjects = record.get(RESULT_COLUMNS['subjects'], 'N/A')
-            
-            message_parts.append(f"🆔 ID участника: {participant_id}")
-            message_parts.append(f"📚 Предметы:")
-            
-            # Format subjects (handle multiline text)
-            if subjects and subjects != 'N/A':
-                # Split by newlines if present
-                subject_lines = subjects.split('\n')
-                for subject_line in subject_lines:
-                    subject_line = subject_line.strip()
-                    if subject_line:
-                        message_parts.append(f"   • {subject_line}")
-            else:
-                message_parts.append("   • Не указаны")
+        Returns:
+            (title, description, message text)
+        """
+        full_name = ' '.join(
+            record.get(SEARCH_COLUMNS[field], '')
+            for field in ('surname', 'name', 'patronymic')
+        )
+        return (
+            f"{full_name}, {record.get(SEARCH_COLUMNS['class'], '')}",
+            f"🆔 {record.get(RESULT_COLUMNS['id'], 'N/A')}",
+            SearchService.format_results([record])
+        )
+    
+    @staticmethod
+    def format_card(record: Mapping[str, str]) -> str:
+        """
+        Format a single record for display in Telegram
+        
+        Args:
+            record: Participant record
             
-            message_parts.append("")
+        Returns:
+            Card text: name, class, ID and subjects
+        """
+        # Add search fields for context
+        surname = record.get(SEARCH_COLUMNS['surname'], 'N/A')
+        name = record.get(SEARCH_COLUMNS['name'], 'N/A')
+        patronymic = record.get(SEARCH_COLUMNS['patronymic'], 'N/A')
+        class_name = record.get(SEARCH_COLUMNS['class'], 'N/A')
         
-        return "\n".join(message_parts)
+        card_parts = [
+            f"👤 ФИО: {surname} {name} {patronymic}",
+            f"🏫 Класс: {class_name}"
+        ]
+        
+        # Source tag when data is merged from several sheets
+        source = record.get(SOURCE_COLUMN, '')
+        if source:
+            card_parts.append(f"📂 Источник: {source}")
+        card_parts.append("")
+        
+        # Add result fields (ID and Subjects)
+        participant_id = record.get(RESULT_COLUMNS['id'], 'N/A')
+        subjects = record.get(RESULT_COLUMNS['subjects'], 'N/A')
+        
+        card_parts.append(f"🆔 ID участника: {participant_id}")
+        card_parts.append(f"📚 Предметы:")
+        
+        # Format subjects (handle multiline text)
+        if subjects and subjects != 'N/A':
+            # Split by newlines if present
+            subject_lines = subjects.split('\n')
+            for subject_line in subject_lines:
+                subject_line = subject_line.strip()
+                if subject_line:
+                    card_parts.append(f"   • {subject_line}")
+        else:
+            card_parts.append("   • Не указаны")
+        
+        return "\n".join(card_parts)
     
     @staticmethod
     def validate_field_name(field_name: str) -> bool:
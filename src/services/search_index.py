@@ -0,0 +1,409 @@
+"""
+Search index for participant records
+Maps normalized search keys to row positions so lookups don't scan the data
+"""
+
+import logging
+import time
+from bisect import bisect_left
+from typing import List, Dict, Tuple, Iterable, Mapping, Sequence, Optional
+from config.settings import SEARCH_COLUMNS
+from src.services.fuzzy_index import FuzzyFieldIndex, fold
+from src.services.prefix_index import PrefixIndex
+
+logger = logging.getLogger(__name__)
+
+# Search fields in composite key order (keys of SEARCH_COLUMNS)
+FIELD_KEYS = ('surname', 'name', 'patronymic', 'class')
+
+# Free-text fields that get a typo-tolerant index (classes are matched by folding)
+FUZZY_FIELD_KEYS = ('surname', 'name', 'patronymic')
+
+# Composite key: (surname, name, patronymic, class), all normalized
+CompositeKey = Tuple[str, str, str, str]
+
+# Normalized field value -> sorted row positions
+PostingIndex = Dict[str, List[int]]
+
+
+def normalize_value(value: str) -> str:
+    """
+    Normalize a cell or query value for exact matching
+
+    Args:
+        value: Raw value from the spreadsheet or user input
+
+    Returns:
+        Value with surrounding whitespace removed, lowercased
+    """
+    return (value or '').strip().lower()
+
+
+def make_composite_key(surname: str, name: str, patronymic: str, class_name: str) -> CompositeKey:
+    """
+    Build a normalized composite key from the four search fields
+
+    Returns:
+        Tuple usable as a key in SearchIndex
+    """
+    return (
+        normalize_value(surname),
+        normalize_value(name),
+        normalize_value(patronymic),
+        normalize_value(class_name)
+    )
+
+
+def normalize_criteria(criteria: Mapping[str, str]) -> Tuple[Tuple[str, str], ...]:
+    """
+    Canonical form of a query: sorted (field, normalized value) pairs
+
+    Args:
+        criteria: Field key (e.g. 'surname', 'class') to value
+
+    Returns:
+        Hashable tuple; empty values are dropped
+    """
+    return tuple(sorted(
+        (field, normalize_value(value))
+        for field, value in criteria.items()
+        if normalize_value(value)
+    ))
+
+
+def intersect_postings(postings: List[List[int]]) -> List[int]:
+    """
+    Intersect sorted posting lists, smallest first
+
+    The running result only shrinks, so each further list is probed with
+    a binary search per remaining position instead of being scanned.
+
+    Args:
+        postings: Sorted lists of row positions
+
+    Returns:
+        Sorted positions present in every list
+    """
+    if not postings:
+        return []
+
+    postings = sorted(postings, key=len)
+    result = postings[0]
+    for other in postings[1:]:
+        if not result:
+            break
+        matched = []
+        low = 0
+        size = len(other)
+        for position in result:
+            low = bisect_left(other, position, low, size)
+            if low == size:
+                break
+            if other[low] == position:
+                matched.append(position)
+        result = matched
+    return list(result)
+
+
+class SearchIndex:
+    """
+    Hash indexes over the search columns of a data snapshot
+    Built once per snapshot and never mutated afterwards
+    """
+
+    def __init__(
+        self,
+        composite: Dict[CompositeKey, List[int]],
+        fields: Dict[str, PostingIndex],
+        build_time: float = 0.0,
+        fuzzy: Optional[Dict[str, FuzzyFieldIndex]] = None,
+        prefix: Optional[PrefixIndex] = None
+    ):
+        """
+        Args:
+            composite: Mapping of composite key to row positions
+            fields: Inverted index per search field (keys of SEARCH_COLUMNS)
+            build_time: Seconds spent building the index
+            fuzzy: Trigram index per FUZZY_FIELD_KEYS field (built from fields if None)
+            prefix: Full-name prefix index (built from composite if None)
+        """
+        self.composite = composite
+        self.fields = fields
+        if fuzzy is None:
+            fuzzy = {field: FuzzyFieldIndex.build(fields[field]) for field in FUZZY_FIELD_KEYS}
+        self.fuzzy = fuzzy
+        if prefix is None:
+            prefix = PrefixIndex.build(composite)
+        self.prefix = prefix
+        self.build_time = build_time
+
+    @classmethod
+    def build(cls, data: Sequence[Mapping[str, str]]) -> 'SearchIndex':
+        """
+        Build an index for the given records
+
+        Args:
+            data: Participant records (RecordTable or list of dicts)
+
+        Returns:
+            New SearchIndex instance
+        """
+        started = time.perf_counter()
+
+        if hasattr(data, 'column'):
+            # Columnar access avoids creating a record view per row
+            keys = zip(*(data.column(SEARCH_COLUMNS[field]) for field in FIELD_KEYS))
+        else:
+            keys = (
+                tuple(record.get(SEARCH_COLUMNS[field], '') for field in FIELD_KEYS)
+                for record in data
+            )
+
+        composite: Dict[CompositeKey, List[int]] = {}
+        fields: Dict[str, PostingIndex] = {field: {} for field in FIELD_KEYS}
+        field_indexes = [fields[field] for field in FIELD_KEYS]
+
+        for position, values in enumerate(keys):
+            key = make_composite_key(*values)
+            composite.setdefault(key, []).append(position)
+            for field_index, value in zip(field_indexes, key):
+                field_index.setdefault(value, []).append(position)
+
+        index = cls(composite, fields)
+        index.build_time = time.perf_counter() - started
+        logger.info("Built search index for %s rows in %.1f ms", len(data), index.build_time * 1000)
+        return index
+
+    def updated(
+        self,
+        old_data: Sequence[Mapping[str, str]],
+        new_data: Sequence[Mapping[str, str]],
+        changed_positions: Iterable[int]
+    ) -> 'SearchIndex':
+        """
+        Build a new index by re-indexing only the changed rows
+
+        The current index is left untouched so it stays valid for readers
+        of the old snapshot; only posting lists that change are copied.
+
+        Args:
+            old_data: Records this index was built over
+            new_data: Records of the new snapshot
+            changed_positions: Row positions that differ between the two
+
+        Returns:
+            New SearchIndex instance for new_data
+        """
+        started = time.perf_counter()
+
+        # Composite index first, then one index per field
+        indexes = [dict(self.composite)] + [dict(self.fields[field]) for field in FIELD_KEYS]
+        # Per index: key -> positions leaving / joining its posting list
+        removed = [{} for _ in indexes]
+        added = [{} for _ in indexes]
+
+        def keys_of(record: Mapping[str, str]) -> list:
+            composite_key = self._record_key(record)
+            return [composite_key] + list(composite_key)
+
+        changed = 0
+        for position in changed_positions:
+            changed += 1
+            if position < len(old_data):
+                for which, key in enumerate(keys_of(old_data[position])):
+                    removed[which].setdefault(key, set()).add(position)
+            if position < len(new_data):
+                for which, key in enumerate(keys_of(new_data[position])):
+                    added[which].setdefault(key, []).append(position)
+
+        # Each touched posting list is rebuilt once, however many of its rows changed
+        for index, removals, additions in zip(indexes, removed, added):
+            for key in removals.keys() | additions.keys():
+                leaving = removals.get(key)
+                postings = index.get(key, [])
+                if leaving:
+                    postings = [position for position in postings if position not in leaving]
+                else:
+                    postings = list(postings)
+                joining = additions.get(key)
+                if joining:
+                    postings.extend(joining)
+                    postings.sort()
+                if postings:
+                    index[key] = postings
+                else:
+                    index.pop(key, None)
+
+        fields = dict(zip(FIELD_KEYS, indexes[1:]))
+        # Fuzzy indexes cover distinct values only, so rebuild just the affected fields
+        fuzzy = {
+            field: self.fuzzy[field] if fields[field].keys() == self.fields[field].keys()
+            else FuzzyFieldIndex.build(fields[field])
+            for field in FUZZY_FIELD_KEYS
+        }
+
+        composite = indexes[0]
+        prefix = self.prefix if composite.keys() == self.composite.keys() else None
+
+        index = SearchIndex(composite, fields, fuzzy=fuzzy, prefix=prefix)
+        index.build_time = time.perf_counter() - started
+        logger.info("Re-indexed %s changed rows in %.1f ms", changed, index.build_time * 1000)
+        return index
+
+    @staticmethod
+    def _record_key(record: Mapping[str, str]) -> CompositeKey:
+        """Composite key of a spreadsheet record"""
+        return make_composite_key(
+            *(record.get(SEARCH_COLUMNS[field], '') for field in FIELD_KEYS)
+        )
+
+    def to_state(self) -> dict:
+        """
+        Export the index as plain builtins for persistence
+
+        Returns:
+            Dictionary accepted by from_state
+        """
+        return {
+            'composite': self.composite,
+            'fields': self.fields,
+            'fuzzy': {field: index.to_state() for field, index in self.fuzzy.items()},
+            'prefix': self.prefix.to_state(),
+            'build_time': self.build_time
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> 'SearchIndex':
+        """
+        Restore an index exported with to_state
+
+        Args:
+            state: Dictionary produced by to_state
+
+        Returns:
+            SearchIndex instance
+        """
+        fuzzy = {field: FuzzyFieldIndex.from_state(value) for field, value in state['fuzzy'].items()}
+        return cls(
+            state['composite'],
+            state['fields'],
+            state.get('build_time', 0.0),
+            fuzzy,
+            PrefixIndex.from_state(state['prefix'])
+        )
+
+    def lookup(self, surname: str, name: str, patronymic: str, class_name: str) -> List[int]:
+        """
+        Find row positions matching all four fields
+
+        Returns:
+            List of row positions (empty if nothing matches)
+        """
+        key = make_composite_key(surname, name, patronymic, class_name)
+        return self.composite.get(key, [])
+
+    def lookup_fields(self, criteria: Mapping[str, str]) -> List[int]:
+        """
+        Find row positions matching any subset of the search fields
+
+        Args:
+            criteria: Field key (e.g. 'surname', 'class') to value;
+                empty values are ignored
+
+        Returns:
+            Sorted list of row positions matching every given field
+        """
+        criteria = {
+            field: normalize_value(value)
+            for field, value in criteria.items()
+            if normalize_value(value)
+        }
+        if not criteria:
+            return []
+
+        if len(criteria) == len(FIELD_KEYS):
+            return self.composite.get(tuple(criteria[field] for field in FIELD_KEYS), [])
+
+        postings = []
+        for field, value in criteria.items():
+            posting = self.fields[field].get(value)
+            if not posting:
+                return []
+            postings.append(posting)
+
+        return intersect_postings(postings)
+
+    def lookup_fuzzy(self, criteria: Mapping[str, str], limit: int) -> List[Tuple[int, int]]:
+        """
+        Find row positions approximately matching the given fields
+
+        Name fields tolerate typos (see FuzzyFieldIndex.match); classes match
+        when equal after folding, so "10 А" finds "10А". Every given field
+        must match.
+
+        Args:
+            criteria: Field key (e.g. 'surname', 'class') to value
+            limit: Maximum number of results
+
+        Returns:
+            (row position, total edit distance) pairs, best matches first
+        """
+        criteria = {
+            field: normalize_value(value)
+            for field, value in criteria.items()
+            if normalize_value(value)
+        }
+        if not criteria:
+            return []
+
+        # Row position -> edit distance, one mapping per given field
+        per_field = []
+        for field, value in criteria.items():
+            if field in self.fuzzy:
+                matches = self.fuzzy[field].match(value)
+            else:
+                target = fold(value)
+                matches = [(candidate, 0) for candidate in self.fields[field] if fold(candidate) == target]
+            if not matches:
+                return []
+
+            distances: Dict[int, int] = {}
+            for candidate, distance in matches:
+                for position in self.fields[field].get(candidate, ()):
+                    if distance < distances.get(position, distance + 1):
+                        distances[position] = distance
+            per_field.append(distances)
+
+        per_field.sort(key=len)
+        smallest, rest = per_field[0], per_field[1:]
+
+        ranked = []
+        for position, total in smallest.items():
+            for other in rest:
+                distance = other.get(position)
+                if distance is None:
+                    break
+                total += distance
+            else:
+                ranked.append((total, position))
+
+        ranked.sort()
+        return [(position, total) for total, position in ranked[:limit]]
+
+    def complete(self, prefix: str, limit: int) -> List[int]:
+        """
+        Row positions whose "surname name patronymic" starts with the prefix
+
+        Args:
+            prefix: Text typed by the user (e.g. "Иван" or "Иванов Ив")
+            limit: Maximum number of positions
+
+        Returns:
+            Row positions in alphabetical order of full name
+        """
+        positions = []
+        for key in self.prefix.complete(prefix, limit):
+            positions.extend(self.composite.get(key, ()))
+            if len(positions) >= limit:
+                break
+        return positions[:limit]
@@ -0,0 +1,260 @@
+"""
+Search worker processes
+The bot process (coordinator) publishes every snapshot generation as a
+memory-mapped file; worker processes map it and run CPU-bound searches
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any, Callable, List, Mapping, Optional, Tuple
+from config.settings import SEARCH_WORKERS, SHARED_SNAPSHOT_DIR, LOG_LEVEL
+from src.services.bulk import resolve_file, BulkLookupStats
+from src.services.pagination import search_first_page, ResultPage
+from src.services.search import SearchService
+from src.services.shared_snapshot import write_shared_snapshot, open_shared_snapshot
+from src.services.snapshot import Snapshot
+from src.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+WRITE_SECONDS = metrics.histogram(
+    'shared_snapshot_write_duration_seconds', 'Time to write a snapshot generation for the workers'
+)
+FALLBACKS = metrics.counter(
+    'search_worker_fallbacks', 'Searches run in the bot process because no worker could take them'
+)
+
+# Generation files are named snapshot.<coordinator pid>.<generation>.bin
+FILE_PREFIX = 'snapshot.'
+
+# Snapshot mapped by this worker process: (path, snapshot)
+_mapped: Optional[Tuple[str, Snapshot]] = None
+
+
+def _init_worker() -> None:
+    """Worker process setup: log to stdout and leave Ctrl+C to the coordinator"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logging.basicConfig(
+        level=getattr(logging, LOG_LEVEL.upper(), logging.INFO),
+        format='%(asctime)s - %(processName)s - %(name)s - %(levelname)s - %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S',
+        stream=sys.stdout
+    )
+
+
+def _snapshot(path: str) -> Snapshot:
+    """Snapshot of a generation file, mapping it on first use in this worker"""
+    global _mapped
+    if _mapped is None or _mapped[0] != path:
+        # The previous mapping is released once nothing references it
+        _mapped = (path, open_shared_snapshot(path))
+    return _mapped[1]
+
+
+def _search_task(path: str, criteria: Mapping[str, str]) -> Tuple[ResultPage, List[int], bool]:
+    return search_first_page(_snapshot(path), criteria)
+
+
+def _complete_task(path: str, prefix: str, limit: int) -> List[Tuple[str, str, str]]:
+    snapshot = _snapshot(path)
+    records = SearchService.autocomplete(snapshot.data, prefix, snapshot.index, limit)
+    return [SearchService.format_inline_entry(record) for record in records]
+
+
+def _resolve_task(path: str, input_path: str, output_path: str, max_lines: int) -> BulkLookupStats:
+    return resolve_file(input_path, output_path, _snapshot(path), max_lines)
+
+
+class SearchWorkers:
+    """
+    Pool of search processes sharing one mapped snapshot per generation
+
+    The coordinator is registered as a snapshot listener. Each snapshot with
+    new data is written to a generation file by a background thread, and
+    from then on tasks for that snapshot name the file; a worker maps a
+    generation the first time it gets a task for it. The previous generation
+    is kept until the next one is written, so tasks already queued with it
+    still find the file.
+
+    Every method returns None when the work can't go to a worker (no
+    generation written yet for that snapshot, the pool broke, or the task
+    failed in the worker); callers then do the work in the bot process.
+    """
+
+    def __init__(self, workers: int = SEARCH_WORKERS, directory: str = SHARED_SNAPSHOT_DIR):
+        """
+        Args:
+            workers: Number of worker processes (0 disables the pool)
+            directory: Where generation files are written
+        """
+        self.workers = workers
+        self.directory = Path(directory)
+        self.generation = 0
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._writer: Optional[ThreadPoolExecutor] = None
+        # Data of the newest snapshot handed to publish, and of the one written last with its file
+        self._latest_data = None
+        self._published: Optional[Tuple[Any, str]] = None
+        self._files: List[Path] = []
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self._pool is not None
+
+    def start(self) -> None:
+        """Remove generation files left by earlier runs and start the worker processes"""
+        if self.workers <= 0:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for stale in self.directory.glob(f"{FILE_PREFIX}*"):
+            try:
+                stale.unlink()
+            except OSError:
+                pass
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='shared-snapshot')
+        self._pool = self._create_pool()
+        logger.info("Started %s search worker processes, snapshots shared through %s", self.workers, self.directory)
+
+    def _create_pool(self) -> ProcessPoolExecutor:
+        # Spawned rather than forked: the bot process runs threads that fork would copy mid-operation
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker
+        )
+
+    def publish(self, snapshot: Optional[Snapshot]) -> None:
+        """
+        Snapshot listener: write the snapshot as a new generation in the background
+
+        Args:
+            snapshot: Newly published snapshot (None after the cache was cleared)
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self._latest_data = snapshot.data if snapshot is not None else None
+            if snapshot is None:
+                self._published = None
+                return
+        self._writer.submit(self._write, snapshot)
+
+    def _write(self, snapshot: Snapshot) -> None:
+        """Write one generation file and make it current (runs in the writer thread)"""
+        if snapshot.data is not self._latest_data:
+            # A newer snapshot was published meanwhile; write that one instead
+            return
+
+        self.generation += 1
+        path = self.directory / f"{FILE_PREFIX}{os.getpid()}.{self.generation}.bin"
+        started = time.perf_counter()
+        try:
+            write_shared_snapshot(snapshot, str(path))
+        except Exception as e:
+            logger.error("Failed to write shared snapshot %s: %s", path, e)
+            return
+        elapsed = time.perf_counter() - started
+        WRITE_SECONDS.observe(elapsed)
+
+        with self._lock:
+            if snapshot.data is self._latest_data:
+                self._published = (snapshot.data, str(path))
+        self._files.append(path)
+        logger.info(
+            "Shared snapshot generation %s: %s rows, %.1f MB written in %.0f ms",
+            self.generation, len(snapshot), path.stat().st_size / 2**20, elapsed * 1000
+        )
+
+        # Keep the previous generation for tasks already queued with it
+        while len(self._files) > 2:
+            old = self._files.pop(0)
+            try:
+                old.unlink()
+            except OSError as e:
+                logger.warning("Could not remove old shared snapshot %s: %s", old, e)
+
+    def path_for(self, snapshot: Snapshot) -> Optional[str]:
+        """Generation file holding the snapshot's data, if it has been written"""
+        published = self._published
+        if published is None or published[0] is not snapshot.data:
+            return None
+        return published[1]
+
+    async def search(self, snapshot: Snapshot, criteria: Mapping[str, str]) -> Optional[Tuple[ResultPage, List[int], bool]]:
+        """
+        search_first_page in a worker
+
+        The result set is stored in the worker's copy only; store the returned
+        positions in the snapshot to serve later pages from the bot process.
+        """
+        return await self._run(snapshot, _search_task, criteria)
+
+    async def complete(self, snapshot: Snapshot, prefix: str, limit: int) -> Optional[List[Tuple[str, str, str]]]:
+        """Autocomplete in a worker, as SearchService.format_inline_entry tuples"""
+        return await self._run(snapshot, _complete_task, prefix, limit)
+
+    async def resolve_file(
+        self,
+        snapshot: Snapshot,
+        input_path: str,
+        output_path: str,
+        max_lines: int
+    ) -> Optional[BulkLookupStats]:
+        """bulk.resolve_file in a worker (the paths must be readable by the workers)"""
+        return await self._run(snapshot, _resolve_task, input_path, output_path, max_lines)
+
+    async def _run(self, snapshot: Snapshot, task: Callable, *args) -> Any:
+        """Run a task on the snapshot's generation, or return None to run it locally"""
+        path = self.path_for(snapshot) if self.enabled else None
+        if path is None:
+            if self.enabled:
+                FALLBACKS.inc()
+            return None
+
+        pool = self._pool
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, task, path, *args)
+        except BrokenProcessPool:
+            FALLBACKS.inc()
+            if self._pool is pool:
+                logger.error("A search worker died, restarting the worker pool")
+                self._pool = self._create_pool()
+                pool.shutdown(wait=False)
+            return None
+        except Exception as e:
+            # E.g. the generation file was removed after two newer ones were written
+            FALLBACKS.inc()
+            logger.warning("Search worker task %s failed, running it here: %s", task.__name__, e)
+            return None
+
+    def stop(self) -> None:
+        """Stop the workers and the writer and remove the generation files"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+        if self._writer is not None:
+            self._writer.shutdown(wait=True)
+            self._writer = None
+        for path in self._files:
+            try:
+                path.unlink()
+            except OSError:
+                pass
+        self._files.clear()
+        self._published = None
+
+
+# Create a singleton instance
+search_workers = SearchWorkers()
+
+metrics.gauge('shared_snapshot_generation', 'Snapshot generations written for the search workers', lambda: search_workers.generation)
@@ -0,0 +1,403 @@
+"""
+Memory-mapped snapshot format
+Stores records and search index in flat arrays that several processes can
+map read-only and search in place, without loading them into Python objects
+"""
+
+import json
+import logging
+import mmap
+import os
+import zlib
+from array import array
+from collections.abc import Mapping, Sequence
+from itertools import accumulate
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Tuple
+from cachetools import LRUCache
+from config.settings import SEARCH_COLUMNS
+from src.services.fuzzy_index import FuzzyFieldIndex
+from src.services.prefix_index import PrefixIndex
+from src.services.records import Record
+from src.services.search_index import SearchIndex, FIELD_KEYS
+from src.services.snapshot import Snapshot
+
+logger = logging.getLogger(__name__)
+
+# File signature; bump the version whenever the layout changes
+MAGIC = b'ARCTSHM\x00'
+FORMAT_VERSION = 1
+
+# Joins the parts of a composite key into one string key
+KEY_SEPARATOR = '\x1f'
+
+# Sections start at multiples of this so typed views are aligned
+ALIGNMENT = 8
+
+# Rendered cards kept per mapped snapshot (in each worker process)
+MAPPED_CARD_CACHE_SIZE = 10000
+
+
+class StringTable(Sequence):
+    """Strings stored back to back as UTF-8 with an offset per string"""
+
+    __slots__ = ('offsets', 'blob')
+
+    def __init__(self, offsets: memoryview, blob: memoryview):
+        """
+        Args:
+            offsets: Start of every string in blob, plus the end of the last ('Q')
+            blob: Concatenated UTF-8 bytes
+        """
+        self.offsets = offsets
+        self.blob = blob
+
+    def raw(self, position: int) -> memoryview:
+        """Bytes of one string, without decoding"""
+        return self.blob[self.offsets[position]:self.offsets[position + 1]]
+
+    def __getitem__(self, position: int) -> str:
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError(position)
+        return str(self.blob[self.offsets[position]:self.offsets[position + 1]], 'utf-8')
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+
+class KeyTable(StringTable):
+    """String table of composite keys, returned as tuples"""
+
+    __slots__ = ()
+
+    def __getitem__(self, position: int) -> Tuple[str, ...]:
+        return tuple(super().__getitem__(position).split(KEY_SEPARATOR))
+
+
+class GroupedStrings(Sequence):
+    """Lists of strings: group i is strings[groups[i]:groups[i + 1]]"""
+
+    __slots__ = ('groups', 'strings')
+
+    def __init__(self, groups: memoryview, strings: StringTable):
+        self.groups = groups
+        self.strings = strings
+
+    def __getitem__(self, position: int) -> List[str]:
+        return [self.strings[item] for item in range(self.groups[position], self.groups[position + 1])]
+
+    def __len__(self) -> int:
+        return len(self.groups) - 1
+
+
+class PostingMap(Mapping):
+    """
+    String key -> sorted integers, as an open-addressing hash table
+
+    Slots hold key ids (plus one; zero marks an empty slot) at the
+    crc32 of the key, probed linearly. Values are slices of one shared
+    integer array, returned as read-only memoryviews.
+    """
+
+    __slots__ = ('keys', 'slots', 'starts', 'postings', 'mask')
+
+    def __init__(self, keys: StringTable, slots: memoryview, starts: memoryview, postings: memoryview):
+        """
+        Args:
+            keys: Key strings in id order
+            slots: Hash table of key id + 1 ('I', power-of-two length)
+            starts: Start of every key's postings, plus the end of the last ('Q')
+            postings: All postings back to back ('I')
+        """
+        self.keys = keys
+        self.slots = slots
+        self.starts = starts
+        self.postings = postings
+        self.mask = len(slots) - 1
+
+    @staticmethod
+    def encode(key) -> bytes:
+        return key.encode('utf-8')
+
+    def key_id(self, key) -> int:
+        """Id of a key, or -1 if it is not in the map"""
+        encoded = self.encode(key)
+        slots = self.slots
+        slot = zlib.crc32(encoded) & self.mask
+        while True:
+            entry = slots[slot]
+            if not entry:
+                return -1
+            if self.keys.raw(entry - 1) == encoded:
+                return entry - 1
+            slot = (slot + 1) & self.mask
+
+    def __getitem__(self, key) -> memoryview:
+        key_id = self.key_id(key)
+        if key_id < 0:
+            raise KeyError(key)
+        return self.postings[self.starts[key_id]:self.starts[key_id + 1]]
+
+    def __contains__(self, key) -> bool:
+        return self.key_id(key) >= 0
+
+    def __iter__(self) -> Iterator:
+        return iter(self.keys)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+
+class CompositeMap(PostingMap):
+    """Posting map keyed by composite key tuples"""
+
+    __slots__ = ()
+
+    @staticmethod
+    def encode(key) -> bytes:
+        return KEY_SEPARATOR.join(key).encode('utf-8')
+
+
+class MappedTable(Sequence):
+    """
+    Records read from a mapped cell table
+    Drop-in replacement for RecordTable in searching and rendering
+    """
+
+    __slots__ = ('headers', 'columns', 'cells', 'width')
+
+    def __init__(self, headers: Tuple[str, ...], cells: StringTable):
+        """
+        Args:
+            headers: Column names in sheet order
+            cells: Cell values row by row
+        """
+        self.headers = headers
+        self.columns = {header: position for position, header in enumerate(headers)}
+        self.cells = cells
+        self.width = len(headers)
+
+    def row(self, position: int) -> Tuple[str, ...]:
+        start = position * self.width
+        return tuple(self.cells[start + column] for column in range(self.width))
+
+    def column(self, name: str) -> List[str]:
+        """All values of a column in row order (empty strings if there is no such column)"""
+        position = self.columns.get(name)
+        if position is None:
+            return [''] * len(self)
+        return [self.cells[row * self.width + position] for row in range(len(self))]
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [Record(self.columns, self.row(row)) for row in range(*position.indices(len(self)))]
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError(position)
+        return Record(self.columns, self.row(position))
+
+    def __len__(self) -> int:
+        return len(self.cells) // self.width if self.width else 0
+
+
+class CardCache(LRUCache):
+    """
+    Rendered cards of a mapped snapshot, for the rows displayed recently
+
+    Stands in for the per-row card list of an in-memory snapshot:
+    cards[position] is None for a row not rendered (or evicted), so a
+    worker pays only for the cards it renders, not a slot per row.
+    """
+
+    def __missing__(self, position: int) -> None:
+        return None
+
+
+class _SectionWriter:
+    """Collects named, aligned binary sections and their offsets"""
+
+    def __init__(self):
+        self.parts: List[bytes] = []
+        self.sections: Dict[str, Tuple[int, int, str]] = {}
+        self.size = 0
+
+    def add(self, name: str, data: bytes, typecode: str = 'B') -> None:
+        padding = -self.size % ALIGNMENT
+        if padding:
+            self.parts.append(b'\0' * padding)
+            self.size += padding
+        self.sections[name] = (self.size, len(data), typecode)
+        self.parts.append(data)
+        self.size += len(data)
+
+    def add_strings(self, name: str, strings: Iterable[str]) -> None:
+        encoded = [string.encode('utf-8') for string in strings]
+        self.add(f"{name}.offsets", array('Q', accumulate(map(len, encoded), initial=0)).tobytes(), 'Q')
+        self.add(f"{name}.blob", b''.join(encoded))
+
+    def add_postings(self, name: str, keys: List[str], postings: Iterable[Iterable[int]]) -> None:
+        self.add_strings(f"{name}.keys", keys)
+
+        capacity = 8
+        while capacity < 2 * len(keys):
+            capacity *= 2
+        mask = capacity - 1
+        slots = array('I', bytes(4 * capacity))
+        for key_id, key in enumerate(keys):
+            slot = zlib.crc32(key.encode('utf-8')) & mask
+            while slots[slot]:
+                slot = (slot + 1) & mask
+            slots[slot] = key_id + 1
+        self.add(f"{name}.slots", slots.tobytes(), 'I')
+
+        flat = array('I')
+        starts = array('Q', [0])
+        for posting in postings:
+            flat.extend(posting)
+            starts.append(len(flat))
+        self.add(f"{name}.starts", starts.tobytes(), 'Q')
+        self.add(f"{name}.postings", flat.tobytes(), 'I')
+
+
+def write_shared_snapshot(snapshot: Snapshot, path: str) -> None:
+    """
+    Write a snapshot in the mapped layout
+
+    Written next to the target and renamed over it, so readers never map a
+    partial file.
+
+    Args:
+        snapshot: In-memory snapshot with its search index
+        path: Destination file path
+
+    Raises:
+        OSError: If the file can't be written
+    """
+    index = snapshot.index
+    writer = _SectionWriter()
+
+    writer.add_strings('cells', (cell for row in snapshot.rows for cell in row))
+
+    composite_keys = list(index.composite)
+    writer.add_postings(
+        'composite', [KEY_SEPARATOR.join(key) for key in composite_keys],
+        (index.composite[key] for key in composite_keys)
+    )
+    for field in FIELD_KEYS:
+        values = list(index.fields[field])
+        writer.add_postings(f"field.{field}", values, (index.fields[field][value] for value in values))
+
+    for field, fuzzy in index.fuzzy.items():
+        writer.add_strings(f"fuzzy.{field}.folded", fuzzy.folded)
+        writer.add_strings(f"fuzzy.{field}.values", (value for group in fuzzy.values for value in group))
+        writer.add(
+            f"fuzzy.{field}.groups",
+            array('Q', accumulate((len(group) for group in fuzzy.values), initial=0)).tobytes(), 'Q'
+        )
+        trigrams = list(fuzzy.postings)
+        writer.add_postings(f"fuzzy.{field}.trigrams", trigrams, (fuzzy.postings[t] for t in trigrams))
+
+    writer.add_strings('prefix.names', index.prefix.names)
+    writer.add_strings('prefix.keys', (KEY_SEPARATOR.join(key) for key in index.prefix.keys))
+
+    meta = json.dumps({
+        'search_columns': list(SEARCH_COLUMNS.values()),
+        'headers': list(snapshot.headers),
+        'fetched_at': snapshot.fetched_at,
+        'revision': snapshot.revision,
+        'build_time': index.build_time,
+        'fuzzy_fields': list(index.fuzzy),
+        'sections': writer.sections
+    }, ensure_ascii=False).encode('utf-8')
+
+    # Magic, version, metadata length, metadata, then the sections
+    head = MAGIC + FORMAT_VERSION.to_bytes(4, 'little') + len(meta).to_bytes(4, 'little') + meta
+    head += b'\0' * (-len(head) % ALIGNMENT)
+
+    target = Path(path)
+    tmp_path = target.with_name(target.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(head)
+        for part in writer.parts:
+            f.write(part)
+    os.replace(tmp_path, target)
+
+
+def open_shared_snapshot(path: str) -> Snapshot:
+    """
+    Map a file written by write_shared_snapshot
+
+    The mapping stays open as long as anything from the returned snapshot
+    is referenced; pages are shared with every other process mapping the file.
+    The per-process state is bounded instead of sized by the row count:
+    cards are kept in a CardCache, and only the last result set is kept,
+    since later pages are served by the coordinator from the returned positions.
+
+    Args:
+        path: Snapshot file path
+
+    Returns:
+        Snapshot whose data and index read from the mapping
+
+    Raises:
+        OSError: If the file can't be opened
+        ValueError: If it is not a snapshot of this format version
+    """
+    with open(path, 'rb') as f:
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    buffer = memoryview(mapping)
+
+    if bytes(buffer[:len(MAGIC)]) != MAGIC:
+        raise ValueError(f"{path} is not a shared snapshot")
+    version = int.from_bytes(buffer[len(MAGIC):len(MAGIC) + 4], 'little')
+    if version != FORMAT_VERSION:
+        raise ValueError(f"{path} has format {version}, expected {FORMAT_VERSION}")
+    meta_length = int.from_bytes(buffer[len(MAGIC) + 4:len(MAGIC) + 8], 'little')
+    meta_start = len(MAGIC) + 8
+    meta = json.loads(bytes(buffer[meta_start:meta_start + meta_length]))
+    if meta['search_columns'] != list(SEARCH_COLUMNS.values()):
+        raise ValueError(f"{path} was built for different search columns")
+    base = meta_start + meta_length
+    base += -base % ALIGNMENT
+
+    def section(name: str) -> memoryview:
+        offset, length, typecode = meta['sections'][name]
+        view = buffer[base + offset:base + offset + length]
+        return view.cast(typecode) if typecode != 'B' else view
+
+    def strings(name: str, table=StringTable) -> StringTable:
+        return table(section(f"{name}.offsets"), section(f"{name}.blob"))
+
+    def postings(name: str, posting_map=PostingMap) -> PostingMap:
+        return posting_map(
+            strings(f"{name}.keys"), section(f"{name}.slots"),
+            section(f"{name}.starts"), section(f"{name}.postings")
+        )
+
+    fuzzy = {
+        field: FuzzyFieldIndex(
+            strings(f"fuzzy.{field}.folded"),
+            GroupedStrings(section(f"fuzzy.{field}.groups"), strings(f"fuzzy.{field}.values")),
+            postings(f"fuzzy.{field}.trigrams")
+        )
+        for field in meta['fuzzy_fields']
+    }
+    index = SearchIndex(
+        postings('composite', CompositeMap),
+        {field: postings(f"field.{field}") for field in FIELD_KEYS},
+        meta['build_time'],
+        fuzzy,
+        PrefixIndex(strings('prefix.names'), strings('prefix.keys', KeyTable))
+    )
+    data = MappedTable(tuple(meta['headers']), strings('cells'))
+    return Snapshot(
+        data,
+        index,
+        fetched_at=meta['fetched_at'],
+        revision=meta['revision'],
+        cards=CardCache(maxsize=MAPPED_CARD_CACHE_SIZE),
+        result_sets=LRUCache(maxsize=1)
+    )
@@ -0,0 +1,391 @@
+"""
+Spreadsheet data sources
+One source is one tab of one spreadsheet; each keeps its own API client and last good rows
+"""
+
+import logging
+import threading
+import time
+from itertools import zip_longest
+from typing import List, Optional, Tuple
+from googleapiclient.discovery import build
+from config.settings import (
+    SEARCH_COLUMNS,
+    RESULT_COLUMNS,
+    SOURCE_COLUMN,
+    SPREADSHEET_ID,
+    SHEET_NAME,
+    SHEET_SOURCES,
+    DRIVE_CHANGE_CHECK,
+    SOURCE_FETCH_RETRIES,
+    SOURCE_RETRY_DELAY,
+    SHEETS_API_ENDPOINT,
+    DRIVE_API_ENDPOINT
+)
+from src.services.records import Row
+from src.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+API_REQUEST_SECONDS = metrics.histogram(
+    'sheets_api_request_duration_seconds', 'Google Sheets/Drive API request time', ('call',)
+)
+API_REQUEST_ERRORS = metrics.counter(
+    'sheets_api_request_errors', 'Google Sheets/Drive API requests that failed', ('call',)
+)
+SOURCE_FETCHES = metrics.counter(
+    'sheet_source_fetches', 'Source fetches by outcome', ('source', 'outcome')
+)
+
+# Only these columns are downloaded; the rest of the sheet is never transferred
+PROJECTED_COLUMNS = tuple(SEARCH_COLUMNS.values()) + tuple(RESULT_COLUMNS.values())
+
+# Columns of the merged table: projected columns plus the source tag
+MERGED_HEADERS = PROJECTED_COLUMNS + (SOURCE_COLUMN,)
+
+
+def column_letter(position: int) -> str:
+    """
+    A1 notation letter of a column
+
+    Args:
+        position: Zero-based column position
+
+    Returns:
+        Column letter(s): 0 -> 'A', 25 -> 'Z', 26 -> 'AA'
+    """
+    letters = ''
+    position += 1
+    while position:
+        position, remainder = divmod(position - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+
+def _execute(call: str, request):
+    """
+    Run an API request, recording its duration and failures
+
+    Args:
+        call: API method name for the metrics
+        request: Prepared googleapiclient request
+
+    Returns:
+        Decoded response
+    """
+    with API_REQUEST_SECONDS.labels(call).time():
+        try:
+            return request.execute()
+        except Exception:
+            API_REQUEST_ERRORS.labels(call).inc()
+            raise
+
+
+def _client_options(endpoint: str) -> Optional[dict]:
+    """API client options pointing at a non-default endpoint, if one is set"""
+    return {'api_endpoint': endpoint} if endpoint else None
+
+
+class SheetSource:
+    """
+    One tab of one spreadsheet
+
+    Every source builds its own API clients: the underlying httplib2
+    connections are not thread-safe and sources are fetched in parallel.
+    The rows of the last successful fetch are kept and served whenever a
+    later fetch fails or is too slow.
+    """
+
+    def __init__(self, spreadsheet_id: str, sheet_name: str = '', tag: str = ''):
+        """
+        Args:
+            spreadsheet_id: Spreadsheet ID from its URL
+            sheet_name: Tab name (empty means the first tab)
+            tag: Label stored in SOURCE_COLUMN of every row of this source
+        """
+        self.spreadsheet_id = spreadsheet_id
+        self.sheet_name = sheet_name
+        self.tag = tag
+        self.service = None
+        self.drive_service = None
+        # Header row of the sheet, read once and re-read when columns move
+        self._header_row: Optional[List[str]] = None
+        # Last good rows in MERGED_HEADERS order and the Drive version they came from
+        self.rows: Optional[List[Row]] = None
+        self.revision: Optional[str] = None
+        self.fetched_at = 0.0
+        self.last_error: Optional[str] = None
+        # Held while a fetch runs; a fetch that outlived its timeout keeps it
+        self._lock = threading.Lock()
+
+    @property
+    def key(self) -> str:
+        """Identity of the source in snapshot manifests"""
+        return f"{self.spreadsheet_id}/{self.sheet_name}"
+
+    @property
+    def name(self) -> str:
+        """Human-readable name for logs"""
+        return self.tag or self.sheet_name or self.spreadsheet_id
+
+    def connect(self, credentials) -> None:
+        """
+        Build the API clients of this source
+
+        Args:
+            credentials: Google service account credentials
+        """
+        self.service = build(
+            'sheets', 'v4',
+            credentials=credentials,
+            client_options=_client_options(SHEETS_API_ENDPOINT)
+        )
+        if DRIVE_CHANGE_CHECK:
+            self.drive_service = build(
+                'drive', 'v3',
+                credentials=credentials,
+                client_options=_client_options(DRIVE_API_ENDPOINT)
+            )
+
+    def seed(self, rows: List[Row], revision: Optional[str]) -> None:
+        """
+        Use rows from a saved snapshot as the last good data
+
+        Args:
+            rows: Rows of this source in MERGED_HEADERS order
+            revision: Drive version the rows came from, if known
+        """
+        self.rows = rows
+        self.revision = revision
+
+    def fetch(self, force: bool = False) -> Tuple[Optional[List[Row]], bool, bool]:
+        """
+        Fetch the rows of this source, retrying failed attempts
+
+        Args:
+            force: Download the rows and header row even if the revision is unchanged
+
+        Returns:
+            (rows, changed, ok): the rows (the last good ones if every
+            attempt failed, None if there never were any), whether they were
+            downloaded anew, and whether the sheet could be read at all
+        """
+        if not self._lock.acquire(blocking=False):
+            logger.warning("Source %s: previous fetch still running, serving last good data", self.name)
+            SOURCE_FETCHES.labels(self.name, 'busy').inc()
+            return self.rows, False, False
+
+        try:
+            for attempt in range(SOURCE_FETCH_RETRIES + 1):
+                if attempt:
+                    time.sleep(SOURCE_RETRY_DELAY * 2 ** (attempt - 1))
+                try:
+                    changed = self._fetch(force)
+                    self.last_error = None
+                    SOURCE_FETCHES.labels(self.name, 'fetched' if changed else 'unchanged').inc()
+                    return self.rows, changed, True
+                except Exception as e:
+                    self.last_error = str(e)
+                    logger.warning("Source %s: fetch attempt %s failed: %s", self.name, attempt + 1, e)
+
+            logger.error("Source %s: all fetch attempts failed, serving last good data", self.name)
+            SOURCE_FETCHES.labels(self.name, 'failed').inc()
+            return self.rows, False, False
+        finally:
+            self._lock.release()
+
+    def _fetch(self, force: bool = False) -> bool:
+        """
+        One fetch attempt; updates self.rows on success
+
+        Args:
+            force: Skip the revision check and re-read the header row
+
+        Returns:
+            True if rows were downloaded, False if the file is unchanged
+        """
+        # Cheap metadata check first: skip the download if the file is unchanged
+        revision = self._get_revision()
+        if not force and self.rows is not None and revision is not None and revision == self.revision:
+            logger.info("Source %s: revision %s unchanged, skipping download", self.name, revision)
+            self.fetched_at = time.time()
+            return False
+
+        if force or not self._header_row:
+            self._header_row = self._fetch_header_row()
+
+        columns = self._fetch_columns(self._header_row)
+        if columns is None:
+            # Columns were moved or renamed since the header row was read
+            logger.info("Source %s: columns changed, re-reading header row", self.name)
+            self._header_row = self._fetch_header_row()
+            columns = self._fetch_columns(self._header_row)
+        if not columns:
+            # Treat it as a failed attempt: retried, then the last good rows are
+            # served, rather than replacing them with an empty table
+            self._header_row = None
+            raise ValueError("none of the search columns could be read (header row empty or changing)")
+
+        # Data rows only (the header cell is dropped), in MERGED_HEADERS order
+        ordered = [columns.get(column, ())[1:] for column in PROJECTED_COLUMNS]
+        self.rows = [
+            row + (self.tag,)
+            for row in zip_longest(*ordered, fillvalue='')
+        ]
+        self.revision = revision
+        self.fetched_at = time.time()
+        logger.info("Source %s: retrieved %s rows", self.name, len(self.rows))
+        return True
+
+    def _get_revision(self) -> Optional[str]:
+        """
+        Get the Drive version of the spreadsheet file
+
+        Returns:
+            Version string or None if the check is disabled or fails
+        """
+        if not self.drive_service:
+            return None
+
+        try:
+            metadata = _execute('files.get', self.drive_service.files().get(
+                fileId=self.spreadsheet_id,
+                fields='version,modifiedTime'
+            ))
+            return metadata.get('version')
+        except Exception as e:
+            logger.warning("Source %s: could not read revision, falling back to full fetch: %s", self.name, e)
+            return None
+
+    def _sheet_range(self, a1_range: str) -> str:
+        """Qualify an A1 range with the sheet name"""
+        if not self.sheet_name:
+            return a1_range
+        quoted = self.sheet_name.replace("'", "''")
+        return f"'{quoted}'!{a1_range}"
+
+    def _fetch_header_row(self) -> List[str]:
+        """
+        Read the whole first row of the sheet (no column limit)
+
+        Returns:
+            Column names in sheet order
+        """
+        result = _execute('values.get', self.service.spreadsheets().values().get(
+            spreadsheetId=self.spreadsheet_id,
+            range=self._sheet_range('1:1'),
+            fields='values'
+        ))
+
+        header_row = result.get('values', [[]])[0]
+        logger.info("Source %s: retrieved %s column headers", self.name, len(header_row))
+        return header_row
+
+    def _column_ranges(self, header_row: List[str]) -> List[Tuple[str, List[str]]]:
+        """
+        A1 ranges covering the PROJECTED_COLUMNS, adjacent columns merged
+
+        Args:
+            header_row: Column names in sheet order
+
+        Returns:
+            (range, column names in it) pairs in sheet order
+        """
+        # If a header is duplicated, the last occurrence wins (same as RecordTable)
+        positions = {header: position for position, header in enumerate(header_row)}
+        missing = [column for column in PROJECTED_COLUMNS if column not in positions]
+        if missing:
+            logger.warning("Source %s: columns not found: %s", self.name, ', '.join(missing))
+
+        wanted = sorted(positions[column] for column in PROJECTED_COLUMNS if column in positions)
+
+        runs: List[List[int]] = []
+        for position in wanted:
+            if runs and runs[-1][-1] == position - 1:
+                runs[-1].append(position)
+            else:
+                runs.append([position])
+
+        return [
+            (
+                self._sheet_range(f"{column_letter(run[0])}:{column_letter(run[-1])}"),
+                [header_row[position] for position in run]
+            )
+            for run in runs
+        ]
+
+    def _fetch_columns(self, header_row: List[str]) -> Optional[dict]:
+        """
+        Download only the projected columns with one values.batchGet call
+
+        Columns are requested whole (header cell included) in COLUMNS major
+        dimension, so every column arrives as one compact list and trailing
+        empty cells are not sent. Formatted values are kept, so IDs such as
+        "007" read exactly as they are displayed.
+
+        Args:
+            header_row: Column names in sheet order, from _fetch_header_row
+
+        Returns:
+            Column name -> cells (header cell first), or None if the columns
+            no longer match header_row
+        """
+        ranges = self._column_ranges(header_row)
+        if not ranges:
+            return {}
+
+        result = _execute('values.batchGet', self.service.spreadsheets().values().batchGet(
+            spreadsheetId=self.spreadsheet_id,
+            ranges=[range_name for range_name, _ in ranges],
+            majorDimension='COLUMNS',
+            valueRenderOption='FORMATTED_VALUE',
+            fields='valueRanges/values'
+        ))
+
+        expected = [column for _, columns in ranges for column in columns]
+        columns = []
+        for value_range in result.get('valueRanges', []):
+            columns.extend(value_range.get('values', []))
+
+        if len(columns) != len(expected) or any(
+            not column or column[0] != name for column, name in zip(columns, expected)
+        ):
+            return None
+
+        return dict(zip(expected, columns))
+
+
+def parse_sources(spec: str) -> List[SheetSource]:
+    """
+    Parse the SHEET_SOURCES setting
+
+    Entries are separated by ';' and look like "[tag=]spreadsheet_id[/sheet name]",
+    e.g. "2024=1AbC/10 класс; 2024=1AbC/11 класс; 2023=1XyZ". The tag
+    defaults to the sheet name, or the spreadsheet ID if there is none.
+
+    Args:
+        spec: Setting value
+
+    Returns:
+        Sources in the given order
+    """
+    sources = []
+    for entry in spec.split(';'):
+        entry = entry.strip()
+        if not entry:
+            continue
+        location, _, sheet_name = entry.partition('/')
+        tag, _, spreadsheet_id = location.rpartition('=')
+        spreadsheet_id, sheet_name = spreadsheet_id.strip(), sheet_name.strip()
+        sources.append(SheetSource(spreadsheet_id, sheet_name, tag.strip() or sheet_name or spreadsheet_id))
+    return sources
+
+
+def configured_sources() -> List[SheetSource]:
+    """
+    Sources from SHEET_SOURCES, or the single SPREADSHEET_ID/SHEET_NAME source
+
+    Returns:
+        At least one source
+    """
+    return parse_sources(SHEET_SOURCES) or [SheetSource(SPREADSHEET_ID, SHEET_NAME)]
@@ -0,0 +1,177 @@
+"""
+Data snapshot
+Immutable pairing of spreadsheet records with the search index built over them
+"""
+
+import logging
+import time
+from typing import List, MutableMapping, Optional, Tuple, Union
+from cachetools import LRUCache
+from config.settings import RESULT_SETS_CACHE_SIZE
+from src.services.records import RecordTable, Row, make_rows
+from src.services.search_index import SearchIndex
+
+logger = logging.getLogger(__name__)
+
+# Above this share of changed rows a full rebuild is cheaper than patching
+INCREMENTAL_REINDEX_LIMIT = 0.5
+
+
+class Snapshot:
+    """
+    One consistent view of the spreadsheet data
+    Records and index are always replaced together, never mutated in place
+    """
+
+    __slots__ = ('data', 'index', 'fetched_at', 'revision', 'cards', 'result_sets')
+
+    def __init__(
+        self,
+        data: RecordTable,
+        index: SearchIndex,
+        fetched_at: Optional[float] = None,
+        revision: Optional[str] = None,
+        cards: Union[List[Optional[str]], MutableMapping[int, Optional[str]], None] = None,
+        result_sets: Optional[LRUCache] = None
+    ):
+        """
+        Args:
+            data: Participant records
+            index: Search index built over data
+            fetched_at: Unix timestamp of the fetch (defaults to now)
+            revision: Source revision reported by Drive, if known
+            cards: Rendered result card per row, filled on first display;
+                any container indexed by position giving None for rows not
+                rendered yet (a bounded cache for mapped snapshots)
+            result_sets: Search results by handle, for paging through them
+        """
+        self.data = data
+        self.index = index
+        self.fetched_at = fetched_at if fetched_at is not None else time.time()
+        self.revision = revision
+        self.cards = cards if cards is not None else [None] * len(data)
+        self.result_sets = result_sets if result_sets is not None else LRUCache(maxsize=RESULT_SETS_CACHE_SIZE)
+
+    @classmethod
+    def build(cls, data: RecordTable) -> 'Snapshot':
+        """
+        Create a snapshot and build its search index
+
+        Args:
+            data: Participant records
+
+        Returns:
+            New Snapshot instance
+        """
+        return cls(data, SearchIndex.build(data))
+
+    @classmethod
+    def from_values(
+        cls,
+        values: List[List[str]],
+        previous: Optional['Snapshot'] = None,
+        revision: Optional[str] = None
+    ) -> 'Snapshot':
+        """
+        Create a snapshot from raw Sheets API values
+
+        When a previous snapshot with the same headers is given, unchanged
+        rows reuse their existing tuples and only changed rows are re-indexed.
+        If nothing changed at all, the previous data and index are reused as is.
+
+        Args:
+            values: Rows as returned by the API; the first row holds headers
+            previous: Currently published snapshot, if any
+            revision: Source revision reported by Drive, if known
+
+        Returns:
+            New Snapshot instance
+        """
+        if not values:
+            return cls.build(RecordTable((), []))
+
+        # First row contains headers
+        headers = tuple(values[0])
+        rows = make_rows(headers, values[1:])
+
+        if previous is None or previous.headers != headers:
+            data = RecordTable(headers, rows)
+            return cls(data, SearchIndex.build(data), revision=revision)
+
+        old_rows = previous.rows
+        if rows == old_rows:
+            logger.info("Spreadsheet content unchanged, reusing existing index")
+            return previous.touched(revision)
+
+        changed = []
+        for position, row in enumerate(rows):
+            if position < len(old_rows) and old_rows[position] == row:
+                # Keep the old tuple so unchanged rows aren't stored twice
+                rows[position] = old_rows[position]
+            else:
+                changed.append(position)
+        # Rows removed from the end of the sheet
+        changed.extend(range(len(rows), len(old_rows)))
+
+        data = RecordTable(headers, rows)
+        if len(changed) > max(len(rows), len(old_rows)) * INCREMENTAL_REINDEX_LIMIT:
+            index = SearchIndex.build(data)
+        else:
+            index = previous.index.updated(previous.data, data, changed)
+
+        # Cards of unchanged rows stay valid
+        cards = previous.cards[:len(rows)]
+        cards.extend([None] * (len(rows) - len(cards)))
+        for position in changed:
+            if position < len(cards):
+                cards[position] = None
+
+        return cls(data, index, revision=revision, cards=cards)
+
+    @property
+    def headers(self) -> Tuple[str, ...]:
+        """Column names of the sheet"""
+        return self.data.headers
+
+    @property
+    def rows(self) -> List[Row]:
+        """Raw row tuples (used for change detection)"""
+        return self.data.rows
+
+    def touched(self, revision: Optional[str] = None) -> 'Snapshot':
+        """
+        Copy of this snapshot with a fresh timestamp, sharing data, index,
+        rendered cards and stored result sets
+
+        Args:
+            revision: New source revision (keeps the current one if None)
+
+        Returns:
+            New Snapshot instance
+        """
+        return Snapshot(
+            self.data,
+            self.index,
+            revision=revision if revision is not None else self.revision,
+            cards=self.cards,
+            result_sets=self.result_sets
+        )
+
+    def age(self) -> float:
+        """Seconds since the snapshot was fetched"""
+        return max(0.0, time.time() - self.fetched_at)
+
+    def is_stale(self, ttl: float) -> bool:
+        """
+        Check whether the snapshot is older than the given TTL
+
+        Args:
+            ttl: Time-to-live in seconds
+
+        Returns:
+            True if the snapshot should be refreshed
+        """
+        return self.age() >= ttl
+
+    def __len__(self) -> int:
+        return len(self.data)
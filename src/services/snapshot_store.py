@@ -0,0 +1,122 @@
+"""
+On-disk snapshot storage
+Persists the latest snapshot with its prebuilt index for instant cold starts
+"""
+
+import logging
+import marshal
+import os
+import time
+from pathlib import Path
+from typing import Optional
+from config.settings import SEARCH_COLUMNS
+from src.services.records import RecordTable
+from src.services.search_index import SearchIndex
+from src.services.snapshot import Snapshot
+
+logger = logging.getLogger(__name__)
+
+# File signature; bump the version whenever the stored layout changes
+MAGIC = b'ARCTSNAP'
+FORMAT_VERSION = 4
+
+
+def save_snapshot(snapshot: Snapshot, path: str) -> bool:
+    """
+    Write a snapshot to disk atomically
+
+    The file is written next to the target and renamed over it, so a crash
+    mid-write never leaves a truncated snapshot behind.
+
+    Args:
+        snapshot: Snapshot to persist
+        path: Destination file path
+
+    Returns:
+        True if the snapshot was written, False otherwise
+    """
+    started = time.perf_counter()
+    target = Path(path)
+    tmp_path = target.with_name(target.name + '.tmp')
+
+    state = {
+        'search_columns': tuple(SEARCH_COLUMNS.values()),
+        'fetched_at': snapshot.fetched_at,
+        'revision': snapshot.revision,
+        'headers': snapshot.headers,
+        'rows': snapshot.rows,
+        'index': snapshot.index.to_state()
+    }
+
+    try:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        with open(tmp_path, 'wb') as f:
+            f.write(MAGIC)
+            f.write(FORMAT_VERSION.to_bytes(2, 'little'))
+            marshal.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, target)
+    except Exception as e:
+        logger.error("Failed to save snapshot to %s: %s", target, e)
+        try:
+            tmp_path.unlink()
+        except OSError:
+            pass
+        return False
+
+    elapsed = time.perf_counter() - started
+    logger.info("Saved snapshot of %s rows to %s in %.0f ms", len(snapshot), target, elapsed * 1000)
+    return True
+
+
+def load_snapshot(path: str) -> Optional[Snapshot]:
+    """
+    Read a snapshot written by save_snapshot
+
+    Args:
+        path: Snapshot file path
+
+    Returns:
+        Snapshot or None if the file is missing, corrupt or from another version
+    """
+    started = time.perf_counter()
+
+    try:
+        with open(path, 'rb') as f:
+            payload = f.read()
+    except FileNotFoundError:
+        logger.info("No saved snapshot at %s", path)
+        return None
+    except OSError as e:
+        logger.error("Failed to read snapshot %s: %s", path, e)
+        return None
+
+    header_size = len(MAGIC) + 2
+    if payload[:len(MAGIC)] != MAGIC:
+        logger.warning("Ignoring %s: not a snapshot file", path)
+        return None
+    version = int.from_bytes(payload[len(MAGIC):header_size], 'little')
+    if version != FORMAT_VERSION:
+        logger.warning("Ignoring %s: snapshot format %s, expected %s", path, version, FORMAT_VERSION)
+        return None
+
+    try:
+        state = marshal.loads(memoryview(payload)[header_size:])
+        if state['search_columns'] != tuple(SEARCH_COLUMNS.values()):
+            logger.warning("Ignoring %s: index was built for different search columns", path)
+            return None
+        data = RecordTable(tuple(state['headers']), state['rows'])
+        snapshot = Snapshot(
+            data,
+            SearchIndex.from_state(state['index']),
+            fetched_at=state['fetched_at'],
+            revision=state['revision']
+        )
+    except Exception as e:
+        logger.warning("Ignoring corrupt snapshot %s: %s", path, e)
+        return None
+
+    elapsed = time.perf_counter() - started
+    logger.info("Loaded snapshot of %s rows from %s in %.0f ms", len(snapshot), path, elapsed * 1000)
+    return snapshot
@@ -3,17 +3,131 @@ Logging configuration for the Telegram bot
 Sets up file and console logging with appropriate formatting
 """
 
+import atexit
+import json
 import logging
+import queue
+import random
 import sys
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
-from config.settings import LOG_LEVEL, LOG_FILE
+from typing import Optional
+from config.settings import (
+    LOG_LEVEL,
+    LOG_FILE,
+    LOG_QUEUE_SIZE,
+    LOG_MAX_BYTES,
+    LOG_BACKUP_COUNT,
+    LOG_FORMAT,
+    LOG_SAMPLE_RATE
+)
+from src.utils.metrics import metrics
+
+# Attributes every LogRecord has; anything else was passed with extra=
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+# Background thread writing queued records to the handlers
+_listener: Optional[QueueListener] = None
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Queue handler for the in-process listener
+    
+    Records are queued as they are: the message is formatted later in the
+    listener thread, not by the caller. When the queue is full, INFO and
+    DEBUG records are dropped instead of blocking; warnings and errors
+    wait for room.
+    """
+    
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+    
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if record.levelno >= logging.WARNING:
+                self.queue.put(record)
+            else:
+                self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """One compact JSON object per record: time, level, logger, message, extras"""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': f"{self.formatTime(record, '%Y-%m-%dT%H:%M:%S')}.{int(record.msecs):03d}",
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str, separators=(',', ':'))
+
+
+class SampledLogger(logging.LoggerAdapter):
+    """
+    Logger for messages written on every request
+    
+    INFO and DEBUG calls pass only for a random share of calls, decided
+    before the record is created; warnings and errors always pass.
+    Arguments are still evaluated by the caller, so keep them cheap.
+    """
+    
+    def __init__(self, logger: logging.Logger, rate: float):
+        """
+        Args:
+            logger: Underlying logger
+            rate: Share of INFO/DEBUG calls that are written (1 writes all)
+        """
+        super().__init__(logger, {'sample_rate': rate} if rate < 1 else {})
+        self.rate = rate
+    
+    def isEnabledFor(self, level: int) -> bool:
+        if not self.logger.isEnabledFor(level):
+            return False
+        return level >= logging.WARNING or self.rate >= 1 or random.random() < self.rate
+    
+    def process(self, msg, kwargs):
+        if self.extra:
+            kwargs['extra'] = {**self.extra, **kwargs.get('extra', {})}
+        return msg, kwargs
+
+
+def get_sampled_logger(name: str) -> SampledLogger:
+    """
+    Get a logger for per-request messages, sampled at LOG_SAMPLE_RATE
+    
+    Args:
+        name: Name for the logger (usually __name__)
+    
+    Returns:
+        Sampling logger adapter
+    """
+    return SampledLogger(logging.getLogger(name), LOG_SAMPLE_RATE)
 
 
 def setup_logger():
     """
     Configure logging for the application
-    Sets up both file and console handlers with formatting
+    
+    Records are put on a bounded queue and written to the rotating log file
+    and stdout by a background thread, so a slow disk never blocks the
+    event loop. The thread is stopped (and the queue flushed) at exit.
     """
+    global _listener
     
     # Create logs directory if it doesn't exist
     log_path = Path(LOG_FILE)
@@ -25,28 +139,47 @@ def setup_logger():
     
     # Clear existing handlers to avoid duplicates
     root_logger.handlers.clear()
+    if _listener is not None:
+        atexit.unregister(_listener.stop)
+        _listener.stop()
     
     # Create formatters
-    detailed_formatter = logging.Formatter(
-        fmt='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
+    if LOG_FORMAT == 'json':
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(
+            fmt='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+            datefmt='%Y-%m-%d %H:%M:%S'
+        )
     
-    simple_formatter = logging.Formatter(
-        fmt='%(levelname)s: %(message)s'
+    # File handler - detailed logs, rotated by size
+    file_handler = RotatingFileHandler(
+        LOG_FILE,
+        maxBytes=LOG_MAX_BYTES,
+        backupCount=LOG_BACKUP_COUNT,
+        encoding='utf-8'
     )
-    
-    # File handler - detailed logs
-    file_handler = logging.FileHandler(LOG_FILE, encoding='utf-8')
     file_handler.setLevel(logging.DEBUG)
-    file_handler.setFormatter(detailed_formatter)
-    root_logger.addHandler(file_handler)
+    file_handler.setFormatter(formatter)
     
-    # Console handler - simplified output
+    # Console handler
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setLevel(getattr(logging, LOG_LEVEL.upper(), logging.INFO))
-    console_handler.setFormatter(detailed_formatter)
-    root_logger.addHandler(console_handler)
+    console_handler.setFormatter(formatter)
+    
+    # Callers only enqueue; the listener thread formats and writes
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    queue_handler = DroppingQueueHandler(log_queue)
+    root_logger.addHandler(queue_handler)
+    _listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    
+    if metrics.get('log_records_dropped') is None:
+        metrics.counter_function(
+            'log_records_dropped', 'Log records dropped because the log queue was full',
+            lambda: sum(getattr(handler, 'dropped', 0) for handler in logging.getLogger().handlers)
+        )
     
     # Suppress overly verbose third-party loggers
     logging.getLogger('httpx').setLevel(logging.WARNING)
@@ -54,8 +187,8 @@ def setup_logger():
     logging.getLogger('telegram').setLevel(logging.INFO)
     
     logging.info("Logging system initialized")
-    logging.info(f"Log file: {LOG_FILE}")
-    logging.info(f"Log level: {LOG_LEVEL}")
+    logging.info("Log file: %s", LOG_FILE)
+    logging.info("Log level: %s", LOG_LEVEL)
 
 
 def get_logger(name: str) -> logging.Logger:
@@ -64,7 +197,7 @@ def get_logger(name: str) -> logging.Logger:
     
     Args:
         name: Name for the logger (usually __name__)
-        
+    
     Returns:
         Configured logger instance
     """
@@ -0,0 +1,100 @@
+"""
+Memory usage helpers
+Process resident size and approximate deep size of in-memory data
+"""
+
+import itertools
+import resource
+import sys
+from typing import Any, Optional
+from cachetools import Cache
+
+# Elements of a container measured before extrapolating from the ones seen
+SAMPLE_SIZE = 200
+
+# Objects without references worth following
+_LEAF_TYPES = (str, bytes, bytearray, int, float, complex, bool, type(None), range, type)
+
+# Containers filled by lookups while the data is in use (e.g. the prefix
+# index cache). Walking them from another thread could see them change size
+# mid-iteration, so only the container itself is counted; their contents are
+# bounded by maxsize and are not part of the data
+_MUTABLE_CACHE_TYPES = (Cache,)
+
+
+def process_rss() -> Optional[int]:
+    """
+    Current resident set size of this process in bytes
+
+    Returns:
+        Bytes, or the peak size if the current one can't be read, None if neither can
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize()
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    except (OSError, ValueError):
+        return None
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _children(obj: Any) -> tuple:
+    """(references, number of references) of an object; a lazy iterable for big containers"""
+    if isinstance(obj, dict):
+        return itertools.chain.from_iterable(obj.items()), 2 * len(obj)
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return obj, len(obj)
+    references = []
+    if hasattr(obj, '__dict__'):
+        references.append(vars(obj))
+    for cls in type(obj).__mro__:
+        for name in getattr(cls, '__slots__', ()):
+            if name != '__dict__' and hasattr(obj, name):
+                references.append(getattr(obj, name))
+    return references, len(references)
+
+
+def deep_size(obj: Any, sample_size: int = SAMPLE_SIZE) -> int:
+    """
+    Approximate number of bytes held by an object and everything it references
+
+    Containers with more than sample_size elements are estimated from
+    their first sample_size elements, so the cost stays small for
+    millions of rows. Objects shared between containers (such as strings
+    stored both in rows and in index keys) are counted in each of them,
+    which makes the result an upper bound. Contents of lookup caches
+    (_MUTABLE_CACHE_TYPES) are not included, so the walk is safe to run in
+    a thread while the event loop keeps serving searches.
+
+    Args:
+        obj: Root object
+        sample_size: Elements measured per container
+
+    Returns:
+        Estimated size in bytes
+    """
+    seen = set()
+
+    def size_of(item: Any) -> int:
+        if id(item) in seen:
+            return 0
+        seen.add(id(item))
+        size = sys.getsizeof(item, 0)
+        if isinstance(item, _LEAF_TYPES + _MUTABLE_CACHE_TYPES):
+            return size
+
+        references, count = _children(item)
+        measured = 0
+        total = 0
+        for reference in itertools.islice(references, sample_size):
+            total += size_of(reference)
+            measured += 1
+        if measured and count > measured:
+            total = total * count // measured
+        return size + total
+
+    return size_of(obj)
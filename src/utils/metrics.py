@@ -0,0 +1,501 @@
+"""
+Application metrics
+Counters and histograms exposed in Prometheus text format and as JSON
+"""
+
+import abc
+import bisect
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds; covers index lookups (sub-millisecond) up to sheet fetches
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+
+def _escape(value: str) -> str:
+    """Escape a label value for the text exposition format"""
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _label_text(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    """Render {name="value",...}, or an empty string without labels"""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value: float) -> str:
+    """Render a sample value"""
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _CounterChild:
+    """Counter value for one label set"""
+
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class _HistogramChild:
+    """Bucket counts, sum and count for one label set"""
+
+    __slots__ = ('bounds', 'counts', 'sum', 'count', '_lock')
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        # Non-cumulative; the last slot is the +Inf bucket
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        slot = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[slot] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self) -> '_Timer':
+        """Context manager observing the time spent inside it"""
+        return _Timer(self)
+
+    def quantile(self, share: float) -> float:
+        """
+        Estimate a quantile by linear interpolation within its bucket
+
+        Args:
+            share: Quantile between 0 and 1
+
+        Returns:
+            Estimated value (the largest finite bound if it falls in +Inf, 0 if empty)
+        """
+        with self._lock:
+            counts = list(self.counts)
+            total = self.count
+        if not total:
+            return 0.0
+
+        rank = share * total
+        seen = 0
+        for slot, count in enumerate(counts):
+            if seen + count >= rank and count:
+                if slot == len(self.bounds):
+                    return self.bounds[-1]
+                lower = self.bounds[slot - 1] if slot else 0.0
+                return lower + (self.bounds[slot] - lower) * (rank - seen) / count
+            seen += count
+        return self.bounds[-1]
+
+
+class _Timer:
+    """Observes elapsed time into a histogram child on exit"""
+
+    __slots__ = ('_child', '_started')
+
+    def __init__(self, child: _HistogramChild):
+        self._child = child
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *_):
+        self._child.observe(time.perf_counter() - self._started)
+
+
+class Metric(abc.ABC):
+    """
+    Metric family with optional labels
+
+    Children are created on first use of a label set and kept; hot paths
+    should resolve labels() once and keep the child.
+    """
+
+    type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        """
+        Args:
+            name: Metric name (snake_case, with unit suffix)
+            documentation: One-line help text
+            labelnames: Label names, values are given to labels()
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self.labels()
+
+    @abc.abstractmethod
+    def _new_child(self):
+        """Value holder for one label set"""
+
+    def labels(self, *values: str):
+        """Child for a label set (created on first use)"""
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {key}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def children(self) -> List[Tuple[Tuple[str, ...], Any]]:
+        with self._lock:
+            return list(self._children.items())
+
+    @property
+    def exposed_name(self) -> str:
+        """Name in the text format; counters carry the _total suffix"""
+        return f"{self.name}_total" if self.type == 'counter' else self.name
+
+    @abc.abstractmethod
+    def samples(self) -> List[Tuple[str, str, float]]:
+        """(suffix, label text, value) triples for the text format"""
+
+    @abc.abstractmethod
+    def to_dict(self) -> Any:
+        """JSON-friendly value for /metrics.json and the dump file"""
+
+
+class Counter(Metric):
+    """Monotonically increasing count"""
+
+    type = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1) -> None:
+        """Increase the unlabelled counter"""
+        self._default.inc(amount)
+
+    def samples(self):
+        return [
+            ('', _label_text(self.labelnames, key), child.value)
+            for key, child in self.children()
+        ]
+
+    def to_dict(self):
+        if not self.labelnames:
+            return self._default.value
+        return {','.join(key): child.value for key, child in self.children()}
+
+
+class Histogram(Metric):
+    """Distribution of observed values in fixed buckets"""
+
+    type = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        """
+        Args:
+            name: Metric name (snake_case, with unit suffix)
+            documentation: One-line help text
+            labelnames: Label names, values are given to labels()
+            buckets: Increasing upper bounds (+Inf is implied)
+        """
+        self.bounds = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.bounds)
+
+    def observe(self, value: float) -> None:
+        """Record a value in the unlabelled histogram"""
+        self._default.observe(value)
+
+    def time(self) -> _Timer:
+        """Context manager timing a block into the unlabelled histogram"""
+        return self._default.time()
+
+    def samples(self):
+        samples = []
+        for key, child in self.children():
+            cumulative = 0
+            for bound, count in zip(self.bounds + (float('inf'),), child.counts):
+                cumulative += count
+                samples.append(
+                    ('_bucket', _label_text(self.labelnames, key, f'le="{_number(bound)}"'), cumulative)
+                )
+            samples.append(('_sum', _label_text(self.labelnames, key), child.sum))
+            samples.append(('_count', _label_text(self.labelnames, key), child.count))
+        return samples
+
+    def to_dict(self):
+        summaries = {
+            ','.join(key): {
+                'count': child.count,
+                'sum': child.sum,
+                'p50': child.quantile(0.50),
+                'p95': child.quantile(0.95),
+                'p99': child.quantile(0.99)
+            }
+            for key, child in self.children()
+        }
+        if not self.labelnames:
+            return summaries.get('', {})
+        return summaries
+
+
+class CallbackMetric(Metric):
+    """
+    Value read from a function when the metrics are collected
+
+    For state that already lives elsewhere (queue lengths, cache counters,
+    snapshot age), so nothing is recorded on the hot path.
+    """
+
+    def __init__(self, name: str, documentation: str, function: Callable[[], float], type: str = 'gauge'):
+        """
+        Args:
+            name: Metric name
+            documentation: One-line help text
+            function: Returns the current value
+            type: 'gauge', or 'counter' for values that only grow
+        """
+        self.function = function
+        self.type = type
+        super().__init__(name, documentation)
+
+    def _new_child(self):
+        return None
+
+    def _value(self) -> Optional[float]:
+        try:
+            return self.function()
+        except Exception as e:
+            logger.debug("Metric %s unavailable: %s", self.name, e)
+            return None
+
+    def samples(self):
+        value = self._value()
+        if value is None:
+            return []
+        return [('', '', value)]
+
+    def to_dict(self):
+        return self._value()
+
+
+class MetricsRegistry:
+    """Named metrics of the process"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: Metric) -> Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        """Register a counter (name without the _total suffix)"""
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        """Register a histogram"""
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name: str, documentation: str, function: Callable[[], float]) -> CallbackMetric:
+        """Register a gauge read from function() at collection time"""
+        return self._register(CallbackMetric(name, documentation, function))
+
+    def counter_function(self, name: str, documentation: str, function: Callable[[], float]) -> CallbackMetric:
+        """Register a counter read from function() at collection time (name without _total)"""
+        return self._register(CallbackMetric(name, documentation, function, type='counter'))
+
+    def metrics(self) -> List[Metric]:
+        with self._lock:
+            return list(self._metrics.values())
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """All metrics in Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for metric in self.metrics():
+            name = metric.exposed_name
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.type}")
+            for suffix, labels, value in metric.samples():
+                lines.append(f"{name}{suffix}{labels} {_number(value)}")
+        return '\n'.join(lines) + '\n'
+
+    def to_dict(self) -> Dict[str, Any]:
+        """All metrics as plain values; histograms as count, sum and estimated quantiles"""
+        return {metric.name: metric.to_dict() for metric in self.metrics()}
+
+
+def timed(histogram: Histogram, errors: Optional[Counter] = None):
+    """
+    Decorator recording the duration (and failures) of an async function
+
+    Each decorated function gets its own label set, named after the function.
+
+    Args:
+        histogram: Histogram with one label (the function name)
+        errors: Counter with the same label, increased when the function raises
+    """
+    def decorator(function):
+        duration = histogram.labels(function.__name__)
+        failures = errors.labels(function.__name__) if errors is not None else None
+
+        @functools.wraps(function)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await function(*args, **kwargs)
+            except Exception:
+                if failures is not None:
+                    failures.inc()
+                raise
+            finally:
+                duration.observe(time.perf_counter() - started)
+
+        return wrapper
+
+    return decorator
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    """Serves GET /metrics (text format) and GET /metrics.json"""
+
+    registry: 'MetricsRegistry'
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if path == '/metrics':
+            body = self.registry.render().encode()
+            content_type = 'text/plain; version=0.0.4; charset=utf-8'
+        elif path == '/metrics.json':
+            body = json.dumps(self.registry.to_dict(), ensure_ascii=False).encode()
+            content_type = 'application/json'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes every few seconds would flood the log
+        pass
+
+
+def start_metrics_server(registry: MetricsRegistry, listen: str, port: int) -> Optional[ThreadingHTTPServer]:
+    """
+    Serve the metrics over HTTP from a daemon thread
+
+    Runs apart from the event loop, so a scrape never delays an update.
+
+    Args:
+        registry: Metrics to serve
+        listen: Address to bind
+        port: Port to bind
+
+    Returns:
+        The running server, or None if the port could not be bound
+    """
+    handler = type('MetricsRequestHandler', (_MetricsRequestHandler,), {'registry': registry})
+    try:
+        server = ThreadingHTTPServer((listen, port), handler)
+    except OSError as e:
+        logger.error("Metrics endpoint not started on %s:%s: %s", listen, port, e)
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    logger.info("Metrics available at http://%s:%s/metrics", listen, port)
+    return server
+
+
+class MetricsDumper:
+    """Writes the metrics as JSON to a file at a fixed interval"""
+
+    def __init__(self, registry: MetricsRegistry, path: str, interval: float):
+        """
+        Args:
+            registry: Metrics to dump
+            path: JSON file, replaced atomically on every dump
+            interval: Seconds between dumps
+        """
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name='metrics-dump', daemon=True)
+        self._thread.start()
+        logger.info("Dumping metrics to %s every %gs", self.path, self.interval)
+
+    def stop(self) -> None:
+        """Stop and write a final dump"""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def dump(self) -> None:
+        payload = {'timestamp': time.time(), 'metrics': self.registry.to_dict()}
+        temporary = f"{self.path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(temporary, 'w', encoding='utf-8') as f:
+                json.dump(payload, f, ensure_ascii=False)
+            os.replace(temporary, self.path)
+        except OSError as e:
+            logger.warning("Could not write metrics to %s: %s", self.path, e)
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self.dump()
+        self.dump()
+
+
+# Create a singleton instance
+metrics = MetricsRegistry()
@@ -0,0 +1,171 @@
+"""
+On-demand stack sampling profiler
+Samples the event loop thread while a given number of updates is handled
+and renders the result as collapsed stacks (flamegraph.pl / speedscope input)
+"""
+
+import asyncio
+import collections
+import logging
+import sys
+import threading
+import time
+from typing import Counter, Optional
+from config.settings import PROFILE_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# Worker threads of asyncio.to_thread / run_in_executor are named asyncio_0, asyncio_1, ...
+EXECUTOR_THREAD_PREFIX = 'asyncio_'
+
+
+def _collapse(frame) -> str:
+    """Stack of a frame, outermost call first, as "module:function;module:function;..." """
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        module = frame.f_globals.get('__name__', code.co_filename)
+        names.append(f"{module}:{code.co_name}")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class StackSampler:
+    """
+    Background thread recording the stacks of the event loop thread
+
+    A sample is taken every `interval` seconds from the event loop thread
+    and from the executor threads running to_thread() work (sheet fetches,
+    bulk lookups), each stack prefixed with its thread name. Waiting in the
+    selector shows up as samples too, which makes idle time visible next to
+    the busy time. Unlike cProfile, handlers and the event loop run at full
+    speed; the cost is one sys._current_frames() call per interval.
+    """
+
+    def __init__(self, thread_id: int, interval: float = PROFILE_INTERVAL):
+        """
+        Args:
+            thread_id: Identifier of the event loop thread
+            interval: Seconds between samples
+        """
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter[str] = collections.Counter()
+        self.samples = 0
+        self.elapsed = 0.0
+        self._started_at = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+            self.elapsed = time.monotonic() - self._started_at
+
+    def collapsed(self) -> str:
+        """Samples in collapsed stack format: one "stack count" line per distinct stack"""
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                name = names.get(thread_id, '')
+                if thread_id == self.thread_id or name.startswith(EXECUTOR_THREAD_PREFIX):
+                    self.stacks[f"{name};{_collapse(frame)}"] += 1
+            self.samples += 1
+
+
+class ProfileRun:
+    """Updates still to profile and in flight for one /profile request"""
+
+    def __init__(self, updates: int, sampler: StackSampler):
+        self.to_admit = updates
+        self.in_flight = 0
+        self.sampler = sampler
+        self.done = asyncio.Event()
+
+    def update_done(self) -> None:
+        """A profiled update finished"""
+        self.in_flight -= 1
+        if not self.to_admit and not self.in_flight:
+            self.done.set()
+
+
+class UpdateProfiler:
+    """
+    Profiles the event loop for the duration of the next N updates
+
+    The update processor asks admit() whether a starting update counts
+    towards the profile and calls update_done() on the returned run when
+    the update finishes; the profile ends when N counted updates have
+    finished (or on timeout). Only one profile runs at a time.
+    """
+
+    def __init__(self):
+        self._run: Optional[ProfileRun] = None
+
+    @property
+    def active(self) -> bool:
+        return self._run is not None
+
+    def start(self, updates: int) -> None:
+        """
+        Start sampling; must be called from the event loop thread
+
+        Args:
+            updates: Updates to profile, counting from the next one that starts
+        """
+        if self.active:
+            raise RuntimeError("A profile is already running")
+        sampler = StackSampler(threading.get_ident())
+        self._run = ProfileRun(updates, sampler)
+        sampler.start()
+        logger.info("Profiling the next %s updates", updates)
+
+    def admit(self) -> Optional[ProfileRun]:
+        """
+        Count a starting update towards the running profile
+
+        Returns:
+            The run if the update is profiled (call its update_done() when
+            the update finishes), otherwise None
+        """
+        run = self._run
+        if run is None or not run.to_admit:
+            return None
+        run.to_admit -= 1
+        run.in_flight += 1
+        return run
+
+    async def wait(self, timeout: float) -> StackSampler:
+        """
+        Wait until the profiled updates finished (or timeout) and stop sampling
+
+        Args:
+            timeout: Longest time to wait in seconds
+
+        Returns:
+            Stopped sampler holding the samples
+        """
+        run = self._run
+        try:
+            await asyncio.wait_for(run.done.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Profile timed out after %.0fs with %s updates not started", timeout, run.to_admit)
+        finally:
+            self._run = None
+            run.sampler.stop()
+        logger.info("Profile finished: %s samples in %.1fs", run.sampler.samples, run.sampler.elapsed)
+        return run.sampler
+
+
+# Create a singleton instance
+profiler = UpdateProfiler()
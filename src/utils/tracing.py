@@ -0,0 +1,143 @@
+"""
+Per-update tracing
+Times the phases of handling one update and logs updates that were slow
+"""
+
+import contextvars
+import logging
+import time
+from typing import Dict, Optional
+from telegram import Update
+from src.utils.metrics import metrics
+from config.settings import SLOW_UPDATE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+SPAN_SECONDS = metrics.histogram(
+    'bot_update_span_duration_seconds', 'Time spent in one phase of handling an update', ('span',)
+)
+
+# Trace of the update handled by the current task
+_current: contextvars.ContextVar[Optional['Trace']] = contextvars.ContextVar('trace', default=None)
+
+
+class Trace:
+    """
+    Phase timings of one update
+
+    Spans with the same name add up, so e.g. every message sent while
+    handling the update counts towards "send".
+    """
+
+    __slots__ = ('update', 'started', 'spans')
+
+    def __init__(self, update: object):
+        """
+        Args:
+            update: Update being handled
+        """
+        self.update = update
+        self.started = time.perf_counter()
+        self.spans: Dict[str, float] = {}
+
+    def add(self, name: str, seconds: float) -> None:
+        """Count time spent in a phase"""
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+        SPAN_SECONDS.labels(name).observe(seconds)
+
+    def describe(self) -> str:
+        """Short description of the update for the log: kind, user and payload"""
+        update = self.update
+        if not isinstance(update, Update):
+            return type(update).__name__
+        user_id = update.effective_user.id if update.effective_user else None
+        if update.callback_query is not None:
+            return f"callback {update.callback_query.data!r} from user {user_id}"
+        if update.inline_query is not None:
+            return f"inline query from user {user_id}"
+        message = update.effective_message
+        if message is not None and message.document is not None:
+            return f"document from user {user_id}"
+        if message is not None and message.text and message.text.startswith('/'):
+            return f"command {message.text.split()[0]} from user {user_id}"
+        return f"message from user {user_id}"
+
+
+class _Span:
+    """Adds the time spent inside it to the current trace on exit"""
+
+    __slots__ = ('name', '_started')
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *_):
+        trace = _current.get()
+        if trace is not None:
+            trace.add(self.name, time.perf_counter() - self._started)
+
+
+def span(name: str) -> _Span:
+    """
+    Context manager timing a phase of the current update
+
+    Without a current trace (code running outside update handling) it only
+    costs two clock reads.
+
+    Example:
+        with span('search'):
+            positions = index.lookup_fields(criteria)
+
+    Args:
+        name: Phase name, e.g. 'snapshot', 'search', 'render', 'send'
+    """
+    return _Span(name)
+
+
+def start_trace(update: object) -> Trace:
+    """
+    Start tracing an update in the current task
+
+    Call from the task that runs the update's handlers; tasks created by
+    them inherit the trace.
+
+    Args:
+        update: Update being handled
+
+    Returns:
+        New trace, current until the task ends
+    """
+    trace = Trace(update)
+    _current.set(trace)
+    return trace
+
+
+def finish_trace(trace: Trace) -> float:
+    """
+    Stop tracing an update and log it if it was slow
+
+    Args:
+        trace: Trace returned by start_trace
+
+    Returns:
+        Seconds since the update was admitted
+    """
+    total = time.perf_counter() - trace.started
+    if SLOW_UPDATE_SECONDS and total >= SLOW_UPDATE_SECONDS:
+        phases = ' '.join(f"{name}={seconds * 1000:.0f}ms" for name, seconds in trace.spans.items())
+        logger.warning(
+            "Slow update: %s took %.0fms (%s)", trace.describe(), total * 1000, phases or 'no spans',
+            extra={'duration_ms': round(total * 1000, 1), 'spans_ms': {
+                name: round(seconds * 1000, 1) for name, seconds in trace.spans.items()
+            }}
+        )
+    return total
+
+
+def current_trace() -> Optional[Trace]:
+    """Trace of the update handled by the current task, if any"""
+    return _current.get()
@@ -0,0 +1,25 @@
+"""
+Shared fixtures
+config.settings requires BOT_TOKEN, so a dummy one is set before any
+module under test is imported
+"""
+
+import os
+
+os.environ.setdefault('BOT_TOKEN', 'test-token')
+
+import pytest  # noqa: E402
+from benchmarks.synthetic import generate_values  # noqa: E402
+from src.services.snapshot import Snapshot  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def values():
+    """Synthetic sheet in Sheets API format, header row first"""
+    return generate_values(3000, seed=7)
+
+
+@pytest.fixture(scope='session')
+def snapshot(values):
+    """Snapshot built from the synthetic sheet"""
+    return Snapshot.from_values(values)
@@ -0,0 +1,33 @@
+"""Tests for typo-tolerant matching"""
+
+from src.services.fuzzy_index import FuzzyFieldIndex, fold, edit_distance
+
+
+def test_fold_treats_yo_as_ye():
+    assert fold('алёна') == 'алена'
+    assert fold('фёдоров') == fold('федоров')
+
+
+def test_fold_ignores_spaces_and_hyphens():
+    assert fold('10 а') == '10а'
+    assert fold('римский-корсаков') == 'римскийкорсаков'
+
+
+def test_fold_keeps_other_letters():
+    assert fold('иванов') == 'иванов'
+    assert fold('') == ''
+
+
+def test_edit_distance():
+    assert edit_distance('иванов', 'иванов', 2) == 0
+    assert edit_distance('иванов', 'ивонов', 2) == 1
+    assert edit_distance('иванов', 'иавнов', 2) == 1  # swapped letters
+    assert edit_distance('иванов', 'петров', 2) > 2
+
+
+def test_match_finds_yo_spelling_and_typos():
+    index = FuzzyFieldIndex.build(['фёдоров', 'федотов', 'иванов', 'алёна'])
+    assert ('фёдоров', 0) in index.match('федоров')
+    assert ('алёна', 0) in index.match('алена')
+    assert index.match('ивонов')[0] == ('иванов', 1)
+    assert index.match('') == []
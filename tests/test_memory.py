@@ -0,0 +1,24 @@
+"""Tests for the memory usage helpers"""
+
+import sys
+from cachetools import LRUCache
+from src.utils.memory import deep_size
+
+
+def test_counts_nested_containers():
+    inner = ['x' * 1000]
+    assert deep_size([inner]) >= sys.getsizeof('x' * 1000)
+
+
+def test_skips_cache_contents():
+    cache = LRUCache(maxsize=100)
+    empty = deep_size({'cache': cache})
+    for i in range(100):
+        cache[i] = 'y' * 1000
+    assert deep_size({'cache': cache}) == empty
+
+
+def test_index_walk_ignores_prefix_cache(snapshot):
+    before = deep_size(snapshot.index)
+    snapshot.index.complete('Ив', 10)
+    assert deep_size(snapshot.index) == before
@@ -0,0 +1,44 @@
+"""Tests for per-chat pacing of the outbound scheduler"""
+
+import asyncio
+import time
+from src.bot.outbound import OutboundScheduler
+
+INTERVAL = 0.2
+
+
+def send_times(chat_burst: int, count: int, idle: float = 0.0):
+    """Start times of `count` requests queued at once to one chat, after an optional idle period"""
+    async def run():
+        scheduler = OutboundScheduler(global_rate=1000, chat_interval=INTERVAL, chat_burst=chat_burst)
+        started = time.monotonic()
+
+        async def request():
+            return time.monotonic() - started
+
+        times = await asyncio.gather(*(scheduler.send(1, request) for _ in range(count)))
+        if idle:
+            await asyncio.sleep(idle)
+            started = time.monotonic()
+            times = await asyncio.gather(*(scheduler.send(1, request) for _ in range(count)))
+        await scheduler.stop()
+        return times
+
+    return asyncio.run(run())
+
+
+def test_quiet_chat_gets_burst():
+    times = send_times(chat_burst=2, count=4)
+    assert times[1] < INTERVAL / 2
+    assert times[2] >= INTERVAL * 0.9
+    assert times[3] >= INTERVAL * 1.9
+
+
+def test_burst_refills_after_idle():
+    times = send_times(chat_burst=2, count=2, idle=INTERVAL * 2.5)
+    assert times[1] < INTERVAL / 2
+
+
+def test_no_burst():
+    times = send_times(chat_burst=1, count=2)
+    assert times[1] >= INTERVAL * 0.9
@@ -0,0 +1,93 @@
+"""Tests for the exact, per-field and incremental search index"""
+
+import random
+import pytest
+from config.settings import SEARCH_COLUMNS
+from src.services.records import RecordTable, make_rows
+from src.services.search_index import SearchIndex, FIELD_KEYS, FUZZY_FIELD_KEYS, intersect_postings
+
+
+@pytest.mark.parametrize('postings, expected', [
+    ([], []),
+    ([[1, 2, 3]], [1, 2, 3]),
+    ([[1, 3, 5, 7], [3, 4, 5, 6, 7]], [3, 5, 7]),
+    ([[1, 2, 3], [4, 5, 6]], []),
+    ([[0, 10, 20, 30], [10, 30], [5, 10, 15, 30, 45]], [10, 30]),
+    ([[2, 4], []], []),
+])
+def test_intersect_postings(postings, expected):
+    assert intersect_postings(postings) == expected
+
+
+def test_intersect_postings_matches_set_intersection():
+    rng = random.Random(1)
+    for _ in range(200):
+        postings = [sorted(rng.sample(range(300), rng.randint(0, 120))) for _ in range(rng.randint(1, 4))]
+        expected = sorted(set(postings[0]).intersection(*postings[1:]))
+        assert intersect_postings(postings) == expected
+
+
+def test_intersect_postings_leaves_input_unchanged():
+    postings = [[1, 2, 3], [2, 3]]
+    intersect_postings(postings)
+    assert postings == [[1, 2, 3], [2, 3]]
+
+
+def _table(values):
+    headers = tuple(values[0])
+    return RecordTable(headers, make_rows(headers, values[1:]))
+
+
+def _criteria(record, fields):
+    return {field: record[SEARCH_COLUMNS[field]] for field in fields}
+
+
+def test_updated_matches_full_rebuild(values):
+    old_values = values[:801]
+    new_values = [list(row) for row in old_values]
+    new_values[3][0] = 'Новиков'  # surname changed
+    new_values[10][3] = '9Б'  # class changed
+    new_values[11] = list(new_values[12])  # duplicate of another row
+    del new_values[20]  # every later row shifts up
+    new_values.append(['Ёжикова', 'Алёна', 'Петровна', '5А', '999999', 'Химия'])
+
+    old_data, new_data = _table(old_values), _table(new_values)
+    changed = [
+        position for position in range(max(len(old_data), len(new_data)))
+        if position >= len(old_data) or position >= len(new_data)
+        or tuple(old_data[position].values()) != tuple(new_data[position].values())
+    ]
+
+    old_index = SearchIndex.build(old_data)
+    updated = old_index.updated(old_data, new_data, changed)
+    rebuilt = SearchIndex.build(new_data)
+
+    assert updated.composite == rebuilt.composite
+    assert updated.fields == rebuilt.fields
+    assert updated.prefix.to_state() == rebuilt.prefix.to_state()
+    for field in FUZZY_FIELD_KEYS:
+        for value in ['новиков', 'ежикова', 'алена', 'иванов', 'петровна']:
+            assert sorted(updated.fuzzy[field].match(value)) == sorted(rebuilt.fuzzy[field].match(value))
+
+    rng = random.Random(3)
+    for _ in range(200):
+        record = new_data[rng.randrange(len(new_data))]
+        criteria = _criteria(record, rng.sample(FIELD_KEYS, rng.randint(1, len(FIELD_KEYS))))
+        assert updated.lookup_fields(criteria) == rebuilt.lookup_fields(criteria)
+
+    # The old index still describes the old data
+    assert old_index.fields == SearchIndex.build(old_data).fields
+
+
+def test_state_round_trip(snapshot):
+    index = snapshot.index
+    restored = SearchIndex.from_state(index.to_state())
+
+    assert restored.composite == index.composite
+    assert restored.fields == index.fields
+    assert restored.build_time == index.build_time
+    for field in FUZZY_FIELD_KEYS:
+        assert restored.fuzzy[field].to_state() == index.fuzzy[field].to_state()
+    assert restored.complete('ива', 20) == index.complete('ива', 20)
+    criteria = {'surname': 'Ивонов'}
+    assert restored.lookup_fuzzy(criteria, 10) == index.lookup_fuzzy(criteria, 10)
@@ -0,0 +1,90 @@
+"""Tests for the memory-mapped snapshot shared with search workers"""
+
+import random
+import pytest
+from config.settings import SEARCH_COLUMNS
+from src.services.bulk import resolve_file
+from src.services.pagination import search_first_page
+from src.services.search import SearchService
+from src.services.search_index import FIELD_KEYS
+from src.services.shared_snapshot import write_shared_snapshot, open_shared_snapshot
+
+
+@pytest.fixture(scope='module')
+def mapped(snapshot, tmp_path_factory):
+    path = tmp_path_factory.mktemp('shared') / 'snapshot.bin'
+    write_shared_snapshot(snapshot, str(path))
+    return open_shared_snapshot(str(path))
+
+
+def _misspell(value, rng):
+    if len(value) < 4:
+        return value
+    position = rng.randrange(1, len(value) - 1)
+    return value[:position] + value[position + 1:]
+
+
+def test_records_match(snapshot, mapped):
+    assert len(mapped) == len(snapshot)
+    assert list(mapped.headers) == list(snapshot.headers)
+    for position in (0, 1, len(snapshot) // 2, len(snapshot) - 1):
+        assert dict(mapped.data[position]) == dict(snapshot.data[position])
+
+
+def test_search_results_match(snapshot, mapped):
+    rng = random.Random(5)
+    for _ in range(300):
+        record = snapshot.data[rng.randrange(len(snapshot))]
+        fields = rng.sample(FIELD_KEYS, rng.randint(1, len(FIELD_KEYS)))
+        criteria = {field: record[SEARCH_COLUMNS[field]] for field in fields}
+        if rng.random() < 0.3:
+            criteria[fields[0]] = _misspell(criteria[fields[0]], rng)
+
+        expected_page, expected_positions, expected_fuzzy = search_first_page(snapshot, criteria)
+        page, positions, fuzzy = search_first_page(mapped, criteria)
+        assert list(positions) == list(expected_positions)
+        assert fuzzy == expected_fuzzy
+        assert page.text == expected_page.text
+
+
+def test_autocomplete_matches(snapshot, mapped):
+    for prefix in ('Ив', 'смир', 'Фёдор', 'Федор', 'Нет такой'):
+        expected = SearchService.autocomplete(snapshot.data, prefix, snapshot.index, 10)
+        actual = SearchService.autocomplete(mapped.data, prefix, mapped.index, 10)
+        assert [dict(record) for record in actual] == [dict(record) for record in expected]
+
+
+def test_bulk_lookup_matches(snapshot, mapped, tmp_path):
+    lines = [
+        ' '.join(record[SEARCH_COLUMNS[field]] for field in ('surname', 'name', 'patronymic', 'class'))
+        for record in list(snapshot.data)[:200]
+    ]
+    input_path = tmp_path / 'input.txt'
+    input_path.write_text('\n'.join(lines + ['Нет Такого Человека 5А', 'мусор']), encoding='utf-8')
+
+    expected = resolve_file(str(input_path), str(tmp_path / 'expected.csv'), snapshot, 1000)
+    actual = resolve_file(str(input_path), str(tmp_path / 'actual.csv'), mapped, 1000)
+    assert (actual.found, actual.not_found, actual.invalid) == (expected.found, expected.not_found, expected.invalid)
+    assert (tmp_path / 'actual.csv').read_bytes() == (tmp_path / 'expected.csv').read_bytes()
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / 'foreign.bin'
+    path.write_bytes(b'\0' * 64)
+    with pytest.raises(ValueError):
+        open_shared_snapshot(str(path))
+
+
+def test_bulk_lookup_caps_matches(snapshot, tmp_path):
+    class_name = snapshot.data[0][SEARCH_COLUMNS['class']]
+    total = sum(1 for record in snapshot.data if record[SEARCH_COLUMNS['class']] == class_name)
+    assert total > 3
+    input_path = tmp_path / 'input.csv'
+    input_path.write_text(f';;;{class_name}\n', encoding='utf-8')
+    output_path = tmp_path / 'output.csv'
+
+    stats = resolve_file(str(input_path), str(output_path), snapshot, 1000, max_matches=3)
+    assert (stats.found, stats.truncated) == (1, 1)
+    rows = output_path.read_text(encoding='utf-8-sig').splitlines()[1:]
+    assert len(rows) == 3
+    assert all(row.endswith(f'показаны 3 из {total}') for row in rows)
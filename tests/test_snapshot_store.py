@@ -0,0 +1,37 @@
+"""Tests for saving and loading snapshots"""
+
+from src.services.snapshot_store import save_snapshot, load_snapshot, MAGIC
+
+
+def test_round_trip(snapshot, tmp_path):
+    path = str(tmp_path / 'snapshot.bin')
+    assert save_snapshot(snapshot, path)
+
+    loaded = load_snapshot(path)
+    assert loaded is not None
+    assert loaded.headers == snapshot.headers
+    assert loaded.rows == snapshot.rows
+    assert loaded.revision == snapshot.revision
+    assert loaded.fetched_at == snapshot.fetched_at
+    assert loaded.index.composite == snapshot.index.composite
+    assert loaded.index.fields == snapshot.index.fields
+    assert loaded.index.complete('смир', 10) == snapshot.index.complete('смир', 10)
+    criteria = {'surname': 'Смирнва', 'class': '7А'}
+    assert loaded.index.lookup_fuzzy(criteria, 10) == snapshot.index.lookup_fuzzy(criteria, 10)
+
+
+def test_missing_file(tmp_path):
+    assert load_snapshot(str(tmp_path / 'missing.bin')) is None
+
+
+def test_foreign_or_truncated_file(snapshot, tmp_path):
+    foreign = tmp_path / 'foreign.bin'
+    foreign.write_bytes(b'not a snapshot')
+    assert load_snapshot(str(foreign)) is None
+
+    path = tmp_path / 'snapshot.bin'
+    save_snapshot(snapshot, str(path))
+    payload = path.read_bytes()
+    path.write_bytes(payload[:len(payload) // 2])
+    assert path.read_bytes().startswith(MAGIC)
+    assert load_snapshot(str(path)) is None